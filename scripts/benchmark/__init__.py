@@ -0,0 +1,2 @@
+# Playbook-NG Updater Benchmarks
+# Synthetic COUN7ER/ATT&CK corpora and a per-stage runner, see benchmark/run.py
@@ -0,0 +1,350 @@
+# Synthetic Corpus Generator
+# Writes well-formed COUN7ER countermeasures/templates and ATT&CK STIX bundles of any size
+import argparse
+import json
+import random
+from pathlib import Path
+from typing import Dict, List
+from dataset_updater.update_attack import DOMAIN_FILES
+
+# First parent technique number per domain (disjoint ranges, so every ID has one domain)
+DOMAIN_FIRST_TECHNIQUE = {"enterprise": 1000, "mobile": 6000, "ics": 100}
+# Parent technique numbers available per domain
+DOMAIN_TECHNIQUE_SPAN = {"enterprise": 5000, "mobile": 3000, "ics": 900}
+# Techniques per parent (the parent plus its sub-techniques)
+TECHNIQUES_PER_PARENT = 4
+
+# Countermeasure types, as used by COUN7ER
+CM_TYPES = ["Disable", "Configure", "Monitor", "Remove", "Restrict", "Reset"]
+
+WORDS = (
+    "adversary access account administrative service registry network endpoint policy "
+    "credential domain controller share firewall process host log audit privilege token "
+    "session protocol remote configuration update interface workstation server baseline "
+    "detection response containment isolation allowlist execution persistence"
+).split()
+
+ISO_TIMESTAMP = "2025-03-14T00:00:00.000Z"
+MARKING_ID = "marking-definition--00000000-0000-4000-8000-000000000001"
+IDENTITY_ID = "identity--00000000-0000-4000-8000-000000000002"
+
+
+def item_id(num: int) -> str:
+    """Countermeasure ID for 1-based num; past CM9999 the CMxxxx.yyy form is used"""
+    if num < 10000:
+        return f"CM{num:04d}"
+    return f"CM{num // 1000:04d}.{num % 1000:03d}"
+
+
+def technique_ids(domain: str, count: int) -> List[str]:
+    """count technique IDs of a domain: each parent followed by its sub-techniques"""
+    if count > DOMAIN_TECHNIQUE_SPAN[domain] * TECHNIQUES_PER_PARENT:
+        raise ValueError(f"at most {DOMAIN_TECHNIQUE_SPAN[domain] * TECHNIQUES_PER_PARENT} {domain} techniques")
+    first = DOMAIN_FIRST_TECHNIQUE[domain]
+    tech_ids = []
+    for ind in range(count):
+        parent, sub = divmod(ind, TECHNIQUES_PER_PARENT)
+        tech_id = f"T{first + parent:04d}"
+        tech_ids.append(tech_id if sub == 0 else f"{tech_id}.{sub:03d}")
+    return tech_ids
+
+
+def _sentence(rng: random.Random, words: int = 14) -> str:
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def _paragraph(rng: random.Random, sentences: int = 3) -> str:
+    return " ".join(_sentence(rng) for _ in range(sentences))
+
+
+def _technique_url(tech_id: str) -> str:
+    return "https://attack.mitre.org/techniques/" + tech_id.replace(".", "/") + "/"
+
+
+def make_item_md(rng: random.Random, num: int, item_count: int, tech_ids: List[str]) -> str:
+    """Countermeasure markdown (header, every section, technique/CM/reference lists)"""
+    cm_id = item_id(num)
+    header = [
+        f"# {' '.join(w.capitalize() for w in rng.sample(WORDS, 4))}",
+        "",
+        f"* **ID:** {cm_id}",
+        f"* **Version:** 1.{rng.randrange(3)}",
+        "* **Created:** 14 March 2025",
+        "* **Modified:** 2 June 2025",
+        f"* **Type:** {rng.choice(CM_TYPES)}",
+    ]
+    status = rng.random()
+    if status < 0.02 and num > 1:
+        header += [
+            "* **Status:** Revoked",
+            f"* **Reason:** {_sentence(rng, 6)}",
+            f"* **By ID:** {item_id(rng.randrange(1, num))}",
+        ]
+    elif status < 0.04:
+        header += [
+            "* **Status:** Deprecated",
+            f"* **Reason:** {_sentence(rng, 6)}",
+        ]
+    else:
+        header.append("* **Status:** Active")
+
+    guidance = []
+    for _ in range(rng.randrange(1, 4)):
+        guidance += [
+            f"### {' '.join(w.capitalize() for w in rng.sample(WORDS, 3))}",
+            "",
+            _paragraph(rng),
+            "",
+            f"`HKLM\\SYSTEM\\CurrentControlSet\\Services\\{rng.choice(WORDS).capitalize()} Value = \"0\"`",
+            "",
+        ]
+    techniques = [
+        f"- [{tech_id}]({_technique_url(tech_id)}) {_sentence(rng, 3)[:-1]}"
+        for tech_id in sorted(rng.sample(tech_ids, min(len(tech_ids), rng.randrange(1, 6))))
+    ]
+    related = [
+        f"- {item_id(other)} | {_sentence(rng, 4)[:-1]}"
+        for other in sorted(rng.sample(range(1, item_count + 1), min(item_count, rng.randrange(0, 6))))
+        if other != num
+    ]
+    references = [
+        f"- {_sentence(rng, 6)[:-1]} | <https://example.com/{rng.choice(WORDS)}/{num}-{ind}>"
+        for ind in range(rng.randrange(1, 5))
+    ]
+    lines = header + [
+        "",
+        "",
+        "## Intended Outcome",
+        "",
+        _paragraph(rng, 2),
+        "",
+        "## Introduction",
+        "",
+        _paragraph(rng),
+        "",
+        "## Preparation",
+        "",
+        *[f"- {_sentence(rng, 8)}" for _ in range(3)],
+        "",
+        "## Risks",
+        "",
+        _paragraph(rng, 2),
+        "",
+        "## Guidance",
+        "",
+        _paragraph(rng),
+        "",
+        *guidance,
+        "## Associated Techniques",
+        "",
+        *techniques,
+        "",
+        "## Related Countermeasures",
+        "",
+        *(related or ["None"]),
+        "",
+        "## References",
+        "",
+        *references,
+        "",
+    ]
+    return "\n".join(lines)
+
+
+def make_template(rng: random.Random, num: int, item_count: int, tech_ids: List[str]) -> dict:
+    """Template JSON, mapping a sample of techniques to countermeasures"""
+    tech_to_items = {"unmapped": {"confidence": "suspected", "items": []}}
+    for tech_id in sorted(rng.sample(tech_ids, min(len(tech_ids), 40))):
+        tech_to_items[tech_id] = {
+            "confidence": "suspected",
+            "items": [
+                {"id": item_id(other), "version": "1.0"}
+                for other in sorted(rng.sample(range(1, item_count + 1), min(item_count, 3)))
+            ],
+        }
+    return {
+        "id": f"TMPL{num:04d}",
+        "name": f"Synthetic Template {num}",
+        "featured": False,
+        "iconSrc": None,
+        "link": {"url": f"https://example.com/templates/{num}", "text": f"Template {num}"},
+        "description": _paragraph(rng),
+        "tech_to_items": tech_to_items,
+        "ignored_items": [],
+    }
+
+
+def write_counter_corpus(out_dir: Path, item_count: int, tech_ids: List[str], template_count: int = 4, seed: int = 0) -> None:
+    """Write <out_dir>/countermeasures/CM*.md and <out_dir>/templates/TMPL*.json"""
+    rng = random.Random(seed)
+    items_dir = Path(out_dir) / "countermeasures"
+    templates_dir = Path(out_dir) / "templates"
+    items_dir.mkdir(parents=True, exist_ok=True)
+    templates_dir.mkdir(parents=True, exist_ok=True)
+    for num in range(1, item_count + 1):
+        text = make_item_md(rng, num, item_count, tech_ids)
+        (items_dir / f"{item_id(num)}.md").write_text(text, encoding="utf-8")
+    for num in range(1, template_count + 1):
+        template = make_template(rng, num, item_count, tech_ids)
+        with open(templates_dir / f"TMPL{num:04d}.json", "w", encoding="utf-8") as file:
+            json.dump(template, file, indent=4)
+
+
+def _object_id(stix_type: str, domain: str, num: int) -> str:
+    domain_num = list(DOMAIN_FIRST_TECHNIQUE).index(domain)
+    return f"{stix_type}--{domain_num:08x}-0000-4000-8000-{num:012x}"
+
+
+def make_attack_bundle(rng: random.Random, domain: str, version: str, tech_ids: List[str], relationships_per_technique: int = 4) -> dict:
+    """
+    ATT&CK-like STIX bundle: collection, tactics, techniques, mitigations and relationships
+    - relationships_per_technique scales the relationship count (and so the file size)
+    """
+    kill_chain = f"mitre-{domain}-attack" if domain != "enterprise" else "mitre-attack"
+    tactics = [rng.choice(WORDS) + f"-{ind}" for ind in range(12)]
+    objects = [{
+        "type": "x-mitre-collection",
+        "id": _object_id("x-mitre-collection", domain, 0),
+        "spec_version": "2.1",
+        "name": f"{domain.capitalize()} ATT&CK",
+        "x_mitre_version": version,
+        "description": _paragraph(rng),
+        "created": ISO_TIMESTAMP,
+        "modified": ISO_TIMESTAMP,
+    }, {
+        "type": "identity",
+        "id": IDENTITY_ID,
+        "name": "The MITRE Corporation",
+        "identity_class": "organization",
+        "spec_version": "2.1",
+    }, {
+        "type": "marking-definition",
+        "id": MARKING_ID,
+        "definition_type": "statement",
+        "definition": {"statement": "Synthetic benchmark data"},
+        "spec_version": "2.1",
+    }]
+    for ind, tactic in enumerate(tactics):
+        objects.append({
+            "type": "x-mitre-tactic",
+            "id": _object_id("x-mitre-tactic", domain, ind),
+            "name": tactic.capitalize(),
+            "x_mitre_shortname": tactic,
+            "description": _paragraph(rng, 1),
+            "external_references": [{"source_name": "mitre-attack", "external_id": f"TA{ind:04d}"}],
+            "spec_version": "2.1",
+        })
+    technique_stix_ids = {}
+    for ind, tech_id in enumerate(tech_ids):
+        stix_id = _object_id("attack-pattern", domain, ind)
+        technique_stix_ids[tech_id] = stix_id
+        objects.append({
+            "type": "attack-pattern",
+            "id": stix_id,
+            "name": " ".join(w.capitalize() for w in rng.sample(WORDS, 3)),
+            "description": _paragraph(rng, 4),
+            "kill_chain_phases": [{"kill_chain_name": kill_chain, "phase_name": rng.choice(tactics)}],
+            "external_references": [{
+                "source_name": "mitre-attack",
+                "url": _technique_url(tech_id),
+                "external_id": tech_id,
+            }],
+            "x_mitre_is_subtechnique": "." in tech_id,
+            "x_mitre_platforms": ["Windows", "Linux"],
+            "x_mitre_deprecated": False,
+            "revoked": False,
+            "created": ISO_TIMESTAMP,
+            "modified": ISO_TIMESTAMP,
+            "created_by_ref": IDENTITY_ID,
+            "object_marking_refs": [MARKING_ID],
+            "spec_version": "2.1",
+        })
+    mitigation_count = max(1, len(tech_ids) // 4)
+    for ind in range(mitigation_count):
+        objects.append({
+            "type": "course-of-action",
+            "id": _object_id("course-of-action", domain, ind),
+            "name": " ".join(w.capitalize() for w in rng.sample(WORDS, 2)),
+            "description": _paragraph(rng, 2),
+            "spec_version": "2.1",
+        })
+    rel_num = 0
+    for tech_id, stix_id in technique_stix_ids.items():
+        if "." in tech_id:
+            objects.append({
+                "type": "relationship",
+                "id": _object_id("relationship", domain, rel_num),
+                "relationship_type": "subtechnique-of",
+                "source_ref": stix_id,
+                "target_ref": technique_stix_ids[tech_id.split(".")[0]],
+                "spec_version": "2.1",
+            })
+            rel_num += 1
+        for _ in range(relationships_per_technique):
+            objects.append({
+                "type": "relationship",
+                "id": _object_id("relationship", domain, rel_num),
+                "relationship_type": "mitigates",
+                "source_ref": _object_id("course-of-action", domain, rng.randrange(mitigation_count)),
+                "target_ref": stix_id,
+                "description": _sentence(rng),
+                "spec_version": "2.1",
+            })
+            rel_num += 1
+    return {
+        "type": "bundle",
+        "id": _object_id("bundle", domain, 0),
+        "spec_version": "2.1",
+        "objects": objects,
+    }
+
+
+def write_attack_corpus(out_dir: Path, technique_count: int, version: str = "17.0", relationships_per_technique: int = 4, seed: int = 0) -> Dict[str, List[str]]:
+    """Write one bundle per domain, laid out like attack-stix-data, returns {domain: technique IDs}"""
+    rng = random.Random(seed)
+    domain_tech_ids = {}
+    for domain, rel_path in DOMAIN_FILES.items():
+        tech_ids = technique_ids(domain, technique_count)
+        bundle = make_attack_bundle(
+            rng, domain, version, tech_ids, relationships_per_technique)
+        bundle_path = Path(out_dir) / rel_path
+        bundle_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(bundle_path, "w", encoding="utf-8") as file:
+            json.dump(bundle, file, indent=4)
+        domain_tech_ids[domain] = tech_ids
+    return domain_tech_ids
+
+
+def write_corpus(out_dir: Path, item_count: int, technique_count: int, relationships_per_technique: int = 4, template_count: int = 4, seed: int = 0) -> None:
+    """Write <out_dir>/attack (bundles) and <out_dir>/coun7er (CMs/templates mapped to their techniques)"""
+    domain_tech_ids = write_attack_corpus(
+        Path(out_dir) / "attack", technique_count, relationships_per_technique=relationships_per_technique, seed=seed)
+    all_tech_ids = [tech_id for tech_ids in domain_tech_ids.values()
+                    for tech_id in tech_ids]
+    write_counter_corpus(Path(out_dir) / "coun7er", item_count,
+                         all_tech_ids, template_count, seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python3 -m benchmark.corpus',
+                                     description='Write a synthetic COUN7ER/ATT&CK corpus (coun7er/ and attack/ under the output directory).')
+    parser.add_argument('out_dir', type=Path, help=f"Output directory.")
+    parser.add_argument('-n', '--items', type=int, default=1000,
+                        help=f"Number of countermeasures (default: 1000).")
+    parser.add_argument('-t', '--techniques', type=int, default=800,
+                        help=f"Techniques per ATT&CK domain (default: 800).")
+    parser.add_argument('--relationships', type=int, default=4,
+                        help=f"Mitigation relationships per technique, scales the bundle size (default: 4).")
+    parser.add_argument('--templates', type=int, default=4,
+                        help=f"Number of templates (default: 4).")
+    parser.add_argument('--seed', type=int, default=0,
+                        help=f"Random seed; the same seed writes the same corpus (default: 0).")
+    args = parser.parse_args()
+    write_corpus(args.out_dir, args.items, args.techniques,
+                 args.relationships, args.templates, args.seed)
+    print(f"  [+] Wrote {args.items} countermeasures and {args.techniques} techniques per domain to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# Markdown Backend Parity
+# Reads every countermeasure of a COUN7ER checkout with a markdown backend and with the
+# reference (DOM) backend, and checks they extract the same references, IDs and hidden link URLs
+import argparse
+import sys
+import time
+from glob import glob
+from pathlib import Path
+from typing import Dict, List
+from dataset_updater.item_parsing import MDFile
+from dataset_updater.markdown_backends import BACKENDS, DomBackend, TokenBackend, UnsupportedMarkdown
+from dataset_updater.pipeline import ROOT_DIR, UpdaterPipeline
+
+
+def extract(md: MDFile) -> dict:
+    """What the updater reads through a file's markdown backend"""
+    return {
+        "references": [ref.to_json() for ref in md.references],
+        "assoc_tech_ids": md.assoc_tech_ids,
+        "assoc_item_ids": md.assoc_item_ids,
+        "url_hrefs_not_visible": md.url_hrefs_not_visible(),
+    }
+
+
+def compare_file(path: str, backend: str, timings: Dict[str, float]) -> tuple:
+    """
+    Read a file with the backend (no fallback) and the reference backend
+    -> (reason the backend doesn't support it or None, [mismatch descriptions])
+    """
+    results = {}
+    unsupported = None
+    for name in (backend, DomBackend.name):
+        md = MDFile(path, name)
+        start = time.perf_counter()
+        try:
+            md.markdown = BACKENDS[name](md)
+        except UnsupportedMarkdown as ex:
+            unsupported = str(ex)
+            md.markdown = DomBackend(md)
+        results[name] = extract(md)
+        timings[name] += time.perf_counter() - start
+    mismatches = [
+        f"{field}:\n      {backend}: {results[backend][field]}\n      {DomBackend.name}: {results[DomBackend.name][field]}"
+        for field in results[DomBackend.name]
+        if results[backend][field] != results[DomBackend.name][field]
+    ]
+    return unsupported, mismatches
+
+
+def check_parity(counter_path: Path, backend: str, verbose: bool = False) -> bool:
+    """Compare the backends over every countermeasure of counter_path, prints a report, returns whether they agree"""
+    item_paths = sorted(glob(str(counter_path / "**/CM*.md"), recursive=True))
+    if not item_paths:
+        print(f"  [-] No countermeasures found in {counter_path}.")
+        return False
+    timings = {backend: 0.0, DomBackend.name: 0.0}
+    unsupported: List[str] = []
+    mismatched = 0
+    for item_path in item_paths:
+        try:
+            reason, mismatches = compare_file(item_path, backend, timings)
+        except Exception as ex:
+            print(f"  [-] {item_path}: cannot be read ({ex}).")
+            continue
+        if reason is not None:
+            unsupported.append(item_path)
+            if verbose:
+                print(f"  [i] {item_path}: read with the reference backend ({reason}).")
+        if mismatches:
+            mismatched += 1
+            print(f"  [-] {item_path} differs:")
+            for mismatch in mismatches:
+                print(f"    {mismatch}")
+
+    checked = len(item_paths)
+    print(f"  [i] {checked} countermeasures, {checked - len(unsupported)} read by the {backend} backend, {len(unsupported)} fell back to the {DomBackend.name} backend.")
+    for name, seconds in timings.items():
+        print(f"  [i] {name:<8} {seconds:.3f}s ({checked / seconds if seconds else 0:.1f} files/sec, including fallbacks)")
+    if mismatched:
+        print(f"  [-] {mismatched} countermeasures differ.")
+        return False
+    print(f"  [+] Both backends agree.")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python3 -m benchmark.markdown_parity',
+                                     description='Check a markdown backend against the reference (DOM) backend over a COUN7ER checkout. Run from the scripts/ directory.')
+    parser.add_argument('counter_path', type=Path, nargs="?",
+                        default=UpdaterPipeline(ROOT_DIR).counter_repo_path,
+                        help=f"COUN7ER checkout (default: the updater's clone).")
+    parser.add_argument('--backend', choices=[name for name in BACKENDS if name != DomBackend.name],
+                        default=TokenBackend.name,
+                        help=f"Backend to check (default: {TokenBackend.name}).")
+    parser.add_argument('-v', '--verbose', action="store_true",
+                        help=f"List the files the backend doesn't support, and why.")
+    args = parser.parse_args()
+    if not check_parity(args.counter_path, args.backend, args.verbose):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
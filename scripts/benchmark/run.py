@@ -0,0 +1,235 @@
+# Benchmark Runner
+# Times each updater stage over a synthetic corpus, reports throughput and peak memory,
+# and checks the results against regression thresholds
+import argparse
+import io
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from glob import glob
+from pathlib import Path
+from typing import Callable, Dict, List
+from benchmark.corpus import write_corpus
+from dataset_updater.attack_index import build_domain_index, merge_indexes
+from dataset_updater.item_parsing import MDFile
+from dataset_updater.load import iter_items, load_dataset, load_templates, new_dataset
+from dataset_updater.update_attack import DOMAIN_FILES, get_domains_to_load
+from dataset_updater.util import load_item
+from dataset_updater.writer import write_dataset
+
+# Default regression thresholds (kept with the corpus settings they were measured on)
+THRESHOLDS_PATH = Path(__file__).parent / "thresholds.json"
+
+
+def measure(run: Callable[[], int], memory: bool = True) -> dict:
+    """
+    Time run() (which returns the number of units it processed), then run it again
+    under tracemalloc for its peak memory, so tracing doesn't skew the timing
+    - Peak memory is the Python heap of this process only (not pool workers)
+    """
+    start = time.perf_counter()
+    units = run()
+    seconds = time.perf_counter() - start
+    result = {
+        "units": units,
+        "seconds": round(seconds, 4),
+        "per_sec": round(units / seconds, 1) if seconds else None,
+    }
+    if memory:
+        tracemalloc.start()
+        try:
+            run()
+            result["peak_mb"] = round(
+                tracemalloc.get_traced_memory()[1] / (1 << 20), 2)
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def run_stages(corpus_dir: Path, jobs: int = 1, memory: bool = True) -> Dict[str, dict]:
+    """Run every stage over a corpus written by write_corpus, returns {stage: result}"""
+    counter_path = corpus_dir / "coun7er"
+    item_paths = sorted(glob(str(counter_path / "**/CM*.md"), recursive=True))
+    bundle_paths = {domain: corpus_dir / "attack" / file
+                    for domain, file in DOMAIN_FILES.items()}
+    # Stages print progress/warnings, which aren't part of the measurement
+    quiet = io.StringIO()
+    state = {}
+
+    def md_file() -> int:
+        for item_path in item_paths:
+            MDFile(item_path)
+        return len(item_paths)
+
+    def load_items() -> int:
+        with redirect_stdout(quiet):
+            for item_path in item_paths:
+                load_item(item_path)
+        return len(item_paths)
+
+    def load_all() -> int:
+        with redirect_stdout(quiet):
+            state["dataset"] = load_dataset(counter_path, jobs)
+        return len(state["dataset"].items) + len(state["dataset"].templates)
+
+    def attack_index() -> int:
+        indexes = [build_domain_index(domain, bundle_path)[1]
+                   for domain, bundle_path in bundle_paths.items()]
+        state["technique_index"] = merge_indexes(indexes)
+        return sum(len(index) for index in indexes)
+
+    def domains_to_load() -> int:
+        dataset = state["dataset"]
+        mitigated = {tech.tech_id for cm in dataset.items for tech in cm.techniques}
+        mitigated |= {tech_id for tmpl in dataset.templates
+                      for tech_id in tmpl.tech_to_items if "unmapped" not in tech_id}
+        with redirect_stdout(quiet):
+            get_domains_to_load(mitigated, state["technique_index"])
+        return len(mitigated)
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        def serialize() -> int:
+            with redirect_stdout(quiet):
+                # a fresh path each time, so the unchanged-content check never skips the write
+                write_dataset(state["dataset"], Path(
+                    out_dir) / f"latest-{time.perf_counter_ns()}.json")
+            return len(state["dataset"].items)
+
+        def stream() -> int:
+            # load + serialize, with the items streamed from the parser to the file
+            dataset = new_dataset()
+            dataset.templates = load_templates(counter_path)
+            count = 0
+
+            def items():
+                nonlocal count
+                for item in iter_items(counter_path, jobs):
+                    count += 1
+                    yield item
+            with redirect_stdout(quiet):
+                write_dataset(dataset, Path(
+                    out_dir) / f"latest-{time.perf_counter_ns()}.json", items())
+            return count
+
+        stages = [
+            ("md_file", "files", md_file),
+            ("load_item", "files", load_items),
+            ("load_dataset", "files", load_all),
+            ("attack_index", "techniques", attack_index),
+            ("get_domains_to_load", "techniques", domains_to_load),
+            ("serialize", "items", serialize),
+            ("stream_dataset", "items", stream),
+        ]
+        results = {}
+        for name, unit, run in stages:
+            results[name] = {"unit": unit, **measure(run, memory)}
+    return results
+
+
+def check_thresholds(results: Dict[str, dict], thresholds: Dict[str, dict]) -> List[str]:
+    """Compare results to {stage: {"min_per_sec": .., "max_peak_mb": ..}}, returns the failures"""
+    failures = []
+    for stage, limits in thresholds.items():
+        result = results.get(stage)
+        if result is None:
+            continue
+        min_rate = limits.get("min_per_sec")
+        if min_rate is not None and result["per_sec"] is not None and result["per_sec"] < min_rate:
+            failures.append(
+                f"{stage}: {result['per_sec']} {result['unit']}/sec is below {min_rate}")
+        max_peak = limits.get("max_peak_mb")
+        if max_peak is not None and "peak_mb" in result and result["peak_mb"] > max_peak:
+            failures.append(
+                f"{stage}: peak {result['peak_mb']} MB is above {max_peak} MB")
+    return failures
+
+
+def derive_thresholds(results: Dict[str, dict], slack: float) -> Dict[str, dict]:
+    """Thresholds from a run: throughput may drop to 1/slack, peak memory may grow by slack"""
+    return {
+        stage: {
+            "min_per_sec": round(result["per_sec"] / slack, 1) if result["per_sec"] else None,
+            **({"max_peak_mb": round(result["peak_mb"] * slack, 2)} if "peak_mb" in result else {}),
+        }
+        for stage, result in results.items()
+    }
+
+
+def print_results(results: Dict[str, dict]) -> None:
+    for stage, result in results.items():
+        line = f"  [i] {stage:<20} {result['units']:>7} {result['unit']:<10} {result['seconds']:>9.4f}s {result['per_sec']:>12} {result['unit']}/sec"
+        if "peak_mb" in result:
+            line += f"  peak {result['peak_mb']} MB"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python3 -m benchmark.run',
+                                     description='Benchmark the updater stages over a synthetic COUN7ER/ATT&CK corpus. Run from the scripts/ directory.')
+    parser.add_argument('-n', '--items', type=int, default=1000,
+                        help=f"Number of synthetic countermeasures (default: 1000).")
+    parser.add_argument('-t', '--techniques', type=int, default=800,
+                        help=f"Synthetic techniques per ATT&CK domain (default: 800).")
+    parser.add_argument('--relationships', type=int, default=4,
+                        help=f"Mitigation relationships per technique, scales the bundle size (default: 4).")
+    parser.add_argument('--seed', type=int, default=0,
+                        help=f"Corpus random seed (default: 0).")
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help=f"Worker processes for the load_dataset stage (default: 1).")
+    parser.add_argument('--corpus', type=Path,
+                        help=f"Write/keep the corpus in this directory (default: a temporary directory). An existing corpus there is reused.")
+    parser.add_argument('--no-memory', action="store_true",
+                        help=f"Skip the peak memory passes (tracing makes them much slower than the timed runs).")
+    parser.add_argument('--json', type=Path,
+                        help=f"Write the results (and the corpus settings) to this JSON file.")
+    parser.add_argument('--check', type=Path, nargs="?", const=THRESHOLDS_PATH,
+                        help=f"Fail (exit 1) if a stage regresses past the thresholds in this file (default: {THRESHOLDS_PATH.name}). The corpus settings are taken from the file.")
+    parser.add_argument('--write-thresholds', type=Path,
+                        help=f"Write thresholds derived from this run to this file.")
+    parser.add_argument('--slack', type=float, default=2.0,
+                        help=f"Allowed slowdown/memory growth factor for --write-thresholds (default: 2.0).")
+    args = parser.parse_args()
+
+    settings = {"items": args.items, "techniques": args.techniques,
+                "relationships": args.relationships, "seed": args.seed, "jobs": args.jobs}
+    thresholds = None
+    if args.check:
+        with open(args.check, encoding="utf-8") as file:
+            thresholds = json.load(file)
+        settings.update(thresholds["settings"])
+
+    print("**** Playbook-NG Updater Benchmark ****")
+    print(f"  [i] Settings: {json.dumps(settings)}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        corpus_dir = args.corpus or Path(tmp_dir)
+        if not (corpus_dir / "coun7er").is_dir():
+            print(f"  [i] Writing the synthetic corpus to {corpus_dir}")
+            write_corpus(corpus_dir, settings["items"], settings["techniques"],
+                         settings["relationships"], seed=settings["seed"])
+        results = run_stages(corpus_dir, settings["jobs"], not args.no_memory)
+    print_results(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump({"settings": settings, "python": sys.version.split()[0],
+                       "stages": results}, file, indent=4)
+        print(f"  [+] Wrote to {args.json}")
+    if args.write_thresholds:
+        with open(args.write_thresholds, "w", encoding="utf-8") as file:
+            json.dump({"settings": settings, "slack": args.slack, "python": sys.version.split()[0],
+                       "stages": derive_thresholds(results, args.slack)}, file, indent=4)
+        print(f"  [+] Wrote to {args.write_thresholds}")
+    if thresholds is not None:
+        failures = check_thresholds(results, thresholds["stages"])
+        for failure in failures:
+            print(f"  [-] Regression: {failure}")
+        if failures:
+            sys.exit(1)
+        print("  [+] All stages within thresholds.")
+
+
+if __name__ == "__main__":
+    main()
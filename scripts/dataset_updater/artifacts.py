@@ -0,0 +1,98 @@
+# Data Artifacts
+# Minified + precompressed variants of the published JSON files, with hashes for index.json
+import gzip
+import hashlib
+import json
+from pathlib import Path, PurePosixPath
+from typing import Dict, List
+from dataset_updater.files import write_bytes
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Suffix of the minified variant (ex: latest.json -> latest.min.json)
+MIN_SUFFIX = ".min.json"
+# The precompressed variants compress the minified one (ex: latest.min.json.gz)
+GZ_SUFFIX = MIN_SUFFIX + ".gz"
+BR_SUFFIX = MIN_SUFFIX + ".br"
+VARIANT_SUFFIXES = [MIN_SUFFIX, GZ_SUFFIX, BR_SUFFIX]
+# Brotli quality: 11 (the maximum) is only a few percent smaller, but far slower on the bundles
+BROTLI_QUALITY = 9
+
+
+def is_variant(path: str | Path) -> bool:
+    """Whether a path is a generated variant rather than a published JSON file"""
+    return str(path).endswith(tuple(VARIANT_SUFFIXES))
+
+
+def _digest(data: bytes) -> dict:
+    return {"sha256": hashlib.sha256(data).hexdigest(), "size": len(data)}
+
+
+def _reuse(variant_path: Path, recorded: dict | None) -> bytes | None:
+    """The content of a variant, if it's still the one recorded for the same source"""
+    if recorded is None or not variant_path.is_file():
+        return None
+    data = variant_path.read_bytes()
+    return data if _digest(data) == recorded else None
+
+
+def build_artifact(json_path: Path, previous: dict | None = None, brotli_quality: int = BROTLI_QUALITY) -> dict:
+    """
+    Write the variants of a published JSON file, returns their index.json entry
+    - <name>.min.json: minified
+    - <name>.min.json.gz / <name>.min.json.br: the minified JSON, precompressed (.br only when
+      brotli is installed)
+    - The entry holds the sha256 and size of the source and of each variant, as served
+    - previous: the file's entry in the last index.json; when the source's sha256 is unchanged,
+      variants whose content still matches their recorded sha256 are reused, not rebuilt
+    """
+    stem = json_path.name[:-len(".json")]
+    min_path = json_path.with_name(stem + MIN_SUFFIX)
+    gz_path = json_path.with_name(stem + GZ_SUFFIX)
+    br_path = json_path.with_name(stem + BR_SUFFIX)
+
+    raw = json_path.read_bytes()
+    entry = _digest(raw)
+    if previous is None or previous.get("sha256") != entry["sha256"]:
+        previous = {}
+
+    minified = _reuse(min_path, previous.get("min"))
+    if minified is None:
+        minified = json.dumps(json.loads(raw), separators=(",", ":"),
+                              ensure_ascii=False).encode("utf-8")
+        write_bytes(min_path, minified)
+    entry["min"] = _digest(minified)
+
+    gz = _reuse(gz_path, previous.get("gz"))
+    if gz is None:
+        # mtime=0 keeps the output reproducible
+        gz = gzip.compress(minified, compresslevel=9, mtime=0)
+        write_bytes(gz_path, gz)
+    entry["gz"] = _digest(gz)
+
+    if brotli is not None:
+        br = _reuse(br_path, previous.get("br"))
+        if br is None:
+            br = brotli.compress(minified, quality=brotli_quality)
+            write_bytes(br_path, br)
+        entry["br"] = _digest(br)
+
+    return entry
+
+
+def build_artifacts(data_dir: Path, rel_paths: List[str], previous: Dict[str, dict] | None = None) -> Dict[str, dict]:
+    """
+    Build the variants of each published file (paths relative to data_dir), returns {path: entry}
+    - previous: the artifacts of the last index.json (see build_artifact)
+    """
+    if brotli is None:
+        print("  [i] brotli is not installed, skipping .br variants.")
+    previous = previous or {}
+    artifacts = {}
+    for rel_path in rel_paths:
+        key = str(PurePosixPath(rel_path))
+        artifacts[key] = build_artifact(data_dir / rel_path, previous.get(key))
+    return artifacts
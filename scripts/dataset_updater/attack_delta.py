@@ -0,0 +1,109 @@
+# ATT&CK Version Deltas
+# What changed in a domain's techniques between two ATT&CK versions, so clients can upgrade
+# without downloading and comparing both bundles
+import json
+from pathlib import Path
+from typing import Dict, List
+from dataset_updater.attack_index import INDEX_CACHE_PATH, TechniqueInfo, load_domain_index
+from dataset_updater.files import write_text
+
+# Delta files: <attack data>/<domain>/deltas/<from version>_<to version>.json
+# - Served with the bundles (clients download them), in a sub-directory so they're not listed as
+#   ATT&CK versions in index.json
+DELTA_DIR_NAME = "deltas"
+
+
+def version_key(version: str) -> tuple:
+    """
+    Sort key of an ATT&CK version (ex: 9.0 < 16.1)
+    - Numeric parts by value, others (ex: 1-beta, v17) by name after them; every part is an
+      (int, int, str) tuple, so any two versions compare
+    """
+    return tuple((0, int(part), "") if part.isdigit() else (1, 0, part) for part in version.split("."))
+
+
+def get_previous_version(versions: List[str], new_version: str) -> str | None:
+    """The latest of versions older than new_version (None if there's none)"""
+    older = [version for version in versions
+             if version_key(version) < version_key(new_version)]
+    return max(older, key=version_key) if older else None
+
+
+def get_delta_path(attack_data_path: Path, domain: str, from_version: str, to_version: str) -> Path:
+    return attack_data_path / domain / DELTA_DIR_NAME / f"{from_version}_{to_version}.json"
+
+
+def build_delta(domain: str, from_version: str, old: Dict[str, TechniqueInfo], to_version: str, new: Dict[str, TechniqueInfo]) -> dict:
+    """
+    Compare two technique indexes of a domain
+    - added: new techniques (with their name and tactics), removed: technique IDs
+    - renamed: {technique ID: {"from": old name, "to": new name}}
+    - revoked: {technique ID: ID it was revoked by (None if unknown)}, newly revoked only
+    - deprecated: newly deprecated technique IDs
+    - tactics: {technique ID: {"added": [..], "removed": [..]}} tactic membership changes
+    """
+    added = sorted(set(new) - set(old))
+    common = sorted(set(new) & set(old))
+    renamed = {}
+    revoked = {}
+    deprecated = []
+    tactics = {}
+    for tech_id in common:
+        old_info, new_info = old[tech_id], new[tech_id]
+        if old_info.name != new_info.name:
+            renamed[tech_id] = {"from": old_info.name, "to": new_info.name}
+        if new_info.revoked and not old_info.revoked:
+            revoked[tech_id] = new_info.revoked_by
+        if new_info.deprecated and not old_info.deprecated:
+            deprecated.append(tech_id)
+        if old_info.tactics != new_info.tactics:
+            tactics[tech_id] = {
+                "added": sorted(set(new_info.tactics) - set(old_info.tactics)),
+                "removed": sorted(set(old_info.tactics) - set(new_info.tactics)),
+            }
+    return {
+        "domain": domain,
+        "from_version": from_version,
+        "to_version": to_version,
+        "added": [{"id": tech_id, "name": new[tech_id].name, "tactics": new[tech_id].tactics}
+                  for tech_id in added],
+        "removed": sorted(set(old) - set(new)),
+        "renamed": renamed,
+        "revoked": revoked,
+        "deprecated": deprecated,
+        "tactics": tactics,
+    }
+
+
+def write_domain_delta(domain: str, new_version: str, new_bundle_path: Path, listed_versions: List[str], attack_data_path: Path, cache_path: Path = INDEX_CACHE_PATH) -> bool:
+    """
+    Write the delta from the previous listed version (in index.json) of a domain to a new one
+    - The technique indexes of both versions are cached under cache_path (see load_domain_index)
+    Returns whether a delta was written
+    """
+    from_version = get_previous_version(listed_versions, new_version)
+    if from_version is None:
+        return False
+    old_bundle_path = attack_data_path / domain / (from_version + ".json")
+    if not old_bundle_path.is_file():
+        print(
+            f"     [-] ATT&CK {domain} v{from_version} is missing, no delta to v{new_version}.")
+        return False
+    _, old = load_domain_index(domain, old_bundle_path, cache_path)
+    _, new = load_domain_index(domain, new_bundle_path, cache_path)
+    delta = build_delta(domain, from_version, old, new_version, new)
+    delta_path = get_delta_path(
+        attack_data_path, domain, from_version, new_version)
+    write_text(delta_path, json.dumps(delta, indent=4))
+    print(
+        f"     [+] Wrote ATT&CK {domain} delta v{from_version} -> v{new_version}: {len(delta['added'])} added, {len(delta['removed'])} removed, {len(delta['renamed'])} renamed, {len(delta['revoked'])} revoked, {len(delta['deprecated'])} deprecated, {len(delta['tactics'])} tactic changes.")
+    return True
+
+
+def list_domain_deltas(attack_data_path: Path, domain: str) -> List[str]:
+    """The deltas written for a domain, as "<from>_<to>" names (for index.json)"""
+    delta_dir = attack_data_path / domain / DELTA_DIR_NAME
+    if not delta_dir.is_dir():
+        return []
+    return sorted((delta_path.stem for delta_path in delta_dir.glob("*.json")),
+                  key=lambda name: tuple(version_key(version) for version in name.split("_")))
@@ -0,0 +1,141 @@
+# ATT&CK Technique Index
+# Technique ID -> domain/version/name/status lookups, built once per ATT&CK domain version
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+from dataset_updater.files import AtomicFile
+from dataset_updater.stix import iter_bundle_objects
+
+# Index files: <cache>/<domain>/techniques/<version>.json
+# - A build cache, kept with the parse cache (scripts/.cache/) rather than in the served app data
+INDEX_CACHE_PATH = Path(__file__).parent.parent / ".cache/attack"
+INDEX_DIR_NAME = "techniques"
+# Bumped when the layout of the index files changes (files in another format are rebuilt)
+INDEX_FORMAT = "2"
+
+
+@dataclass
+class TechniqueInfo:
+    domain: str
+    attack_version: str
+    name: str
+    deprecated: bool
+    revoked: bool
+    # Tactic shortnames (kill chain phase names), sorted
+    tactics: List[str]
+    # ATT&CK ID of the technique this one was revoked by (revoked-by relationship)
+    revoked_by: str | None
+
+
+def get_bundle_version(bundle_path: Path) -> str:
+    """Get the ATT&CK version of a bundle, reading only its first object"""
+    for obj in iter_bundle_objects(bundle_path):
+        return obj["x_mitre_version"]
+    raise ValueError(f"{bundle_path} has no objects")
+
+
+def build_domain_index(domain: str, bundle_path: Path) -> Tuple[str, Dict[str, TechniqueInfo]]:
+    """Single streaming pass over a bundle -> (version, {technique ID: info})"""
+    version = None
+    techniques: Dict[str, TechniqueInfo] = {}
+    # STIX ID -> ATT&CK ID of the techniques, and revoked-by relationships (STIX IDs)
+    stix_tech_ids: Dict[str, str] = {}
+    revoked_by_refs: Dict[str, str] = {}
+    for ind, obj in enumerate(iter_bundle_objects(bundle_path)):
+        if ind == 0:
+            version = obj["x_mitre_version"]
+        if obj["type"] == "relationship" and obj.get("relationship_type") == "revoked-by":
+            revoked_by_refs[obj["source_ref"]] = obj["target_ref"]
+        if obj["type"] != "attack-pattern":
+            continue
+        tech_id = obj["external_references"][0]["external_id"]
+        # first occurrence wins, as a list membership test would
+        if tech_id in techniques:
+            continue
+        stix_tech_ids[obj["id"]] = tech_id
+        techniques[tech_id] = TechniqueInfo(
+            domain=domain,
+            attack_version=version,
+            name=obj.get("name", ""),
+            deprecated=obj.get("x_mitre_deprecated", False),
+            revoked=obj.get("revoked", False),
+            tactics=sorted({phase["phase_name"]
+                           for phase in obj.get("kill_chain_phases", [])}),
+            revoked_by=None,
+        )
+    if version is None:
+        raise ValueError(f"{bundle_path} has no objects")
+    for source_ref, target_ref in revoked_by_refs.items():
+        source_id = stix_tech_ids.get(source_ref)
+        if source_id is not None and techniques[source_id].revoked_by is None:
+            techniques[source_id].revoked_by = stix_tech_ids.get(target_ref)
+    return version, techniques
+
+
+def get_index_path(cache_path: Path, domain: str, version: str) -> Path:
+    return cache_path / domain / INDEX_DIR_NAME / (version + ".json")
+
+
+def load_domain_index(domain: str, bundle_path: Path, cache_path: Path = INDEX_CACHE_PATH, resident: Dict[Tuple[str, str], Dict[str, TechniqueInfo]] | None = None) -> Tuple[str, Dict[str, TechniqueInfo]]:
+    """
+    Get the technique index of a domain's bundle -> (version, {technique ID: info})
+    - Taken from resident (if given) when this version was loaded before in this process
+    - Else read from its index file (under cache_path) if this version was indexed before
+    - Otherwise built from the bundle and written out for next time
+    Loaded indexes are kept in resident, keyed by (domain, version)
+    """
+    version = get_bundle_version(bundle_path)
+    if resident is not None and (domain, version) in resident:
+        return version, resident[(domain, version)]
+    index_path = get_index_path(cache_path, domain, version)
+    techniques = _read_domain_index(domain, index_path, version)
+    if techniques is None:
+        _, techniques = build_domain_index(domain, bundle_path)
+        _write_domain_index(domain, version, techniques, index_path)
+    if resident is not None:
+        resident[(domain, version)] = techniques
+    return version, techniques
+
+
+def _read_domain_index(domain: str, index_path: Path, version: str) -> Dict[str, TechniqueInfo] | None:
+    """A stored technique index (None if it's missing or in another format)"""
+    try:
+        with open(index_path, "r", encoding="utf-8") as index_file:
+            stored = json.load(index_file)
+    except FileNotFoundError:
+        return None
+    if stored.get("format") != INDEX_FORMAT:
+        return None
+    return {
+        tech_id: TechniqueInfo(domain=domain, attack_version=version, **info)
+        for tech_id, info in stored["techniques"].items()
+    }
+
+
+def _write_domain_index(domain: str, version: str, techniques: Dict[str, TechniqueInfo], index_path: Path) -> None:
+    with AtomicFile(index_path, "w") as index_file:
+        json.dump({
+            "format": INDEX_FORMAT,
+            "domain": domain,
+            "version": version,
+            "techniques": {
+                tech_id: {
+                    "name": info.name,
+                    "deprecated": info.deprecated,
+                    "revoked": info.revoked,
+                    "tactics": info.tactics,
+                    "revoked_by": info.revoked_by,
+                }
+                for tech_id, info in techniques.items()
+            },
+        }, index_file, indent=4)
+
+
+def merge_indexes(domain_indexes: Iterable[Dict[str, TechniqueInfo]]) -> Dict[str, TechniqueInfo]:
+    """Merge per-domain indexes into one lookup; earlier domains take precedence for shared IDs"""
+    merged: Dict[str, TechniqueInfo] = {}
+    for techniques in domain_indexes:
+        for tech_id, info in techniques.items():
+            merged.setdefault(tech_id, info)
+    return merged
@@ -0,0 +1,301 @@
+# ATT&CK Object Store
+# Keeps the ATT&CK versions of a domain as manifests over a deduplicated object store: each STIX
+# object revision (STIX ID + modified date) is stored once however many versions hold it, so retained
+# versions cost only what changed between them. Published <version>.json files are materialized from
+# the store; older ones are only unpublished on request (the prune command), and can be materialized
+# again on demand
+import argparse
+import hashlib
+import json
+import os
+import sys
+from glob import glob
+from pathlib import Path, PurePath
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Tuple
+from dataset_updater.artifacts import VARIANT_SUFFIXES, is_variant
+from dataset_updater.attack_delta import version_key
+from dataset_updater.attack_index import get_bundle_version
+from dataset_updater.files import AtomicFile, write_text
+from dataset_updater.slim_bundle import write_slim_objects
+from dataset_updater.stix import iter_bundle_objects
+
+# Store files: <store>/<domain>/ (default: the updater's github/ directory)
+# - Kept out of the served app data (shared/data/); index.json lists the versions held only here
+#   under attack_stored, so clients can ask for them to be materialized
+STORE_PATH = Path(__file__).parent.parent.parent / "github/attack-store"
+# Bumped when the layout of the store changes
+STORE_FORMAT = "1"
+
+
+def get_store_path(store_path: Path, domain: str) -> Path:
+    return store_path / domain
+
+
+def _revision_key(obj: dict) -> str:
+    """Key of an object revision: "<STIX ID>@<modified>" (created, for objects that are never modified)"""
+    return f"{obj['id']}@{obj.get('modified') or obj.get('created', '')}"
+
+
+class AttackStore:
+    """
+    The object store of one ATT&CK domain
+    - packs/<version>.jsonl: the object revisions first stored by that version, one minified
+      JSON object per line
+    - objects.json: revision key -> [pack version, byte offset, byte length, sha256] of every
+      stored revision
+    - manifests/<version>.json: a version's bundle properties and the keys of its objects, in
+      bundle order
+    Should ATT&CK change an object without bumping its modified date, the new content is stored
+    under "<revision key>#<sha256 prefix>"
+    """
+
+    def __init__(self, store_path: Path) -> None:
+        self.path = Path(store_path)
+        self.objects_path = self.path / "objects.json"
+        self._objects: Dict[str, list] | None = None
+
+    @property
+    def objects(self) -> Dict[str, list]:
+        """The stored revisions (read on first use)"""
+        if self._objects is None:
+            try:
+                with open(self.objects_path, "r", encoding="utf-8") as objects_file:
+                    self._objects = json.load(objects_file)
+            except FileNotFoundError:
+                self._objects = {}
+        return self._objects
+
+    def manifest_path(self, version: str) -> Path:
+        return self.path / "manifests" / (version + ".json")
+
+    def pack_path(self, version: str) -> Path:
+        return self.path / "packs" / (version + ".jsonl")
+
+    def versions(self) -> List[str]:
+        """The stored versions, oldest first"""
+        return sorted((PurePath(x).stem for x in glob(str(self.path / "manifests" / "*.json"))),
+                      key=version_key)
+
+    def has_version(self, version: str) -> bool:
+        return self.manifest_path(version).is_file()
+
+    def add_bundle(self, bundle_path: Path) -> Tuple[str, int]:
+        """
+        Store a bundle (one streaming pass) -> (its version, the number of revisions it added)
+        - Only revisions that aren't stored yet are written, to the version's pack
+        - The manifest is written last: a version is only listed once all of its objects are stored,
+          and adding it again after an interruption rewrites the same pack
+        """
+        version = get_bundle_version(bundle_path)
+        if self.has_version(version):
+            return version, 0
+        objects = self.objects
+        header: dict = {}
+        keys = []
+        added = 0
+        with AtomicFile(self.pack_path(version), "wb") as pack:
+            offset = 0
+            for obj in iter_bundle_objects(bundle_path, header):
+                data = json.dumps(obj, separators=(",", ":"),
+                                  ensure_ascii=False).encode("utf-8")
+                digest = hashlib.sha256(data).hexdigest()
+                key = _revision_key(obj)
+                entry = objects.get(key)
+                if entry is not None and entry[3] != digest:
+                    key = f"{key}#{digest[:12]}"
+                    entry = objects.get(key)
+                # Revisions this version stored before being interrupted go in its pack again
+                if entry is None or entry[0] == version:
+                    pack.write(data + b"\n")
+                    objects[key] = [version, offset, len(data), digest]
+                    offset += len(data) + 1
+                    added += 1
+                keys.append(key)
+        write_text(self.objects_path, json.dumps(objects, separators=(",", ":")))
+        write_text(self.manifest_path(version), json.dumps({
+            "format": STORE_FORMAT,
+            "version": version,
+            "header": header,
+            "objects": keys,
+        }, separators=(",", ":")))
+        return version, added
+
+    def _read_manifest(self, version: str) -> dict:
+        if not self.has_version(version):
+            raise ValueError(f"ATT&CK v{version} is not in the store {self.path}")
+        with open(self.manifest_path(version), "r", encoding="utf-8") as manifest_file:
+            return json.load(manifest_file)
+
+    def _iter_raw(self, keys: List[str]) -> Iterator[bytes]:
+        """The stored bytes of each revision, in keys order (packs are opened as they're needed)"""
+        objects = self.objects
+        packs: Dict[str, BinaryIO] = {}
+        try:
+            for key in keys:
+                pack_version, offset, length, _ = objects[key]
+                pack = packs.get(pack_version)
+                if pack is None:
+                    pack = packs[pack_version] = open(self.pack_path(pack_version), "rb")
+                pack.seek(offset)
+                yield pack.read(length)
+        finally:
+            for pack in packs.values():
+                pack.close()
+
+    def iter_objects(self, version: str, header: dict | None = None) -> Iterator[dict]:
+        """
+        Yield each object of a stored version, in bundle order (as iter_bundle_objects does)
+        - If header is given, the bundle's other top-level properties are stored in it
+        """
+        manifest = self._read_manifest(version)
+        if header is not None:
+            header.update(manifest["header"])
+        for data in self._iter_raw(manifest["objects"]):
+            yield json.loads(data)
+
+    def materialize(self, version: str, out_path: Path, slim: bool = False) -> bool:
+        """
+        Write a stored version as a bundle file (atomically), returns whether its content changed
+        - The stored bytes are copied as they are; objects are only decoded for a slim bundle
+        """
+        if slim:
+            return write_slim_objects(
+                lambda header=None: self.iter_objects(version, header), out_path)
+        manifest = self._read_manifest(version)
+        writer = AtomicFile(out_path, "wb")
+        with writer as out_file:
+            out_file.write(b"{")
+            for key, value in manifest["header"].items():
+                out_file.write(
+                    f"{json.dumps(key)}:{json.dumps(value)},".encode("utf-8"))
+            out_file.write(b'"objects":[')
+            for ind, data in enumerate(self._iter_raw(manifest["objects"])):
+                if ind:
+                    out_file.write(b",")
+                out_file.write(data)
+            out_file.write(b"]}")
+        return writer.changed
+
+    def stats(self) -> Dict[str, int]:
+        """Number of versions and stored revisions, and the bytes of the packs"""
+        return {
+            "versions": len(self.versions()),
+            "revisions": len(self.objects),
+            "pack_bytes": sum(os.path.getsize(x) for x in glob(str(self.path / "packs" / "*.jsonl"))),
+        }
+
+
+def list_published(domain_path: Path) -> List[str]:
+    """The versions published as <version>.json files in a domain directory, oldest first"""
+    return sorted((PurePath(x).stem for x in glob(str(domain_path / "*.json")) if not is_variant(x)),
+                  key=version_key)
+
+
+def list_stored_only(store_path: Path, domain: str, published: Iterable[str]) -> List[str]:
+    """The versions of a domain held by the store but not published, oldest first (for index.json)"""
+    published = set(published)
+    return [version for version in AttackStore(get_store_path(store_path, domain)).versions()
+            if version not in published]
+
+
+def store_published(store: AttackStore, domain: str, domain_path: Path) -> None:
+    """Add the published versions that aren't stored yet (ex: the first time the store is used)"""
+    for version in list_published(domain_path):
+        if not store.has_version(version):
+            _, added = store.add_bundle(domain_path / (version + ".json"))
+            print(
+                f"     [+] Stored ATT&CK {domain} v{version}: {added} new object revisions.")
+
+
+def prune_published(store: AttackStore, domain: str, domain_path: Path, keep: int) -> List[str]:
+    """
+    Remove the published files (and their variants, see artifacts) of all but the keep newest versions,
+    returns the removed versions
+    - Only versions held by the store are removed, so they can be materialized again; index.json
+      lists them under attack_stored
+    - Never done by the updater itself: clients can't get a removed version until it's materialized
+      again, so it's only run on request (the prune command)
+    """
+    published = list_published(domain_path)
+    removed = []
+    for version in published[:max(0, len(published) - keep)]:
+        if not store.has_version(version):
+            continue
+        for suffix in [".json"] + VARIANT_SUFFIXES:
+            file_path = domain_path / (version + suffix)
+            if file_path.exists():
+                file_path.unlink()
+        removed.append(version)
+        print(
+            f"     [-] Removed the published ATT&CK {domain} v{version} (still stored, listed under attack_stored).")
+    return removed
+
+
+def main():
+    # util lists the stored versions in index.json (list_stored_only), so it's imported here
+    from dataset_updater.util import update_index
+
+    parser = argparse.ArgumentParser(prog='python3 -m dataset_updater.attack_store',
+                                     description='List the ATT&CK versions kept in the object store, materialize one as a published <version>.json file, or unpublish older ones (updating index.json). Run from the scripts/ directory.')
+    parser.add_argument('--attack-data', type=Path,
+                        default=Path(__file__).parent.parent.parent / "shared/data/attack",
+                        help=f"ATT&CK data directory (default: the app's shared/data/attack).")
+    parser.add_argument('--store', type=Path, default=STORE_PATH,
+                        help=f"Object store directory (default: the updater's github/attack-store).")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser('list', help=f"List the stored versions of each domain, and the store sizes.")
+    materialize = commands.add_parser(
+        'materialize', help=f"Write a stored version to <attack data>/<domain>/<version>.json.")
+    materialize.add_argument('domain', help=f"ATT&CK domain (ex: enterprise).")
+    materialize.add_argument('version', help=f"ATT&CK version (ex: 15.1).")
+    materialize.add_argument('--slim', action="store_true",
+                             help=f"Write a slim bundle (see --slim-attack).")
+    prune = commands.add_parser(
+        'prune', help=f"Remove the published files of all but the KEEP newest versions of each domain (only versions held by the store; they're listed under attack_stored in index.json).")
+    prune.add_argument('keep', type=int, help=f"Number of newest versions kept published per domain (at least 1).")
+    prune.add_argument('--domain', action="append",
+                       help=f"Only prune this ATT&CK domain (ex: enterprise); can be repeated (default: every stored domain).")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for store_path in sorted(args.store.glob("*/")):
+            store = AttackStore(store_path)
+            versions = store.versions()
+            if not versions:
+                continue
+            stats = store.stats()
+            published = set(list_published(args.attack_data / store_path.name))
+            print(f"  [i] {store_path.name}: {stats['revisions']} object revisions in {stats['pack_bytes'] / 1e6:.1f} MB of packs.")
+            for version in versions:
+                state = "published" if version in published else "stored only"
+                print(f"        {version:<8} {state}")
+        return
+
+    if args.command == "prune":
+        if args.keep < 1:
+            parser.error("prune must keep at least 1 version")
+        removed = []
+        for store_path in sorted(args.store.glob("*/")):
+            if args.domain and store_path.name not in args.domain:
+                continue
+            removed += prune_published(AttackStore(store_path), store_path.name,
+                                       args.attack_data / store_path.name, args.keep)
+        if removed:
+            update_index(True, False, args.attack_data.parent / "index.json", args.attack_data, args.store)
+        else:
+            print(f"  [-] Nothing to prune.")
+        return
+
+    store = AttackStore(get_store_path(args.store, args.domain))
+    out_path = args.attack_data / args.domain / (args.version + ".json")
+    try:
+        store.materialize(args.version, out_path, args.slim)
+    except ValueError as ex:
+        print(f"  [-] {ex}.")
+        sys.exit(1)
+    print(f"  [+] Wrote to {out_path}")
+    update_index(True, False, args.attack_data.parent / "index.json", args.attack_data, args.store)
+
+
+if __name__ == "__main__":
+    main()
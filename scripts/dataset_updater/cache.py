@@ -0,0 +1,98 @@
+# Parsed-file Cache
+# Keeps the results of load_item/load_template between runs, so only new or changed files get re-parsed
+import hashlib
+import pickle
+from pathlib import Path
+from typing import Any, Callable, Dict, Tuple
+from dataset_updater.files import AtomicFile
+
+# Modules whose source determines what a parse produces
+# - Editing any of them invalidates every cache entry
+PARSER_MODULES = ["dataset_types.py", "item_parsing.py",
+                  "markdown_backends.py", "util.py"]
+# Layout of the cache entries (bump when it changes)
+CACHE_FORMAT = "3"
+
+
+def file_digest(path: str | Path) -> str:
+    """SHA-256 hex digest of a file's bytes"""
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def parser_stamp() -> str:
+    """Version stamp of the parsing code (hash of PARSER_MODULES' source) and cache format"""
+    digest = hashlib.sha256(CACHE_FORMAT.encode())
+    module_dir = Path(__file__).parent
+    for name in PARSER_MODULES:
+        digest.update(name.encode())
+        digest.update((module_dir / name).read_bytes())
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """
+    On-disk cache of parse results
+    - Entries are keyed by loader (and its extra arguments, ex: the markdown backend) + path, and
+      only valid for the same file content hash
+    - The whole cache is dropped when the parser stamp changes
+    - Entries not used during a run (deleted files) are evicted on save, unless kept (see keep)
+    - Results are kept pickled until they're looked up, so a large cache stays compact in memory
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.stamp = parser_stamp()
+        # key -> (content digest, pickled (result, captured output))
+        self.entries: Dict[tuple, Tuple[str, bytes]] = {}
+        self.used: Dict[tuple, Tuple[str, bytes]] = {}
+        # key -> content digest, of files looked up but not (validly) cached
+        self.pending: Dict[tuple, str] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(loader: Callable, path: str, args: tuple = ()) -> tuple:
+        return (loader.__name__, *args, str(path))
+
+    def read(self) -> None:
+        """Load entries from disk; a missing, stale, or unreadable cache is ignored"""
+        try:
+            with open(self.path, "rb") as file:
+                stamp, entries = pickle.load(file)
+        except Exception:
+            return
+        if stamp == self.stamp:
+            self.entries = entries
+
+    def get(self, loader: Callable, path: str, args: tuple = ()) -> Tuple[Any, str] | None:
+        """(result, captured output) of loader(path, *args) if path's content is unchanged, else None"""
+        key = self._key(loader, path, args)
+        digest = file_digest(path)
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] == digest:
+            self.used[key] = entry
+            self.hits += 1
+            return pickle.loads(entry[1])
+        self.pending[key] = digest
+        self.misses += 1
+        return None
+
+    def put(self, loader: Callable, path: str, result: Any, output: str, args: tuple = ()) -> None:
+        """Record a fresh parse of path (which must have been looked up with get first)"""
+        key = self._key(loader, path, args)
+        self.used[key] = (self.pending.pop(key), pickle.dumps(
+            (result, output), protocol=pickle.HIGHEST_PROTOCOL))
+
+    def keep(self, root: str | Path) -> None:
+        """Keep the entries of the files under root on save, without looking them up (ex: files not loaded this run)"""
+        root = Path(root)
+        for key, entry in self.entries.items():
+            if key not in self.used and root in Path(key[-1]).parents:
+                self.used[key] = entry
+
+    def save(self) -> None:
+        """Write the entries used in this run back to disk"""
+        with AtomicFile(self.path, "wb") as file:
+            pickle.dump((self.stamp, self.used), file,
+                        protocol=pickle.HIGHEST_PROTOCOL)
@@ -0,0 +1,123 @@
+# Dataset Index
+# Precomputed lookups over a dataset's items, written as a sidecar to its JSON file
+# (ex: latest.json -> latest.index.json), so consumers don't rebuild them at load time
+import json
+from pathlib import Path
+from typing import Dict, List, Set
+from dataset_updater.dataset_types import *
+from dataset_updater.files import write_text
+
+# Sidecar suffix (ex: latest.json -> latest.index.json)
+INDEX_SUFFIX = ".index.json"
+# Bumped when the layout of the index changes
+INDEX_FORMAT = "1.0"
+
+
+def get_index_path(dataset_path: Path) -> Path:
+    """The sidecar index path of a dataset file"""
+    dataset_path = Path(dataset_path)
+    return dataset_path.with_name(dataset_path.name[:-len(".json")] + INDEX_SUFFIX)
+
+
+def get_parent_tech_id(tech_id: str) -> str:
+    """T1003.001 -> T1003 (techniques that aren't sub-techniques are their own parent)"""
+    return tech_id.split(".")[0]
+
+
+def _sorted_lists(mapping: Dict[str, Set[str]]) -> Dict[str, List[str]]:
+    return {key: sorted(mapping[key]) for key in sorted(mapping)}
+
+
+class DatasetIndex:
+    """
+    Lookups built one item at a time (only IDs are kept, so it works on streamed items)
+    - technique_to_items: technique ID -> IDs of the items mapped to it
+    - technique_rollup: parent technique ID -> items mapped to it or to any of its sub-techniques
+    - subtechnique_to_parent: sub-technique ID -> parent technique ID
+    - item_to_related: item ID -> related item IDs
+    - revoked_by: revoked item ID -> the item ID that revoked it (ItemRevoked.by_id)
+    - deprecated: IDs of the deprecated items (they have no replacement)
+    - replacement: revoked item ID -> the active item that finally replaces it, following
+      chains of revocations (left out when the chain ends at an unknown/deprecated item or loops)
+    """
+
+    def __init__(self, dataset: Dataset) -> None:
+        self.dataset_id = dataset.id
+        self.version = dataset.version
+        self.item_ids: Set[str] = set()
+        self.technique_to_items: Dict[str, Set[str]] = {}
+        self.item_to_related: Dict[str, Set[str]] = {}
+        self.revoked_by: Dict[str, str] = {}
+        self.deprecated: Set[str] = set()
+
+    def add_item(self, item: Item) -> None:
+        self.item_ids.add(item.id)
+        for tech in item.techniques:
+            self.technique_to_items.setdefault(
+                tech.tech_id, set()).add(item.id)
+        self.item_to_related.setdefault(
+            item.id, set()).update(item.related_ids)
+        if item.revoked is not None:
+            self.revoked_by[item.id] = item.revoked.by_id
+        elif item.deprecated is not None:
+            self.deprecated.add(item.id)
+
+    def _replacement(self, item_id: str) -> str | None:
+        seen = {item_id}
+        replacement = self.revoked_by[item_id]
+        while replacement in self.revoked_by:
+            if replacement in seen:
+                return None
+            seen.add(replacement)
+            replacement = self.revoked_by[replacement]
+        if replacement not in self.item_ids or replacement in self.deprecated:
+            return None
+        return replacement
+
+    def to_json(self) -> dict:
+        rollup: Dict[str, Set[str]] = {}
+        subtechnique_to_parent: Dict[str, str] = {}
+        for tech_id, item_ids in self.technique_to_items.items():
+            parent_id = get_parent_tech_id(tech_id)
+            if parent_id != tech_id:
+                subtechnique_to_parent[tech_id] = parent_id
+            rollup.setdefault(parent_id, set()).update(item_ids)
+        replacement = {}
+        for item_id in sorted(self.revoked_by):
+            final_id = self._replacement(item_id)
+            if final_id is not None:
+                replacement[item_id] = final_id
+        return {
+            "format": INDEX_FORMAT,
+            "dataset": self.dataset_id,
+            "version": self.version,
+            "technique_to_items": _sorted_lists(self.technique_to_items),
+            "technique_rollup": _sorted_lists(rollup),
+            "subtechnique_to_parent": dict(sorted(subtechnique_to_parent.items())),
+            "item_to_related": _sorted_lists(self.item_to_related),
+            "revoked_by": dict(sorted(self.revoked_by.items())),
+            "deprecated": sorted(self.deprecated),
+            "replacement": replacement,
+        }
+
+
+def read_index_techniques(dataset_path: Path) -> Set[str] | None:
+    """The technique IDs mapped in a dataset's sidecar index (None if it's missing or in another format)"""
+    try:
+        with open(get_index_path(dataset_path), "r", encoding="utf-8") as index_file:
+            stored = json.load(index_file)
+    except FileNotFoundError:
+        return None
+    if stored.get("format") != INDEX_FORMAT:
+        return None
+    return set(stored["technique_to_items"])
+
+
+def write_dataset_index(index: DatasetIndex, dataset_path: Path) -> bool:
+    """Write the sidecar index of a dataset file (atomically), returns whether its content changed"""
+    index_path = get_index_path(dataset_path)
+    if write_text(index_path, json.dumps(index.to_json(), indent=4)):
+        print(f"  [+] Wrote to {index_path}")
+        return True
+    print(f"  [-] {index_path} content is unchanged, not rewritten.")
+    return False
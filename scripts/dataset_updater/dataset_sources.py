@@ -0,0 +1,159 @@
+# Dataset Sources
+# The datasets (and versions) the updater builds in one run, read from a JSON config file:
+#   {"datasets": [
+#       {"id": "coun7er", "version": "latest"},
+#       {"id": "coun7er", "version": "2025.03", "ref": "<commit or tag>"},
+#       {"id": "acme", "version": "latest", "name": "ACME Countermeasures", "source": "/srv/acme-cms"}
+#   ]}
+import io
+import json
+import re
+import shlex
+import subprocess
+import tarfile
+from dataclasses import dataclass
+from pathlib import Path
+from shutil import rmtree
+from typing import Dict, List
+from dataset_updater.dataset_index import get_index_path
+from dataset_updater.search_index import get_search_path
+
+# The mutable version, rebuilt on every run; any other version is an immutable snapshot
+LATEST_VERSION = "latest"
+# IDs and versions are used as file/directory names (datasets/<id>/<version>.json)
+NAME_P = re.compile(r"[A-Za-z0-9][A-Za-z0-9._-]*")
+# Display names of the known datasets (others default to their ID)
+DATASET_NAMES = {"coun7er": "CISA COUN7ER"}
+# Config keys of a dataset entry
+SOURCE_KEYS = {"id", "version", "name", "url", "source", "ref", "baseline"}
+
+# Git commands
+VERIFY_REF_COMMAND = "git -C {0} cat-file -e {1}^{{commit}}"
+FETCH_REF_COMMAND = "git -C {0} fetch origin {1}"
+SHALLOW_FETCH_REF_COMMAND = "git -C {0} fetch --depth 1 origin {1}"
+ARCHIVE_COMMAND = "git -C {0} archive --format=tar {1}"
+
+
+@dataclass
+class DatasetSource:
+    id: str
+    version: str = LATEST_VERSION
+    # Dataset display name and URL (name default: see DATASET_NAMES)
+    name: str | None = None
+    url: str | None = None
+    # Git URL, local directory or tarball; None: the COUN7ER repo the updater fetches
+    source: str | None = None
+    # Commit/tag to build the snapshot from (git sources); None: the fetched HEAD
+    ref: str | None = None
+    # Countermeasures marked as baseline; None: the updater's baseline IDs
+    baseline_ids: List[str] | None = None
+
+    @property
+    def key(self) -> str:
+        return f"{self.id}/{self.version}"
+
+    @property
+    def display_name(self) -> str:
+        return self.name or DATASET_NAMES.get(self.id, self.id)
+
+    @property
+    def immutable(self) -> bool:
+        """Snapshots (any version but latest) are published once and never rewritten"""
+        return self.version != LATEST_VERSION
+
+    @property
+    def is_git(self) -> bool:
+        """Whether source is a git remote (rather than a local directory or tarball)"""
+        return self.source is not None and (
+            "://" in self.source or self.source.startswith("git@") or self.source.endswith(".git"))
+
+    def dataset_path(self, datasets_path: Path) -> Path:
+        return datasets_path / self.id / (self.version + ".json")
+
+    def is_published(self, datasets_path: Path) -> bool:
+        """Whether the dataset file and its sidecars were all written (by an earlier run)"""
+        dataset_path = self.dataset_path(datasets_path)
+        return all(path.is_file() for path in (
+            dataset_path, get_index_path(dataset_path), get_search_path(dataset_path)))
+
+
+def parse_dataset_source(entry: dict) -> DatasetSource:
+    """A dataset source from its config entry (ValueError if it's invalid)"""
+    if not isinstance(entry, dict) or "id" not in entry:
+        raise ValueError(f"dataset entry {entry!r} has no id")
+    unknown = set(entry) - SOURCE_KEYS
+    if unknown:
+        raise ValueError(
+            f"dataset entry {entry['id']!r} has unknown key(s): {', '.join(sorted(unknown))}")
+    source = DatasetSource(
+        id=entry["id"],
+        version=entry.get("version", LATEST_VERSION),
+        name=entry.get("name"),
+        url=entry.get("url"),
+        source=entry.get("source"),
+        ref=entry.get("ref"),
+        baseline_ids=entry.get("baseline"),
+    )
+    for value in (source.id, source.version):
+        if not isinstance(value, str) or not NAME_P.fullmatch(value):
+            raise ValueError(
+                f"invalid dataset id/version {value!r} (letters, digits, '.', '_' and '-' only)")
+    if source.ref is not None and source.source is not None and not source.is_git:
+        raise ValueError(
+            f"dataset {source.key} has a ref, but its source is not a git repo")
+    return source
+
+
+def load_dataset_sources(config_path: Path) -> List[DatasetSource]:
+    """Read the dataset sources of a config file, in config order (ValueError if it's invalid)"""
+    with open(config_path, "r", encoding="utf-8") as config_file:
+        config = json.load(config_file)
+    sources = [parse_dataset_source(entry)
+               for entry in config.get("datasets", [])]
+    if not sources:
+        raise ValueError(f"{config_path} lists no datasets")
+    seen = set()
+    for source in sources:
+        if source.key in seen:
+            raise ValueError(f"dataset {source.key} is listed more than once")
+        seen.add(source.key)
+    return sources
+
+
+def get_git_sources(sources: List[DatasetSource]) -> Dict[str, str]:
+    """Git URL -> the ID of the first dataset using it (the name of its clone directory)"""
+    repos: Dict[str, str] = {}
+    for source in sources:
+        if source.is_git:
+            repos.setdefault(source.source, source.id)
+    return repos
+
+
+def extract_snapshot(repo_path: Path, ref: str, snapshot_path: Path) -> Path:
+    """
+    Write the files of a commit/tag of a git checkout to snapshot_path, returns it
+    - A ref missing from the clone (ex: a shallow one) is fetched first (only that commit,
+      if the clone is shallow)
+    """
+    quoted_ref = shlex.quote(ref)
+    try:
+        subprocess.check_output(VERIFY_REF_COMMAND.format(
+            repo_path, quoted_ref), shell=True, stderr=subprocess.DEVNULL)
+    except subprocess.CalledProcessError:
+        shallow = (Path(repo_path) / ".git/shallow").exists()
+        command = SHALLOW_FETCH_REF_COMMAND if shallow else FETCH_REF_COMMAND
+        subprocess.check_output(command.format(
+            repo_path, quoted_ref), shell=True, encoding="utf-8")
+        quoted_ref = "FETCH_HEAD"
+    if snapshot_path.is_dir():
+        rmtree(snapshot_path)
+    snapshot_path.mkdir(parents=True)
+    archive = subprocess.check_output(ARCHIVE_COMMAND.format(
+        repo_path, quoted_ref), shell=True)
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        # extraction filters are only in newer Pythons (3.11.4+)
+        if hasattr(tarfile, "data_filter"):
+            tar.extractall(snapshot_path, filter="data")
+        else:
+            tar.extractall(snapshot_path)
+    return snapshot_path
@@ -1,33 +1,61 @@
 from dataclasses import dataclass
 from typing import Dict, Any, List, Literal
 
+# Records are slotted (no per-instance __dict__); to_json() gives the plain JSON form,
+# with keys in field order
 
-@dataclass
+
+@dataclass(slots=True)
 class Reference:
     source_name: str
     description: None | str
     url: None | str
 
+    def to_json(self) -> dict:
+        return {
+            "source_name": self.source_name,
+            "description": self.description,
+            "url": self.url,
+        }
+
 
-@dataclass
+@dataclass(slots=True)
 class MappedTech:
     tech_id: str
     content: None | str
     details: None | Dict[str, Any]
 
+    def to_json(self) -> dict:
+        return {
+            "tech_id": self.tech_id,
+            "content": self.content,
+            "details": self.details,
+        }
+
 
-@dataclass
+@dataclass(slots=True)
 class ItemDeprecated:
     reason: str
 
+    def to_json(self) -> dict:
+        return {
+            "reason": self.reason,
+        }
 
-@dataclass
+
+@dataclass(slots=True)
 class ItemRevoked:
     reason: str
     by_id: str
 
+    def to_json(self) -> dict:
+        return {
+            "reason": self.reason,
+            "by_id": self.by_id,
+        }
+
 
-@dataclass
+@dataclass(slots=True)
 class Item:
     id: str
     name: str
@@ -50,14 +78,44 @@ class Item:
     references: List[Reference]
     techniques: List[MappedTech]
 
-
-@dataclass
+    def to_json(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "subtype": self.subtype,
+            "url": self.url,
+            "content": self.content,
+            "version": self.version,
+            "created": self.created,
+            "modified": self.modified,
+            "contributors": self.contributors,
+            "technologies": self.technologies,
+            "platforms": self.platforms,
+            "revoked": None if self.revoked is None else self.revoked.to_json(),
+            "deprecated": None if self.deprecated is None else self.deprecated.to_json(),
+            "ids_before_this": self.ids_before_this,
+            "ids_after_this": self.ids_after_this,
+            "is_baseline": self.is_baseline,
+            "related_ids": self.related_ids,
+            "automatable": self.automatable,
+            "references": [ref.to_json() for ref in self.references],
+            "techniques": [tech.to_json() for tech in self.techniques],
+        }
+
+
+@dataclass(slots=True)
 class TemplateLink:
     url: str
     text: str
 
+    def to_json(self) -> dict:
+        return {
+            "url": self.url,
+            "text": self.text,
+        }
+
 
-@dataclass
+@dataclass(slots=True)
 class Template:
     id: str
     name: str
@@ -68,8 +126,20 @@ class Template:
     tech_to_items: dict
     ignored_items: List[str]
 
+    def to_json(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "featured": self.featured,
+            "iconSrc": self.iconSrc,
+            "link": None if self.link is None else self.link.to_json(),
+            "description": self.description,
+            "tech_to_items": self.tech_to_items,
+            "ignored_items": self.ignored_items,
+        }
 
-@dataclass
+
+@dataclass(slots=True)
 class Dataset:
     id: str
     version: str
@@ -79,3 +149,15 @@ class Dataset:
     item_type: str
     items: List[Item]
     templates: List[Template]
+
+    def to_json(self) -> dict:
+        return {
+            "id": self.id,
+            "version": self.version,
+            "name": self.name,
+            "url": self.url,
+            "spec_version": self.spec_version,
+            "item_type": self.item_type,
+            "items": [item.to_json() for item in self.items],
+            "templates": [template.to_json() for template in self.templates],
+        }
@@ -0,0 +1,110 @@
+# Output Files
+# Atomic writes that leave the target untouched when its content would not change
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from shutil import copyfileobj
+
+
+def file_sha256(path: str | Path) -> str | None:
+    """SHA-256 hex digest of a file's bytes (None if it doesn't exist)"""
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                digest.update(chunk)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+class AtomicFile:
+    """
+    Write a file through a temp file + fsync + rename
+    - Readers never see a partially written file; on error the target is left as it was
+    - If the new content hashes the same as the existing file, the target isn't touched
+    - After the with-block, .changed tells whether the target was replaced
+
+    with AtomicFile(path, "w") as file:
+        file.write(...)
+    """
+
+    def __init__(self, path: str | Path, mode: str = "w", encoding: str | None = "utf-8") -> None:
+        if mode not in ("w", "wt", "wb"):
+            raise ValueError(f"unsupported mode {mode!r}")
+        self.path = Path(path)
+        self.mode = mode
+        self.encoding = None if "b" in mode else encoding
+        self.changed = False
+        self._temp_path: str | None = None
+        self._file = None
+
+    def __enter__(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, self._temp_path = tempfile.mkstemp(
+            dir=self.path.parent, prefix=f".{self.path.name}.", suffix=".tmp")
+        self._file = os.fdopen(fd, self.mode, encoding=self.encoding)
+        return self._file
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        try:
+            if exc_type is None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            self._file.close()
+            if exc_type is not None:
+                return
+            if file_sha256(self._temp_path) == file_sha256(self.path):
+                return
+            # mkstemp creates files as 0600; keep the target's mode (or a usual default)
+            try:
+                file_mode = os.stat(self.path).st_mode & 0o777
+            except FileNotFoundError:
+                file_mode = 0o644
+            os.chmod(self._temp_path, file_mode)
+            os.replace(self._temp_path, self.path)
+            self._temp_path = None
+            self.changed = True
+            _fsync_dir(self.path.parent)
+        finally:
+            if self._temp_path is not None and os.path.exists(self._temp_path):
+                os.remove(self._temp_path)
+
+
+def _fsync_dir(dir_path: Path) -> None:
+    """Persist a rename (not supported everywhere, ex: Windows)"""
+    try:
+        fd = os.open(dir_path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def write_text(path: str | Path, text: str) -> bool:
+    """Atomically write text (utf-8), returns whether the file changed"""
+    writer = AtomicFile(path, "w")
+    with writer as file:
+        file.write(text)
+    return writer.changed
+
+
+def write_bytes(path: str | Path, data: bytes) -> bool:
+    """Atomically write bytes, returns whether the file changed"""
+    writer = AtomicFile(path, "wb")
+    with writer as file:
+        file.write(data)
+    return writer.changed
+
+
+def copy_file(src_path: str | Path, dest_path: str | Path) -> bool:
+    """Atomically copy a file, returns whether the destination changed"""
+    writer = AtomicFile(dest_path, "wb")
+    with writer as file, open(src_path, "rb") as src_file:
+        copyfileobj(src_file, file)
+    return writer.changed
@@ -1,16 +1,13 @@
 from pathlib import Path
-from typing import List, Union
+from typing import Dict, List, Union
 from collections import OrderedDict
 from dataclasses import dataclass
+from functools import cached_property
 from dataset_updater.dataset_types import *
+from dataset_updater.markdown_backends import DEFAULT_BACKEND, MarkdownBackend, open_backend
 import string
 import re
 
-# DOM-esque facilities for Reference parsing
-from markdown import markdown
-from bs4 import BeautifulSoup, Tag
-from urllib.parse import urlparse
-
 FAIL_ON_MISSING_HEADINGS = True
 
 # Remediation ID
@@ -32,6 +29,43 @@ STATUS_P = re.compile(r"\*\*Status(?:\*\*:|:\*\*)\s+(.*)")
 # Revoked status sub-fields
 REASON_P = re.compile(r"\*\*Reason(?:\*\*:|:\*\*)\s+(.*)")
 BY_ID_P = re.compile(r"\*\*By ID(?:\*\*:|:\*\*)\s+(.*)")
+# Metadata labels (ex: "**Version:**"), and the countermeasure ID, in one pattern so the
+# header is read in a single scan (see MDFile.header)
+HEADER_LABEL_P = re.compile(
+    r"\*\*(?P<label>Version|Created|Modified|Type|Status|Reason|By ID)(?:\*\*:|:\*\*)"
+    r"|(?P<id>" + MITI_ID_P.pattern + ")")
+# Label -> (record field, pattern of the labelled value)
+HEADER_FIELDS = {
+    "Version": ("version", VERSION_P),
+    "Created": ("created", CREATED_P),
+    "Modified": ("modified", MODIFIED_P),
+    "Type": ("type", TYPE_P),
+    "Status": ("status", STATUS_P),
+    "Reason": ("reason", REASON_P),
+    "By ID": ("by_id", BY_ID_P),
+}
+# Fields whose value is stripped
+HEADER_STRIPPED = {"type", "status", "reason", "by_id"}
+# fancy unicode -> ASCII
+# \u00e4 ä (can keep)
+# - Applied with str.replace, which scans in C and returns the same string when there's
+#   nothing to replace; str.translate with multi-character replacements is far slower
+NORMALIZE_REPLACEMENTS = [
+    ("\u2018", "'"),  # left single quote
+    ("\u2019", "'"),  # right single quote
+    ("\u201c", '"'),  # left double quote
+    ("\u201d", '"'),  # right double quote
+    ("\u00ad", "-"),  # soft hyphen
+    ("\u2013", "-"),  # en dash (short)
+    ("\u2014", "--"),  # em dash (long)
+    ("\u2026", "..."),  # elipses ...
+    ("\u00a0", " "),  # non-breaking space
+]
+# Link underlines, and old remediation IDs (RM -> CM)
+UNDERLINE_P = re.compile(r"</?u>")
+OLD_ID_P = re.compile(r"RM([0-9]{4}(?:\.[0-9]{3})?)")
+# Remediation ID, current or old (see read_header_id)
+HEADER_ID_P = re.compile(r"[CR]M([0-9]{4}(?:\.[0-9]{3})?)")
 
 # Class for extracting text from each markdown section
 
@@ -49,6 +83,21 @@ class SectionContent:
     references: str = ""
 
 
+# Metadata header fields of a countermeasure (None when missing)
+
+
+@dataclass
+class MDHeader:
+    id: str | None = None
+    version: str | None = None
+    type: str | None = None
+    created: str | None = None
+    modified: str | None = None
+    status: str | None = None
+    reason: str | None = None
+    by_id: str | None = None
+
+
 # Section content with the appropriate regexes for each section
 HEADING_REGEXES = SectionContent(
     pre=r"# .*",
@@ -63,155 +112,165 @@ HEADING_REGEXES = SectionContent(
 )
 
 
+# All section headings as one alternation, each in a group named after its section
+# - Alternatives are tried in HEADING_REGEXES order, so the first full match wins
+HEADINGS_P = re.compile("|".join(
+    f"(?P<{h_name}>{h_pattern})"
+    for h_name, h_pattern in HEADING_REGEXES.__dict__.items()
+), flags=re.I)
+
+
 def is_which_heading(line: str) -> Union[str, None]:
-    for h_name, h_pattern in HEADING_REGEXES.__dict__.items():
-        if re.fullmatch(h_pattern, line, flags=re.I):
-            return h_name
+    # every heading pattern starts with "#"
+    if not line.startswith("#"):
+        return None
+    match = HEADINGS_P.fullmatch(line)
+    if match:
+        return match.lastgroup
+    return None
+
+
+def find_headings(lines: List[str]) -> Dict[int, str]:
+    """Single scan over lines -> {line index: section name} for every section heading"""
+    ind_to_head: Dict[int, str] = OrderedDict()
+    fullmatch = HEADINGS_P.fullmatch
+    for ind, line in enumerate(lines):
+        if line.startswith("#"):
+            match = fullmatch(line)
+            if match:
+                ind_to_head[ind] = match.lastgroup
+    return ind_to_head
+
+
+def read_header_id(path: str | Path) -> str | None:
+    """
+    The countermeasure ID of a file's metadata header, read without parsing the file
+    - Only the lines up to the first section after the title are read; old RM IDs read as CM
+    - None when the header has no ID (loading the file reports why)
+    """
+    with open(path, "rt") as file:
+        in_header = False
+        for line in file:
+            line = line.rstrip("\n")
+            if is_which_heading(line):
+                if in_header:
+                    return None
+                in_header = True
+                continue
+            if in_header and ("CM" in line or "RM" in line):
+                match = HEADER_ID_P.search(line)
+                if match:
+                    return "CM" + match.group(1)
     return None
 
 
 class MDFile:
-    def __init__(self, path: str | Path) -> None:
+    def __init__(self, path: str | Path, backend: str = DEFAULT_BACKEND) -> None:
         self.path = path
+        # Name of the markdown backend reading links, references and IDs (see markdown_backends)
+        self.backend = backend
         with open(self.path, "rt") as file:
             text = file.read()
 
-        # fancy unicode -> ASCII
-        # \u00e4 ä (can keep)
-        for char, repl in [
-            ["\u2018", "'"],  # left single quote
-            ["\u2019", "'"],  # right single quote
-            ["\u201c", '"'],  # left double quote
-            ["\u201d", '"'],  # right double quote
-            ["\u00ad", "-"],  # soft hyphen
-            ["\u2013", "-"],  # en dash (short)
-            ["\u2014", "--"],  # em dash (long)
-            ["\u2026", "..."],  # elipses ...
-            ["\u00a0", " "],  # non-breaking space
-        ]:
-            text = text.replace(char, repl)
+        # fancy unicode -> ASCII (ASCII-only text has nothing to replace; isascii() doesn't scan it)
+        if not text.isascii():
+            for char, repl in NORMALIZE_REPLACEMENTS:
+                text = text.replace(char, repl)
 
         # remove underline from links (HTML provides it anyways)
-        text = re.sub(r"</?u>", "", text)
+        if "u>" in text:
+            text = UNDERLINE_P.sub("", text)
 
         # correct ids: RM -> CM
-        text = re.sub(r"RM([0-9]{4}(?:\.[0-9]{3})?)", r"CM\1", text)
+        if "RM" in text:
+            text = OLD_ID_P.sub(r"CM\1", text)
 
         self.text: str = text
+        self.heading_lines: Dict[int, str] = find_headings(self.lines)
         self.section_content = self.__get_section_content()
 
+    @cached_property
+    def header(self) -> "MDHeader":
+        """
+        The metadata header (the text before the first section), read in one scan
+        - Each field is the first labelled value matching its pattern, as a search with
+          that pattern would find; missing fields are None
+        """
+        pre = self.section_content.pre
+        header = MDHeader()
+        for match in HEADER_LABEL_P.finditer(pre):
+            if match.lastgroup == "id":
+                if header.id is None:
+                    header.id = match.group("id")
+                continue
+            field, pattern = HEADER_FIELDS[match.group("label")]
+            if getattr(header, field) is not None:
+                continue
+            value = pattern.match(pre, match.start())
+            if value:
+                value = value.group(1)
+                setattr(header, field, value.strip() if field in HEADER_STRIPPED else value)
+        return header
+
     @property
     def version(self) -> str:
-        match = re.search(VERSION_P, self.section_content.pre)
-        if match:
-            return match.group(1)
-        else:
+        if self.header.version is None:
             raise Exception("no version found")
+        return self.header.version
 
     @property
     def type(self) -> str | None:
-        match = re.search(TYPE_P, self.section_content.pre)
-        if match:
-            return match.group(1).strip()
-        else:
-            return None
+        return self.header.type
 
     @property
     def id(self) -> str:
-        match = re.search(MITI_ID_P, self.section_content.pre)
-        if match:
-            return match.group(0)
-        else:
+        if self.header.id is None:
             raise Exception("no ID found")
+        return self.header.id
 
     @property
     def created(self) -> str:
-        match = re.search(CREATED_P, self.section_content.pre)
-        if match:
-            return match.group(1)
-        else:
+        if self.header.created is None:
             raise Exception("no created timestamp found")
+        return self.header.created
 
     @property
     def modified(self) -> str:
-        match = re.search(MODIFIED_P, self.section_content.pre)
-        if match:
-            return match.group(1)
-        else:
+        if self.header.modified is None:
             raise Exception("no modified timestamp found")
+        return self.header.modified
 
     @property
     def status(self) -> str:
-        match = re.search(STATUS_P, self.section_content.pre)
-        if match:
-            return match.group(1).strip()
-        else:
+        if self.header.status is None:
             raise Exception("no status value found")
+        return self.header.status
 
     # Revoked/deprecated sub-fields
     @property
     def reason(self) -> str:
-        match = re.search(REASON_P, self.section_content.pre)
-        if match:
-            return match.group(1).strip()
-        else:
-            # Reason is only valid for revoked and deprecated CMs
-            return None
+        # Reason is only valid for revoked and deprecated CMs
+        return self.header.reason
 
     @property
     def by_id(self) -> str:
-        match = re.search(BY_ID_P, self.section_content.pre)
-        if match:
-            return match.group(1).strip()
-        else:
-            # By ID is only valid for revoked CMs
-            return None
-
-    @property
-    def references(self) -> List[Reference]:
-        """
-        Python port of playbook-ng/editor/src/code/item/editable-view.ts : parseReferences()
-        """
+        # By ID is only valid for revoked CMs
+        return self.header.by_id
 
-        html = markdown(self.section_content.references)
-        soup = BeautifulSoup(html, 'html.parser')
+    @cached_property
+    def markdown(self) -> MarkdownBackend:
+        """Backend reading the rendered content (falls back to the reference one where needed)"""
+        return open_backend(self, self.backend)
 
-        refs: List[Reference] = []
-
-        # for all <li>s
-        lis: List[Tag] = soup.find_all("li")
-        for li in lis:
-
-            # ensure only 1 <a> present, get it
-            links = li.find_all("a", href=True)
-            if len(links) != 1:
-                continue
-            link = links[0]
-
-            # read from link then cull from DOM
-            href = link['href']
-            url = urlparse(href)
-            source_name = url.netloc
-            link.decompose()
-
-            # get desc without URL text hampering, strip |
-            description = re.sub(
-                r"[\s|]+$", "", li.get_text(strip=True, separator=" "))
-
-            # add ref
-            refs.append(Reference(
-                source_name=source_name,
-                description=description,
-                url=href,
-            ))
-
-        return refs
+    @cached_property
+    def references(self) -> List[Reference]:
+        return self.markdown.references()
 
-    @property
+    @cached_property
     def lines(self) -> List[str]:
         return self.text.split("\n")
 
-    @property
+    @cached_property
     def name(self) -> str:
         gen = (ln for ln in self.lines if ln.strip())
         name = next(gen, None)
@@ -221,35 +280,26 @@ class MDFile:
 
         return name.lstrip(string.whitespace + "#")
 
-    @property
+    @cached_property
     def assoc_tech_ids(self) -> List[str]:
-        html = markdown(self.section_content.associated_techniques)
-        soup = BeautifulSoup(html, 'html.parser')
-        text = soup.get_text(strip=True, separator=" ")
+        text = self.markdown.section_text("associated_techniques")
         ids = set(re.findall(TECH_ID_P, text))
         return sorted(list(ids))
 
-    @property
+    @cached_property
     def assoc_item_ids(self) -> List[str]:
-        html = markdown(self.section_content.related_countermeasures)
-        soup = BeautifulSoup(html, 'html.parser')
-        text = soup.get_text(strip=True, separator=" ")
+        text = self.markdown.section_text("related_countermeasures")
         ids = set(re.findall(MITI_ID_P, text))
         return sorted(list(ids))
 
     def __get_section_content(self) -> SectionContent:
         lines = self.lines
-        ind_to_head = OrderedDict()
-
-        for ind, line in enumerate(lines):
-            heading = is_which_heading(line)
-            if heading:
-                ind_to_head[ind] = heading
+        ind_to_head = self.heading_lines
 
-        all_heads = set(HEADING_REGEXES.__dict__.keys())
         found_heads = set(ind_to_head.values())
 
-        missing_heads = all_heads - found_heads
+        # in section order: a set's order depends on the process (its hash seed)
+        missing_heads = [h for h in HEADING_REGEXES.__dict__ if h not in found_heads]
         if missing_heads and FAIL_ON_MISSING_HEADINGS:
             raise Exception(f"missing header(s): [{', '.join(missing_heads)}]")
 
@@ -280,22 +330,4 @@ class MDFile:
         - These should be added to references
         - Technique IDs are skipped as they're specific
         """
-        hrefs: List[str] = []
-
-        html = markdown(self.text)
-        soup = BeautifulSoup(html, 'html.parser')
-        displayed = soup.get_text(strip=True, separator=" ")
-
-        a_tags: List[Tag] = soup.find_all("a")
-        for a_tag in a_tags:
-            href: str = a_tag.get("href", "").strip()
-
-            if href in displayed:
-                continue
-
-            if href.startswith("https://attack.mitre.org/techniques/"):
-                continue
-
-            hrefs.append(href)
-
-        return hrefs
+        return self.markdown.hrefs_not_visible()
@@ -1,43 +1,281 @@
+import io
+import multiprocessing
+import os
+import time
+from fnmatch import fnmatch
+from itertools import islice
+from pathlib import Path, PurePosixPath
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from contextlib import redirect_stdout, nullcontext
 from glob import glob
+from typing import Callable, Dict, Iterator, List, Set, Tuple
+from dataset_updater.cache import ParseCache, file_digest
 from dataset_updater.dataset_types import *
+from dataset_updater.item_parsing import read_header_id
+from dataset_updater.markdown_backends import DEFAULT_BACKEND
 from dataset_updater.util import load_item, load_template
 
 
-def load_dataset(counter_repo_path) -> Dataset:
-    TEMPLATE_JSONS = list(
-        glob(str(counter_repo_path / "**/TMPL*.json"), recursive=True))
-    ITEM_MARKDOWNS = list(
-        glob(str(counter_repo_path / "**/CM*.md"), recursive=True))
-    BASELINE_ITEMS = {}
+# Dataset source files (basename patterns)
+ITEM_PATTERN = "CM*.md"
+TEMPLATE_PATTERN = "TMPL*.json"
 
-    # Dataset
-    dataset = Dataset(
-        id="coun7er",
-        version="latest",
-        name="CISA COUN7ER",
-        url=None,
+
+def is_dataset_file(rel_path: str) -> bool:
+    """Whether a (repo-relative) path is a COUN7ER countermeasure or template file"""
+    name = PurePosixPath(rel_path).name
+    return fnmatch(name, ITEM_PATTERN) or fnmatch(name, TEMPLATE_PATTERN)
+
+
+def default_jobs() -> int:
+    """Default worker count for loading: one per CPU"""
+    return os.cpu_count() or 1
+
+
+# How worker processes are started: forked from a clean server process, not from this one, which
+# may be running other threads (ex: the ATT&CK fetch, see pipeline); a fork could copy a lock one
+# of them holds (stdout, import, allocator) and deadlock the worker. spawn where there's no forkserver
+POOL_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def new_pool(jobs: int) -> ProcessPoolExecutor:
+    """A process pool of jobs workers, started with POOL_START_METHOD"""
+    return ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context(POOL_START_METHOD))
+
+
+def _load_captured(loader: Callable, path: str, args: tuple = ()) -> tuple:
+    """Run loader(path, *args) in a worker, capturing its printed messages and its wall time"""
+    output = io.StringIO()
+    start = time.perf_counter()
+    with redirect_stdout(output):
+        result = loader(path, *args)
+    return result, output.getvalue(), time.perf_counter() - start
+
+
+def _iter_load(pool: Executor | None, loader: Callable, paths: List[str], jobs: int, cache: ParseCache | None = None, timings: Dict[str, float] | None = None, args: tuple = ()) -> Iterator:
+    """
+    Run loader over paths (in a process pool if given), yielding results lazily
+    - args are passed to loader after each path (ex: the markdown backend of load_item)
+    - Results and messages come back in paths order, regardless of which worker finishes first
+    - Messages are printed per file, so they never interleave
+    - Files unchanged since they were cached aren't re-parsed; their messages are replayed
+    - At most jobs * 4 files are in flight (or waiting to be consumed), so memory stays bounded
+    - If timings is given, the parse time of each (re-)parsed path is recorded in it
+    """
+    window = deque()
+    limit = jobs * 4 if pool is not None else 0
+
+    def finish(path: str, future: Future | None, entry: tuple | None):
+        if entry is not None:
+            result, output = entry
+        else:
+            if future is not None:
+                result, output, seconds = future.result()
+            else:
+                result, output, seconds = _load_captured(loader, path, args)
+            if timings is not None:
+                timings[path] = seconds
+            if cache is not None:
+                cache.put(loader, path, result, output, args)
+        print(output, end="")
+        return result
+
+    for path in paths:
+        entry = cache.get(loader, path, args) if cache is not None else None
+        future = None
+        if entry is None and pool is not None:
+            future = pool.submit(_load_captured, loader, path, args)
+        window.append((path, future, entry))
+        while len(window) > limit:
+            yield finish(*window.popleft())
+    while window:
+        yield finish(*window.popleft())
+
+
+def _load_all(pool: Executor | None, loader: Callable, paths: List[str], jobs: int, cache: ParseCache | None = None, timings: Dict[str, float] | None = None, args: tuple = ()) -> list:
+    """Run loader over paths (see _iter_load), returns the results in paths order"""
+    if pool is None and cache is None and timings is None:
+        return [loader(path, *args) for path in paths]
+    return list(_iter_load(pool, loader, paths, jobs, cache, timings, args))
+
+
+def new_dataset(dataset_id: str = "coun7er", version: str = "latest", name: str = "CISA COUN7ER", url: str | None = None) -> Dataset:
+    """A dataset record (default: COUN7ER latest), without items/templates"""
+    return Dataset(
+        id=dataset_id,
+        version=version,
+        name=name,
+        url=url,
         spec_version="1.0.0",
         item_type="Countermeasure",
         items=[],
         templates=[],
     )
 
-    # Dataset.Items
-    for path in ITEM_MARKDOWNS:
-        item = load_item(path)
-        if item is not None:
-            if item.id in BASELINE_ITEMS:
-                item.is_baseline = True
-            dataset.items.append(item)
+
+def sort_items_by_id(item_paths: List[str]) -> List[str]:
+    """
+    Order countermeasure files by their ID (read from the metadata header only, no full parse)
+    - Files whose ID can't be read go last, in the given order; loading them reports why
+    """
+    ids = {}
+    for path in item_paths:
+        try:
+            item_id = read_header_id(path)
+        except Exception:
+            continue
+        if item_id is not None:
+            ids[path] = item_id
+    return sorted((path for path in item_paths if path in ids), key=ids.get) + \
+        [path for path in item_paths if path not in ids]
+
+
+def find_items(counter_repo_path) -> List[str]:
+    """Countermeasure files under a checkout, in ID order"""
+    # Sorted so the order of items with the same ID (and of messages) is stable
+    return sort_items_by_id(sorted(
+        glob(str(Path(counter_repo_path) / "**" / ITEM_PATTERN), recursive=True)))
+
+
+def iter_items(counter_repo_path, jobs: int | None = None, cache: ParseCache | None = None, timings: Dict[str, float] | None = None, backend: str = DEFAULT_BACKEND) -> Iterator[Item]:
+    """
+    Parse the countermeasures one at a time, yielding them in ID order
+    - Only a bounded window of items is held in memory (see _iter_load)
+    - Files that fail to parse are reported and skipped
+    - backend: the markdown backend reading them (see markdown_backends)
+    """
+    ITEM_MARKDOWNS = find_items(counter_repo_path)
+
+    if jobs is None:
+        jobs = default_jobs()
+
+    # Items parse independently; fan them out when given > 1 job
+    pool_context = new_pool(jobs) if jobs > 1 else nullcontext()
+    with pool_context as pool:
+        for item in _iter_load(pool, load_item, ITEM_MARKDOWNS, jobs, cache, timings, (backend,)):
+            if item is not None:
+                yield item
+
+
+def iter_sources_items(counter_repo_paths: List[Path], jobs: int | None = None, cache: ParseCache | None = None, timings: Dict[str, float] | None = None, backend: str = DEFAULT_BACKEND) -> Iterator[Iterator[Item]]:
+    """
+    Parse the countermeasures of several checkouts through one shared process pool
+    -> an iterator of items (ID order, as iter_items) per checkout, in the given order
+    - The checkouts' files form a single stream, so workers move on to the next checkout's
+      files while the current one is still being consumed, instead of idling between them
+    - Each checkout's iterator must be consumed before the next one is taken
+    """
+    item_paths = [find_items(repo_path) for repo_path in counter_repo_paths]
+
+    if jobs is None:
+        jobs = default_jobs()
+
+    pool_context = new_pool(jobs) if jobs > 1 else nullcontext()
+    with pool_context as pool:
+        results = _iter_load(pool, load_item, [
+            path for paths in item_paths for path in paths], jobs, cache, timings, (backend,))
+        for paths in item_paths:
+            yield (item for item in islice(results, len(paths)) if item is not None)
+
+
+def load_templates(counter_repo_path, cache: ParseCache | None = None) -> List[Template]:
+    """Load the templates (small JSON files, parsed in this process), in ID order"""
+    TEMPLATE_JSONS = sorted(
+        glob(str(counter_repo_path / "**" / TEMPLATE_PATTERN), recursive=True))
+    templates = _load_all(None, load_template, TEMPLATE_JSONS, 1, cache)
+    return sorted((template for template in templates if template is not None), key=lambda t: t.id)
+
+
+def list_dataset_files(root: Path) -> List[str]:
+    """Countermeasure and template files under a checkout"""
+    return sorted(
+        glob(str(Path(root) / "**" / ITEM_PATTERN), recursive=True) +
+        glob(str(Path(root) / "**" / TEMPLATE_PATTERN), recursive=True))
+
+
+class LiveDataset:
+    """
+    The parsed files of a checkout, kept in memory between rebuilds
+    - refresh() re-parses only files whose content changed, and drops deleted ones
+    - backend: the markdown backend reading the countermeasures (see markdown_backends)
+    """
+
+    def __init__(self, root: Path, backend: str = DEFAULT_BACKEND) -> None:
+        self.root = Path(root)
+        self.backend = backend
+        # path -> (content digest, parsed item/template or None if it failed to parse)
+        self.files: Dict[str, Tuple[str, Item | Template | None]] = {}
+
+    def refresh(self, paths: Set[str] | None = None, jobs: int = 1, cache: ParseCache | None = None) -> List[str]:
+        """
+        Update the given paths (None: rescan the whole checkout), returns those that changed
+        - With jobs > 1, many changed countermeasures (ex: the first load) are parsed in a process pool
+        - With a parse cache, files it holds aren't re-parsed
+        """
+        if paths is None:
+            paths = set(list_dataset_files(self.root)) | set(self.files)
+        changed = []
+        digests = {}
+        for path in sorted(paths):
+            try:
+                digest = file_digest(path)
+            except FileNotFoundError:
+                if self.files.pop(path, None) is not None:
+                    changed.append(path)
+                continue
+            old = self.files.get(path)
+            if old is None or old[0] != digest:
+                digests[path] = digest
+                changed.append(path)
+        item_paths = [path for path in digests if Path(path).match(ITEM_PATTERN)]
+        template_paths = [path for path in digests if path not in item_paths]
+        pool_context = new_pool(jobs) if jobs > 1 and len(item_paths) > 1 else nullcontext()
+        with pool_context as pool:
+            items = _load_all(pool, load_item, item_paths, jobs, cache, None, (self.backend,))
+        templates = _load_all(None, load_template, template_paths, 1, cache)
+        for path, result in zip(item_paths + template_paths, items + templates):
+            self.files[path] = (digests[path], result)
+        return changed
+
+    def build(self, baseline_ids: List[str] | None = None) -> Dataset:
+        """The dataset of the current files (ID order, like load_dataset)"""
+        dataset = new_dataset()
+        # Path order, then ID order (stable), as iter_items orders them
+        for _, (_, result) in sorted(self.files.items()):
+            if isinstance(result, Item):
+                result.is_baseline = result.id in (baseline_ids or [])
+                dataset.items.append(result)
+            elif isinstance(result, Template):
+                dataset.templates.append(result)
+        dataset.items.sort(key=lambda i: i.id)
+        dataset.templates.sort(key=lambda t: t.id)
+        return dataset
+
+
+def save_cache(cache: ParseCache) -> None:
+    """Write the parse cache back, reporting how much of it was reused"""
+    cache.save()
+    print(f"  [i] Parse cache: {cache.hits} reused, {cache.misses} parsed.")
+
+
+def load_dataset(counter_repo_path, jobs: int | None = None, cache: ParseCache | None = None, timings: Dict[str, float] | None = None, backend: str = DEFAULT_BACKEND) -> Dataset:
+    """Load the whole dataset into memory (see iter_items to stream the items instead)"""
+    BASELINE_ITEMS = {}
+
+    # Dataset
+    dataset = new_dataset()
 
     # Dataset.Templates
-    for path in TEMPLATE_JSONS:
-        template = load_template(path)
-        if template is not None:
-            dataset.templates.append(template)
-
-    # ID-ascending order
-    dataset.items.sort(key=lambda i: i.id)
-    dataset.templates.sort(key=lambda t: t.id)
+    dataset.templates = load_templates(counter_repo_path, cache)
+
+    # Dataset.Items (ID-ascending order)
+    for item in iter_items(counter_repo_path, jobs, cache, timings, backend):
+        if item.id in BASELINE_ITEMS:
+            item.is_baseline = True
+        dataset.items.append(item)
+
+    if cache is not None:
+        save_cache(cache)
 
     return dataset
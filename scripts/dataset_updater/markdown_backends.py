@@ -0,0 +1,869 @@
+# Markdown Backends
+# How MDFile reads the rendered content of a countermeasure: the references, the displayed
+# text of each section (searched for technique/countermeasure IDs), and the links whose URL isn't displayed
+# - DomBackend (the reference, and the default): markdown -> HTML -> BeautifulSoup DOM
+# - TokenBackend (opt-in, update_datasets.py --markdown-backend tokens): the same results read from the markdown's tokens, following Python-Markdown's
+#   block and inline rules, without rendering HTML or building a DOM
+# - Markdown the token backend doesn't cover raises UnsupportedMarkdown, and open_backend()
+#   falls back to the reference backend for that file
+# - python3 -m benchmark.markdown_parity checks both backends agree over a COUN7ER checkout
+import abc
+import html
+import re
+from collections import deque
+from copy import copy
+from functools import cached_property
+from typing import Dict, List, Tuple
+from urllib.parse import urlparse
+from markdown import markdown
+from markdown.util import BLOCK_LEVEL_ELEMENTS
+from bs4 import BeautifulSoup, NavigableString, PageElement, Tag
+from bs4.dammit import EntitySubstitution
+from dataset_updater.dataset_types import *
+
+# Reference-style link definition ("[label]: url")
+LINK_DEF_P = re.compile(r"^ {0,3}\[[^\]]+\]:", re.M)
+
+# Raw HTML blocks placed around each section when the document is rendered
+# once, so the rendered DOM can be split back into sections
+SECTION_START_ATTR = "data-md-section"
+SECTION_END_ATTR = "data-md-section-end"
+SECTION_START_MARK = f'<div {SECTION_START_ATTR}="{{0}}"></div>'
+SECTION_END_MARK = f'<div {SECTION_END_ATTR}=""></div>'
+
+# Links to techniques are skipped by hrefs_not_visible() (technique IDs are specific)
+TECHNIQUE_URL = "https://attack.mitre.org/techniques/"
+
+# Python-Markdown's inline patterns (markdown.inlinepatterns), in the order they're applied
+# - Reference/image patterns do nothing without link definitions and images (unsupported);
+#   emphasis is left out (see TokenBackend)
+BACKTICK_P = re.compile(
+    r"(?:(?<!\\)((?:\\{2})+)(?=`+)|(?<!\\)(`+)(.+?)(?<!`)\2(?!`))", re.DOTALL)
+ESCAPE_P = re.compile(r"\\(.)", re.DOTALL)
+LINK_P = re.compile(r"(?<!\!)\[", re.DOTALL)
+AUTOLINK_P = re.compile(
+    r"<((?:[Ff]|[Hh][Tt])[Tt][Pp][Ss]?://[^<>]*)>", re.DOTALL)
+LINE_BREAK_P = re.compile(r"  \n", re.DOTALL)
+HTML_P = re.compile(
+    r"(<(\/?[a-zA-Z][^<>@ ]*( [^<>]*)?|!--(?:(?!<!--|-->).)*--)>)", re.DOTALL)
+ENTITY_P = re.compile(
+    r"(&(?:\#[0-9]+|\#x[0-9a-fA-F]+|[a-zA-Z0-9]+);)", re.DOTALL)
+AUTOMAIL_P = re.compile(r"<([^<> !]+@[^@<> ]+)>", re.DOTALL)
+# The "(url "title")" part of an inline link
+LINK_DEST_P = re.compile(
+    r"""\(\s*(?:(<[^<>]*>)\s*(?:('[^']*'|"[^"]*")\s*)?\))?""", re.DOTALL)
+# Characters a backslash escapes (Markdown.ESCAPED_CHARS)
+ESCAPED_CHARS = set("\\`*_{}[]()>#+-.!")
+# Placeholders Python-Markdown puts in the text for stashed nodes and escaped characters
+PLACEHOLDER = "\x02klzzwxh:%04d\x03"
+PLACEHOLDER_P = re.compile("\x02klzzwxh:([0-9]{4,})\x03")
+ESCAPE_MARK_P = re.compile("\x02([0-9]+)\x03")
+# Character references the serializer leaves alone (serializers.RE_AMP), so the HTML parser decodes them
+CHAR_REF_P = re.compile(r"&(#[0-9]+|#x[0-9a-f]+|[0-9a-z]+);", re.I)
+# Raw HTML tag name
+TAG_NAME_P = re.compile(r"</?([^\s/>]+)")
+# Raw HTML tags changing the DOM's structure or text beyond a text boundary
+UNSUPPORTED_TAGS = set(BLOCK_LEVEL_ELEMENTS) | {
+    "a", "plaintext", "rp", "rt", "template", "title", "xmp", "noembed", "noframes", "svg"}
+
+# Block rules (markdown.blockprocessors)
+# List item, of either type (OListProcessor.CHILD_RE), and nested list item (INDENT_RE)
+LIST_ITEM_P = re.compile(r"[ ]{0,3}(?:\d+\.|[*+-])[ ]+(.*)")
+NESTED_ITEM_P = re.compile(r"[ ]{4,7}(?:\d+\.|[*+-])[ ]+.*")
+# Hash heading line (HashHeaderProcessor.RE)
+HEADING_P = re.compile(r"(?P<level>#{1,6})(?P<header>(?:\\.|[^\\])*?)#*")
+# Lines that could be a horizontal rule or setext heading underline
+RULE_LINE_P = re.compile(r"[ ]{0,3}[-=_*][-=_* ]*")
+# Underscore that could open emphasis (Python-Markdown's underscore emphasis is "smart": never intraword)
+UNDERSCORE_OPEN_P = re.compile(r"(?<!\w)_")
+# Characters starting inline markup (code, escapes, links, HTML, entities)
+INLINE_MARKUP = ("\\", "`", "<", "[", "&")
+
+
+class UnsupportedMarkdown(Exception):
+    """Markdown a backend can't read exactly as the reference backend does"""
+
+
+class MarkdownBackend(abc.ABC):
+    """
+    Reads the rendered content of an MDFile (from its text, lines, heading_lines and section_content)
+    - references(): the References section's list items that have exactly 1 link
+    - section_text(): the displayed text of a section, as get_text(strip=True, separator=" ") gives
+    - hrefs_not_visible(): link URLs (stripped) not displayed anywhere in the document, in document order
+    """
+    name = ""
+
+    def __init__(self, md: "MDFile") -> None:
+        self.md = md
+
+    @abc.abstractmethod
+    def references(self) -> List[Reference]:
+        ...
+
+    @abc.abstractmethod
+    def section_text(self, header_name: str) -> str:
+        ...
+
+    @abc.abstractmethod
+    def hrefs_not_visible(self) -> List[str]:
+        ...
+
+
+class DomBackend(MarkdownBackend):
+    """The reference backend: renders the markdown to HTML, and reads it as a DOM"""
+    name = "dom"
+
+    @cached_property
+    def dom(self) -> BeautifulSoup:
+        """
+        The whole document rendered once (markdown -> HTML -> DOM)
+        - Each section is wrapped in marker <div>s (see section_dom)
+        - Shared by every DOM-derived result; treat as read-only
+        """
+
+        lines = self.md.lines
+        marked: List[str] = []
+        for ind, line in enumerate(lines):
+            header_name = self.md.heading_lines.get(ind)
+            if header_name is None:
+                marked.append(line)
+                continue
+            marked.extend([
+                "", SECTION_END_MARK, "",
+                line,
+                "", SECTION_START_MARK.format(header_name), "",
+            ])
+
+        return BeautifulSoup(markdown("\n".join(marked)), 'html.parser')
+
+    @cached_property
+    def section_dom(self) -> Dict[str, List[PageElement]]:
+        """
+        Top-level DOM nodes of each section, split out of self.dom
+        - Falls back to rendering sections on their own if the markers didn't
+          survive rendering, or if link definitions could resolve across sections
+        """
+
+        sections: Dict[str, List[PageElement]] = {}
+        current: None | List[PageElement] = None
+
+        for node in self.dom.contents:
+            if isinstance(node, Tag) and node.name == "div":
+                if node.has_attr(SECTION_START_ATTR):
+                    current = sections.setdefault(node[SECTION_START_ATTR], [])
+                    continue
+                if node.has_attr(SECTION_END_ATTR):
+                    current = None
+                    continue
+            if current is not None:
+                current.append(node)
+
+        if (
+            len(sections) != len(self.md.heading_lines)
+            or LINK_DEF_P.search(self.md.text)
+        ):
+            sections = {}
+            for header_name in self.md.heading_lines.values():
+                rendered = markdown(self.md.section_content.__dict__[header_name])
+                soup = BeautifulSoup(rendered, 'html.parser')
+                sections[header_name] = list(soup.contents)
+
+        return sections
+
+    def section_text(self, header_name: str) -> str:
+        texts: List[str] = []
+        for node in self.section_dom.get(header_name, []):
+            if isinstance(node, Tag):
+                text = node.get_text(strip=True, separator=" ")
+            elif isinstance(node, NavigableString):
+                text = node.strip()
+            else:
+                continue
+            if text:
+                texts.append(text)
+        return " ".join(texts)
+
+    def references(self) -> List[Reference]:
+        """
+        Python port of playbook-ng/editor/src/code/item/editable-view.ts : parseReferences()
+        """
+
+        refs: List[Reference] = []
+
+        # for all <li>s
+        lis: List[Tag] = []
+        for node in self.section_dom.get("references", []):
+            if isinstance(node, Tag):
+                if node.name == "li":
+                    lis.append(node)
+                lis.extend(node.find_all("li"))
+
+        for li in lis:
+
+            # ensure only 1 <a> present, get it
+            links = li.find_all("a", href=True)
+            if len(links) != 1:
+                continue
+
+            # work on a copy; the shared DOM must stay intact
+            li = copy(li)
+            link = li.find("a", href=True)
+
+            # read from link then cull from DOM
+            href = link['href']
+            url = urlparse(href)
+            source_name = url.netloc
+            link.decompose()
+
+            # get desc without URL text hampering, strip |
+            description = re.sub(
+                r"[\s|]+$", "", li.get_text(strip=True, separator=" "))
+
+            # add ref
+            refs.append(Reference(
+                source_name=source_name,
+                description=description,
+                url=href,
+            ))
+
+        return refs
+
+    def hrefs_not_visible(self) -> List[str]:
+        hrefs: List[str] = []
+
+        displayed = self.dom.get_text(strip=True, separator=" ")
+
+        a_tags: List[Tag] = self.dom.find_all("a")
+        for a_tag in a_tags:
+            href: str = a_tag.get("href", "").strip()
+
+            if href in displayed:
+                continue
+
+            if href.startswith(TECHNIQUE_URL):
+                continue
+
+            hrefs.append(href)
+
+        return hrefs
+
+
+class _Unit:
+    """Displayed text and links of one block (paragraph, heading, list item or code block)"""
+    __slots__ = ("nodes", "atomic", "links", "stars", "underscores")
+
+    def __init__(self) -> None:
+        # Text nodes (stripped, non-empty), in document order
+        self.nodes: List[str] = []
+        # Per node: displayed verbatim (code, autolink text), emphasis markers can't be in play
+        self.atomic: List[bool] = []
+        # (href, first node, end node) of each link, in document order
+        self.links: List[Tuple[str, int, int]] = []
+        # Whether the text left for the emphasis patterns has * markers, or _ markers that could open emphasis
+        self.stars = False
+        self.underscores = False
+
+    def add(self, text: str, atomic: bool = False) -> None:
+        text = text.strip()
+        if text:
+            self.nodes.append(text)
+            self.atomic.append(atomic)
+
+
+def _text_char_ref(m: re.Match) -> str:
+    """A character reference in text, as BeautifulSoup's html.parser builder decodes it"""
+    ref = m.group(1)
+    if ref[0] == "#":
+        number = int(ref[2:], 16) if ref[1] in "xX" else int(ref[1:])
+        data = None
+        if number < 256:
+            # read as windows-1252 (handle_charref)
+            try:
+                data = bytearray([number]).decode("windows-1252")
+            except UnicodeDecodeError:
+                pass
+        if not data:
+            try:
+                data = chr(number)
+            except (ValueError, OverflowError):
+                pass
+        return data or "\N{REPLACEMENT CHARACTER}"
+    if not ref[0].isalpha():
+        return m.group(0)
+    # unknown names lose their ";" (handle_entityref)
+    return EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(ref, "&" + ref)
+
+
+def _unescape_marks(text: str) -> str:
+    """Restore backslash-escaped characters"""
+    if "\x02" in text:
+        text = ESCAPE_MARK_P.sub(lambda m: chr(int(m.group(1))), text)
+    return text
+
+
+def _decode_text(text: str) -> str:
+    """Text as the DOM has it: escaped characters restored, character references decoded"""
+    text = _unescape_marks(text)
+    if "&" in text:
+        text = CHAR_REF_P.sub(_text_char_ref, text)
+    return text
+
+
+def _decode_attribute(text: str) -> str:
+    """Attribute value as the DOM has it (html.parser unescapes attributes itself)"""
+    text = _unescape_marks(text)
+    if "&" in text:
+        text = CHAR_REF_P.sub(lambda m: html.unescape(m.group()), text)
+    return text
+
+
+def _mark_emphasis(data: str, unit: _Unit) -> None:
+    """Note the emphasis markers of text left for the emphasis patterns"""
+    unit.stars |= "*" in data
+    unit.underscores |= "_" in data and UNDERSCORE_OPEN_P.search(data) is not None
+
+
+class _InlineParser:
+    """
+    Python-Markdown's inline processing of one block's text (markdown.treeprocessors.InlineProcessor)
+    - Each pattern is applied over the whole text (matches replaced by placeholders) before the next one
+    - Stash entries: ("text", str), ("entity", char), ("html",), ("br",), ("code", text),
+      ("autolink", href, text), ("link", href, processed text)
+    """
+
+    def __init__(self) -> None:
+        self.stash: List[tuple] = []
+        self.link_depth = 0
+        self.raw_html = False
+        self.patterns = [
+            (BACKTICK_P, self._backtick),
+            (ESCAPE_P, self._escape),
+            (LINK_P, self._link),
+            (AUTOLINK_P, self._autolink),
+            (AUTOMAIL_P, self._automail),
+            (LINE_BREAK_P, self._line_break),
+            (HTML_P, self._html),
+            (ENTITY_P, self._entity),
+        ]
+
+    def parse(self, data: str, pattern_index: int = 0) -> str:
+        """Apply the patterns from pattern_index on -> text with placeholders"""
+        for index in range(pattern_index, len(self.patterns)):
+            regex, handle = self.patterns[index]
+            start = 0
+            while True:
+                for match in regex.finditer(data, start):
+                    entry, m_start, m_end = handle(match, data, index)
+                    if m_start is not None:
+                        break
+                else:
+                    break
+                if entry is None:
+                    start = m_end
+                    continue
+                placeholder = PLACEHOLDER % len(self.stash)
+                self.stash.append(entry)
+                data = data[:m_start] + placeholder + data[m_end:]
+                start = 0
+        return data
+
+    # Handlers -> (stash entry or None to leave the match as is, start, end); start is None if it's no match
+
+    def _backtick(self, m: re.Match, data: str, index: int) -> tuple:
+        if m.group(3):
+            return ("code", m.group(3).strip()), m.start(0), m.end(0)
+        return ("text", m.group(1).replace("\\\\", "\x0292\x03")), m.start(0), m.end(0)
+
+    def _escape(self, m: re.Match, data: str, index: int) -> tuple:
+        char = m.group(1)
+        if char in ESCAPED_CHARS:
+            return ("text", f"\x02{ord(char)}\x03"), m.start(0), m.end(0)
+        return None, m.start(0), m.end(0)
+
+    def _link(self, m: re.Match, data: str, index: int) -> tuple:
+        text, end, handled = self._link_text(data, m.end(0))
+        if not handled:
+            return None, None, None
+        href, end, handled = self._link_dest(data, end)
+        if not handled:
+            return None, None, None
+        self.link_depth += 1
+        text = self.parse(text, index + 1)
+        self.link_depth -= 1
+        # text after an element in a link (code, line break, emphasis) is parsed again with
+        # every pattern, so it can hold links of its own
+        if "[" in text and (self._has_element(text) or "*" in text or UNDERSCORE_OPEN_P.search(text)):
+            raise UnsupportedMarkdown("link in a link's text")
+        return ("link", self._href(href), text), m.start(0), end
+
+    def _autolink(self, m: re.Match, data: str, index: int) -> tuple:
+        if self.link_depth:
+            raise UnsupportedMarkdown("autolink in a link's text")
+        url = m.group(1)
+        if "\x02" in url:
+            raise UnsupportedMarkdown("markup in an autolink")
+        return ("autolink", _decode_attribute(url), _decode_text(url)), m.start(0), m.end(0)
+
+    def _automail(self, m: re.Match, data: str, index: int) -> tuple:
+        raise UnsupportedMarkdown(f"mail autolink {m.group(0)}")
+
+    def _line_break(self, m: re.Match, data: str, index: int) -> tuple:
+        return ("br",), m.start(0), m.end(0)
+
+    def _html(self, m: re.Match, data: str, index: int) -> tuple:
+        raw = m.group(1)
+        tag = TAG_NAME_P.match(raw)
+        if (
+            "\x02" in raw or "'" in raw or '"' in raw or tag is None
+            or tag.group(1).lower() in UNSUPPORTED_TAGS
+        ):
+            raise UnsupportedMarkdown(f"raw HTML {raw}")
+        self.raw_html = True
+        return ("html",), m.start(0), m.end(0)
+
+    def _entity(self, m: re.Match, data: str, index: int) -> tuple:
+        return ("entity", _decode_text(m.group(1))), m.start(0), m.end(0)
+
+    def _has_element(self, data: str) -> bool:
+        return any(self.stash[int(m.group(1))][0] not in ("text", "entity", "html")
+                   for m in PLACEHOLDER_P.finditer(data))
+
+    @staticmethod
+    def _link_text(data: str, index: int) -> Tuple[str, int, bool]:
+        """Text between a link's [] (nested brackets balanced), LinkInlineProcessor.getText"""
+        bracket_count = 1
+        for pos in range(index, len(data)):
+            c = data[pos]
+            if c == "]":
+                bracket_count -= 1
+                if bracket_count == 0:
+                    return data[index:pos], pos + 1, True
+            elif c == "[":
+                bracket_count += 1
+        return "", len(data), False
+
+    @staticmethod
+    def _link_dest(data: str, index: int) -> Tuple[str, int, bool]:
+        """
+        URL between a link's () (nested parentheses and titles allowed), LinkInlineProcessor.getLink
+        - The title isn't displayed, so only the URL is returned
+        """
+        m = LINK_DEST_P.match(data, pos=index)
+        if m and m.group(1):
+            return m.group(1)[1:-1].strip(), m.end(0), True
+        if not m:
+            return "", index, False
+
+        href = ""
+        bracket_count = 1
+        backtrack_count = 1
+        start_index = m.end()
+        index = start_index
+        last_bracket = -1
+        # Primary (first found) and secondary quote tracking
+        quote = None
+        start_quote = -1
+        exit_quote = -1
+        ignore_matches = False
+        alt_quote = None
+        start_alt_quote = -1
+        exit_alt_quote = -1
+        last = ""
+
+        for pos in range(index, len(data)):
+            c = data[pos]
+            if c == "(":
+                if not ignore_matches:
+                    bracket_count += 1
+                elif backtrack_count > 0:
+                    backtrack_count -= 1
+            elif c == ")":
+                if (exit_quote != -1 and quote == last) or (exit_alt_quote != -1 and alt_quote == last):
+                    bracket_count = 0
+                elif not ignore_matches:
+                    bracket_count -= 1
+                elif backtrack_count > 0:
+                    backtrack_count -= 1
+                    if backtrack_count == 0:
+                        last_bracket = index + 1
+            elif c in ("'", '"'):
+                if not quote:
+                    ignore_matches = True
+                    backtrack_count = bracket_count
+                    bracket_count = 1
+                    start_quote = index + 1
+                    quote = c
+                elif c != quote and not alt_quote:
+                    start_alt_quote = index + 1
+                    alt_quote = c
+                elif c == quote:
+                    exit_quote = index + 1
+                elif alt_quote and c == alt_quote:
+                    exit_alt_quote = index + 1
+
+            index += 1
+
+            if bracket_count == 0:
+                if exit_quote >= 0 and quote == last:
+                    href = data[start_index:start_quote - 1]
+                elif exit_alt_quote >= 0 and alt_quote == last:
+                    href = data[start_index:start_alt_quote - 1]
+                else:
+                    href = data[start_index:index - 1]
+                break
+
+            if c != " ":
+                last = c
+
+        if bracket_count != 0 and backtrack_count == 0:
+            href = data[start_index:last_bracket - 1]
+            index = last_bracket
+            bracket_count = 0
+
+        return href, index, bracket_count == 0
+
+    def _href(self, href: str) -> str:
+        """A link's href attribute as the DOM has it"""
+        def unstash(m: re.Match) -> str:
+            entry = self.stash[int(m.group(1))]
+            if entry[0] != "text":
+                raise UnsupportedMarkdown("markup in a link's URL")
+            return entry[1]
+        if "\x02" in href:
+            href = PLACEHOLDER_P.sub(unstash, href)
+        return _decode_attribute(href.strip())
+
+    def flatten(self, data: str, unit: _Unit) -> None:
+        """Add the text nodes and links of parsed text to unit"""
+        # Text since the last raw HTML, and decoded text of the current text node
+        run: List[str] = []
+        node: List[str] = []
+        pos = 0
+        for m in PLACEHOLDER_P.finditer(data):
+            run.append(data[pos:m.start()])
+            pos = m.end()
+            entry = self.stash[int(m.group(1))]
+            kind = entry[0]
+            if kind == "text":
+                run.append(entry[1])
+                continue
+            node.append(_decode_text("".join(run)))
+            run = []
+            if kind == "entity":
+                node.append(entry[1])
+                continue
+            # an element: the current text node ends here
+            unit.add("".join(node))
+            node = []
+            if kind == "code":
+                unit.add(entry[1], True)
+            elif kind == "autolink":
+                start = len(unit.nodes)
+                unit.add(entry[2], True)
+                unit.links.append((entry[1], start, len(unit.nodes)))
+            elif kind == "link":
+                _mark_emphasis(entry[2], unit)
+                start = len(unit.nodes)
+                self.flatten(entry[2], unit)
+                unit.links.append((entry[1], start, len(unit.nodes)))
+        run.append(data[pos:])
+        node.append(_decode_text("".join(run)))
+        unit.add("".join(node))
+
+
+def _leading_spaces(line: str) -> int:
+    return len(line) - len(line.lstrip(" "))
+
+
+def _loose_detab(lines: List[str]) -> List[str]:
+    """Remove one level of indentation from the lines that have it (BlockProcessor.looseDetab)"""
+    return [line[4:] if line.startswith("    ") else line for line in lines]
+
+
+class TokenBackend(MarkdownBackend):
+    """
+    Reads the markdown's tokens directly: blocks split as Python-Markdown's block parser
+    would, and inline text through the same patterns Python-Markdown applies, in the same order
+    - Emphasis isn't parsed: its markers (*, _) would only split text nodes, where an ID or a
+      URL can't continue anyway. Where that isn't enough (emphasis markers in a reference's
+      description, a hidden URL containing them) the file is unsupported
+    - Everything is read on construction, so UnsupportedMarkdown is only raised there
+    """
+    name = "tokens"
+
+    def __init__(self, md: "MDFile") -> None:
+        super().__init__(md)
+        text = md.text
+        if LINK_DEF_P.search(text):
+            raise UnsupportedMarkdown("link definitions")
+        if "![" in text or "<!" in text or "<?" in text:
+            raise UnsupportedMarkdown("images or HTML comments")
+        heading_lines = list(md.heading_lines.items())
+        if len({name for _, name in heading_lines}) != len(heading_lines):
+            raise UnsupportedMarkdown("repeated section headings")
+
+        # Python-Markdown works on tab-expanded text
+        lines = text.expandtabs(4).split("\n") if "\t" in text else md.lines
+        units: List[_Unit] = []
+        sections: Dict[str, List[_Unit]] = {}
+        if heading_lines:
+            self._parse_blocks(lines[:heading_lines[0][0]], units)
+        for entry_ind, (start_ind, header_name) in enumerate(heading_lines):
+            end_ind = heading_lines[entry_ind + 1][0] if entry_ind + 1 < len(heading_lines) else len(lines)
+            units.append(self._heading(lines[start_ind]))
+            section_units: List[_Unit] = []
+            if header_name == "references":
+                self._references = self._parse_references(
+                    lines[start_ind + 1:end_ind], section_units)
+            else:
+                self._parse_blocks(lines[start_ind + 1:end_ind], section_units)
+            sections[header_name] = section_units
+            units.extend(section_units)
+        if "references" not in sections:
+            self._references = []
+
+        self._section_texts = {
+            header_name: " ".join(node for unit in section_units for node in unit.nodes)
+            for header_name, section_units in sections.items()
+        }
+        self._hrefs_not_visible = self._find_hrefs_not_visible(units)
+
+    def references(self) -> List[Reference]:
+        return list(self._references)
+
+    def section_text(self, header_name: str) -> str:
+        return self._section_texts.get(header_name, "")
+
+    def hrefs_not_visible(self) -> List[str]:
+        return list(self._hrefs_not_visible)
+
+    @staticmethod
+    def _inline(text: str) -> Tuple[_Unit, bool]:
+        """Parse inline text -> (unit, whether its top-level text has raw HTML or could have emphasis)"""
+        parser = _InlineParser()
+        unit = _Unit()
+        data = parser.parse(text)
+        _mark_emphasis(data, unit)
+        markup = parser.raw_html or unit.stars or unit.underscores
+        parser.flatten(data, unit)
+        return unit, markup
+
+    def _heading(self, line: str) -> _Unit:
+        m = HEADING_P.fullmatch(line)
+        if m is None:
+            raise UnsupportedMarkdown(f"heading {line}")
+        return self._inline(m.group("header").strip())[0]
+
+    @staticmethod
+    def _split_blocks(lines: List[str]) -> List[List[str]]:
+        """Blocks separated by blank (or whitespace-only) lines"""
+        blocks: List[List[str]] = []
+        block: List[str] = []
+        for line in lines:
+            if line.strip(" "):
+                block.append(line)
+            elif block:
+                blocks.append(block)
+                block = []
+        if block:
+            blocks.append(block)
+        return blocks
+
+    @staticmethod
+    def _check_lines(lines: List[str]) -> None:
+        """Raise for lines starting block markup the token backend doesn't parse"""
+        for line in lines:
+            stripped = line.lstrip(" ")
+            if stripped.startswith(">") or RULE_LINE_P.fullmatch(line):
+                raise UnsupportedMarkdown(f"block quote, rule or setext heading {line}")
+
+    def _plain(self, lines: List[str], units: List[_Unit]) -> None:
+        """
+        Indented text that could be a code block or list content depending on the list nesting;
+        both display the same text as long as it has no markup
+        """
+        for line in lines:
+            stripped = line.lstrip(" ")
+            if (
+                any(char in line for char in INLINE_MARKUP) or stripped.startswith("#")
+                or LIST_ITEM_P.match(stripped) or RULE_LINE_P.fullmatch(stripped)
+                or stripped.startswith(">")
+            ):
+                raise UnsupportedMarkdown(f"ambiguous indented block {line}")
+        unit = _Unit()
+        unit.add("\n".join(lines))
+        units.append(unit)
+
+    def _parse_blocks(self, lines: List[str], units: List[_Unit]) -> None:
+        self._blocks(self._split_blocks(lines), units, False)
+
+    def _blocks(self, blocks: List[List[str]], units: List[_Unit], in_item: bool) -> None:
+        """
+        Parse blocks into units (BlockParser.parseBlocks)
+        - in_item: the blocks are the content of a list item
+        """
+        pending = deque(blocks)
+        # whether the last block was a list (indented blocks after one are its content)
+        after_list = False
+        while pending:
+            block = pending.popleft()
+            if isinstance(block, str):
+                units.append(self._heading(block))
+                after_list = False
+                continue
+
+            indent = _leading_spaces(block[0])
+            if indent >= 4:
+                if in_item or (after_list and indent >= 8):
+                    self._plain(block, units)
+                elif after_list:
+                    # content of the last list item
+                    self._blocks([_loose_detab(block)], units, True)
+                else:
+                    # code block, up to the first line that isn't indented
+                    code = 0
+                    while code < len(block) and block[code].startswith("    "):
+                        code += 1
+                    unit = _Unit()
+                    unit.add("\n".join(line[4:] for line in block[:code]), True)
+                    units.append(unit)
+                    if code < len(block):
+                        pending.appendleft(block[code:])
+                continue
+
+            # a heading line splits the block: lines before it, the heading, lines after it
+            heading = next((ind for ind, line in enumerate(block)
+                           if line.startswith("#")), None)
+            if heading is not None:
+                if heading + 1 < len(block):
+                    pending.appendleft(block[heading + 1:])
+                pending.appendleft(block[heading])
+                if heading:
+                    pending.appendleft(block[:heading])
+                continue
+
+            self._check_lines(block)
+            if LIST_ITEM_P.match(block[0]):
+                for item in self._list_items(block):
+                    if item[0].startswith("    "):
+                        self._blocks([_loose_detab(item)], units, True)
+                    else:
+                        self._blocks([item], units, True)
+                after_list = True
+            else:
+                units.append(self._inline("\n".join(block).lstrip())[0])
+                after_list = False
+
+    @staticmethod
+    def _list_items(block: List[str]) -> List[List[str]]:
+        """Lines of each item of a list block (OListProcessor.get_items); nested items keep their indentation"""
+        items: List[List[str]] = []
+        for line in block:
+            m = LIST_ITEM_P.match(line)
+            if m:
+                items.append([m.group(1)])
+            elif NESTED_ITEM_P.match(line):
+                if items[-1][0].startswith("    "):
+                    items[-1].append(line)
+                else:
+                    items.append([line])
+            else:
+                items[-1].append(line)
+        return items
+
+    def _parse_references(self, lines: List[str], units: List[_Unit]) -> List[Reference]:
+        """
+        Parse the References section, which must only have single-line list items (besides
+        paragraphs and headings), and read its references
+        """
+        refs: List[Reference] = []
+        pending = deque(self._split_blocks(lines))
+        while pending:
+            block = pending.popleft()
+            if isinstance(block, str):
+                units.append(self._heading(block))
+                continue
+            if _leading_spaces(block[0]) >= 4:
+                raise UnsupportedMarkdown("indented block in references")
+            heading = next((ind for ind, line in enumerate(block)
+                           if line.startswith("#")), None)
+            if heading is not None:
+                if heading + 1 < len(block):
+                    pending.appendleft(block[heading + 1:])
+                pending.appendleft(block[heading])
+                if heading:
+                    pending.appendleft(block[:heading])
+                continue
+            self._check_lines(block)
+            if not LIST_ITEM_P.match(block[0]):
+                units.append(self._inline("\n".join(block).lstrip())[0])
+                continue
+
+            for line in block:
+                m = LIST_ITEM_P.match(line)
+                item = m.group(1) if m else ""
+                if (
+                    m is None or LIST_ITEM_P.match(item) or RULE_LINE_P.fullmatch(item)
+                    or item.startswith(">")
+                ):
+                    raise UnsupportedMarkdown(f"list item {line}")
+                if item.startswith("#"):
+                    # the item is a heading
+                    heading = HEADING_P.fullmatch(item)
+                    if heading is None:
+                        raise UnsupportedMarkdown(f"list item {line}")
+                    item = heading.group("header").strip()
+                unit, markup = self._inline(item)
+                units.append(unit)
+                # emphasis or raw HTML would change the description's text nodes
+                if markup:
+                    raise UnsupportedMarkdown(f"markup in reference {line}")
+                if len(unit.links) != 1:
+                    continue
+                href, start, end = unit.links[0]
+                description = " ".join(unit.nodes[:start] + unit.nodes[end:])
+                refs.append(Reference(
+                    source_name=urlparse(href).netloc,
+                    description=re.sub(r"[\s|]+$", "", description),
+                    url=href,
+                ))
+        return refs
+
+    @staticmethod
+    def _find_hrefs_not_visible(units: List[_Unit]) -> List[str]:
+        displayed = " ".join(node for unit in units for node in unit.nodes)
+        verbatim = [node for unit in units
+                    for node, atomic in zip(unit.nodes, unit.atomic) if atomic]
+        stars = any(unit.stars for unit in units)
+        underscores = any(unit.underscores for unit in units)
+        hrefs: List[str] = []
+        for unit in units:
+            for href, _, _ in unit.links:
+                href = href.strip()
+                if href in displayed:
+                    # displayed text keeps emphasis markers; a URL with markers that could be
+                    # emphasis is only surely displayed in text they can't be in
+                    if (
+                        (stars and "*" in href or underscores and "_" in href)
+                        and not any(href in node for node in verbatim)
+                    ):
+                        raise UnsupportedMarkdown(f"emphasis markers in {href}")
+                    continue
+                if href.startswith(TECHNIQUE_URL):
+                    continue
+                hrefs.append(href)
+        return hrefs
+
+
+BACKENDS = {backend.name: backend for backend in (DomBackend, TokenBackend)}
+# Backend MDFile reads with unless told otherwise (the token backend is opt-in, ex: MDFile(path, "tokens"),
+# or --markdown-backend tokens for the whole update)
+DEFAULT_BACKEND = DomBackend.name
+
+
+def open_backend(md: "MDFile", name: str = DEFAULT_BACKEND) -> MarkdownBackend:
+    """Read md with the named backend; markdown it doesn't support is read with the reference backend"""
+    try:
+        return BACKENDS[name](md)
+    except UnsupportedMarkdown:
+        return DomBackend(md)
@@ -0,0 +1,419 @@
+# Updater Pipeline
+# The whole update (fetch, COUN7ER dataset, ATT&CK, index.json) as an object, so a long-running
+# service can hold it and call refresh() on a schedule instead of running update_datasets.py
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Set, Tuple
+from dataset_updater.attack_index import TechniqueInfo
+from dataset_updater.cache import ParseCache
+from dataset_updater.dataset_index import DatasetIndex, read_index_techniques, write_dataset_index
+from dataset_updater.dataset_sources import DatasetSource, extract_snapshot, get_git_sources
+from dataset_updater.dataset_types import *
+from dataset_updater.load import ITEM_PATTERN, TEMPLATE_PATTERN, LiveDataset, default_jobs, is_dataset_file, iter_items, iter_sources_items, load_templates, new_dataset, save_cache
+from dataset_updater.markdown_backends import DEFAULT_BACKEND
+from dataset_updater.profiling import Profiler
+from dataset_updater.search_index import SearchIndexBuilder, get_search_path, write_search_index
+from dataset_updater.update_attack import DOMAIN_FILES, get_changed_domains, update_attack
+from dataset_updater.util import fetch_repo, get_changed_paths, get_source_id, load_attack_github, load_counter_github, load_index, load_offline_source, load_state, save_state, update_index, update_state
+from dataset_updater.writer import write_dataset, write_dataset_and_sidecars
+
+# GitHub URLs
+ATTACK_URL = "https://github.com/mitre-attack/attack-stix-data.git"
+COUNTER_URL = "https://github.com/cisagov/coun7er.git"
+
+# State file key prefix of the configured datasets' sources (ex: "dataset:coun7er/latest")
+DATASET_STATE_PREFIX = "dataset:"
+
+# The Playbook-NG scripts/ directory, and the repo root it's in
+PROCESS_DIR = Path(__file__).parent.parent
+ROOT_DIR = PROCESS_DIR.parent
+
+
+def add_item_techniques(mitigated_techniques: Set[str], item: Item) -> None:
+    """Add the ATT&CK techniques a countermeasure mitigates"""
+    for tech in item.techniques:
+        mitigated_techniques.add(tech.tech_id)
+
+
+def add_template_techniques(mitigated_techniques: Set[str], templates: Iterable[Template]) -> None:
+    """Add the ATT&CK techniques mapped in templates"""
+    for tmpl in templates:
+        for tech_id in tmpl.tech_to_items.keys():
+            # Exclude the unmapped items
+            if "unmapped" not in tech_id:
+                mitigated_techniques.add(tech_id)
+
+
+class UpdaterPipeline:
+    """
+    Updates the ATT&CK and COUN7ER data of a Playbook-NG tree; refresh() runs one update
+    - Each refresh only re-processes what changed since the last one (per the state file)
+    - resident: the parsed countermeasures/templates and ATT&CK technique indexes are kept in
+      memory between refreshes, so only changed files are re-parsed. Otherwise (the script),
+      items are streamed to latest.json and dropped, keeping memory bounded
+    - attack_store: keep ATT&CK versions in a deduplicated object store (see attack_store); every
+      version stays published
+    - dataset_sources: build these datasets/versions (see dataset_sources) instead of only
+      COUN7ER latest, all through one worker pool; they're always streamed
+    - markdown_backend: the backend reading the countermeasures' markdown (see markdown_backends)
+    """
+
+    def __init__(self, root_dir: Path = ROOT_DIR, baseline_ids: List[str] | None = None, jobs: int | None = None, fetch_mode: str = "full", slim_attack: bool = False, counter_source: Path | None = None, attack_source: Path | None = None, use_cache: bool = True, resident: bool = True, attack_url: str = ATTACK_URL, counter_url: str = COUNTER_URL, profiler: Profiler | None = None, dataset_sources: List[DatasetSource] | None = None, attack_store: bool = False, markdown_backend: str = DEFAULT_BACKEND) -> None:
+        self.baseline_ids = baseline_ids or []
+        self.jobs = max(1, jobs or default_jobs())
+        self.fetch_mode = fetch_mode
+        self.slim_attack = slim_attack
+        self.counter_source = counter_source
+        self.attack_source = attack_source
+        self.use_cache = use_cache
+        self.resident = resident
+        self.attack_url = attack_url
+        self.counter_url = counter_url
+        self.dataset_sources = dataset_sources
+        self.attack_store = attack_store
+        self.markdown_backend = markdown_backend
+        # Stage timings are always recorded (cheap)
+        self.profiler = profiler or Profiler()
+
+        root_dir = Path(root_dir)
+        data_dir = root_dir / "shared/data/"
+        # Base directory for storing the data from GitHub
+        repo_path = root_dir / "github"
+        self.repo_path = repo_path
+        # ATT&CK/COUN7ER GitHub repo paths (for cloning)
+        self.attack_repo_path = repo_path / "attack"
+        self.counter_repo_path = repo_path / "coun7er"
+        # Where offline tarballs get extracted
+        self.offline_path = repo_path / "offline"
+        # Updater state path (last processed commit of each repo)
+        self.state_path = repo_path / "state.json"
+        # ATT&CK object store (with --attack-store; kept out of the served app data)
+        self.attack_store_path = repo_path / "attack-store"
+        # App data paths
+        self.index_path = data_dir / "index.json"
+        self.attack_data_path = data_dir / "attack"
+        self.datasets_path = data_dir / "datasets"
+        self.counter_data_path = self.datasets_path / "coun7er/latest.json"
+        # Parse cache path, and the ATT&CK technique index cache (build caches stay out of the app data)
+        self.cache_path = PROCESS_DIR / ".cache/coun7er.pickle"
+        self.attack_cache_path = PROCESS_DIR / ".cache/attack"
+
+        # Commits processed by the last refresh
+        self.state = load_state(self.state_path)
+        # ATT&CK techniques mitigated by the countermeasures/templates
+        # This tells us which ATT&CK domains to load
+        self.mitigated_techniques: Set[str] = set()
+        # Resident data: the parsed COUN7ER files, and ATT&CK technique indexes by (domain, version)
+        self.live: LiveDataset | None = None
+        self.attack_indexes: Dict[Tuple[str, str], Dict[str, TechniqueInfo]] = {}
+
+    def _fetch_counter(self) -> Tuple[Path, str]:
+        """Fetch/update the latest COUN7ER data from the GitHub repo (or use a local copy)"""
+        with self.profiler.stage("fetch_coun7er"):
+            sparse_paths = [ITEM_PATTERN, TEMPLATE_PATTERN]
+            if self.counter_source:
+                repo_path = load_offline_source(
+                    "COUN7ER", self.counter_source, self.offline_path / "coun7er")
+                sha = get_source_id(
+                    repo_path, ["**/" + p for p in sparse_paths])
+            else:
+                repo_path = self.counter_repo_path
+                sha = load_counter_github(
+                    self.counter_url, repo_path, self.fetch_mode, sparse_paths)
+        return repo_path, sha
+
+    def _fetch_attack(self) -> Tuple[Path, str]:
+        """Fetch/update the latest ATT&CK data from the GitHub repo (or use a local copy)"""
+        with self.profiler.stage("fetch_attack"):
+            if self.attack_source:
+                repo_path = load_offline_source(
+                    "ATT&CK", self.attack_source, self.offline_path / "attack")
+                sha = get_source_id(repo_path, list(DOMAIN_FILES.values()))
+            else:
+                repo_path = self.attack_repo_path
+                sha = load_attack_github(
+                    self.attack_url, repo_path, self.fetch_mode,
+                    ["/" + file for file in DOMAIN_FILES.values()])
+        return repo_path, sha
+
+    def _print_write_reason(self, counter_changed: bool, remake: bool) -> None:
+        if counter_changed or remake:
+            print("\nUpdating COUN7ER latest.json using latest GitHub data.")
+            if remake:
+                print("  [i] Remake specified, remaking dataset from scratch.")
+            if self.baseline_ids:
+                print("  [i] Including specified baseline CMs.")
+        elif self.baseline_ids:
+            print("Updating COUN7ER latest.json with specified baseline CMs.")
+
+    def _write_streamed(self, dataset: Dataset, dataset_path: Path, items: Iterable[Item], baseline_ids: List[str], mitigated_techniques: Set[str], write: bool = True) -> bool:
+        """
+        Stream items to a dataset file (if write) and write its index/search sidecars, returns
+        whether any changed
+        - Each item is written out (in ID order) before the next is taken, so only a small
+          window of them is ever in memory
+        - The ATT&CK techniques of the items and templates are added to mitigated_techniques
+        """
+        profiler = self.profiler
+        add_template_techniques(mitigated_techniques, dataset.templates)
+        # Lookups for the <version>.index.json sidecar, built as the items go by
+        dataset_index = DatasetIndex(dataset)
+        # Full-text index for the <version>.search.json sidecar
+        search_builder = SearchIndexBuilder(dataset)
+
+        def load_items():
+            for cm in items:
+                add_item_techniques(mitigated_techniques, cm)
+                dataset_index.add_item(cm)
+                search_builder.add_item(cm)
+                # Update the is_baseline on any specified CMs
+                if cm.id in baseline_ids:
+                    cm.is_baseline = True
+                yield cm
+        streamed = profiler.iter_stage("load_dataset", load_items())
+        if write:
+            with profiler.stage("write_dataset"):
+                updated = write_dataset(dataset, dataset_path, streamed)
+        else:
+            # Nothing to write, the items are only needed for their techniques and missing sidecars
+            updated = False
+            for _ in streamed:
+                pass
+        # Dataset lookups -> <version>.index.json (created if missing, even without changes)
+        updated |= write_dataset_index(dataset_index, dataset_path)
+        # Search index -> <version>.search.json
+        updated |= write_search_index(search_builder, dataset_path)
+        return updated
+
+    def _skip_unchanged(self, dataset_path: Path, repo_path: Path, mitigated_techniques: Set[str]) -> bool:
+        """
+        Whether an unchanged dataset's items can be left unparsed: its index and search sidecars
+        both exist (the dataset file itself is only rewritten on changes)
+        - If so, the ATT&CK techniques of its items (read from the index sidecar) and templates
+          are added to mitigated_techniques
+        """
+        index_techniques = read_index_techniques(dataset_path)
+        if index_techniques is None or not get_search_path(dataset_path).is_file():
+            return False
+        print(f"  [-] {dataset_path} and its sidecars are up to date, not rebuilt.")
+        mitigated_techniques.update(index_techniques)
+        add_template_techniques(mitigated_techniques, load_templates(repo_path))
+        return True
+
+    def _update_counter_streamed(self, repo_path: Path, counter_changed: bool, remake: bool) -> bool:
+        """
+        Load the dataset and write latest.json (and its sidecars), returns whether any changed
+        - Items are streamed (see _write_streamed)
+        """
+        print("\nLoading the GitHub COUN7ER dataset.")
+        # Update COUN7ER (the baseline items even if there's no new data)
+        write = counter_changed or remake or bool(self.baseline_ids)
+        self.mitigated_techniques = set()
+        if not write and self._skip_unchanged(self.counter_data_path, repo_path, self.mitigated_techniques):
+            return False
+        parse_cache = ParseCache(self.cache_path)
+        if self.use_cache:
+            parse_cache.read()
+        dataset = new_dataset()
+        dataset.templates = load_templates(repo_path, parse_cache)
+        items = iter_items(repo_path, self.jobs, parse_cache,
+                           self.profiler.item_timings, self.markdown_backend)
+        if write:
+            self._print_write_reason(counter_changed, remake)
+        # Dataset -> coun7er/latest.json
+        counter_updated = self._write_streamed(
+            dataset, self.counter_data_path, items, self.baseline_ids, self.mitigated_techniques, write)
+        save_cache(parse_cache)
+        return counter_updated
+
+    def _update_counter_resident(self, repo_path: Path, changes: List[str] | None, remake: bool) -> Tuple[bool, bool]:
+        """
+        Update the resident dataset, re-parsing only the changed files, and write latest.json
+        (and its sidecars) -> (whether the dataset changed, whether any file changed)
+        """
+        profiler = self.profiler
+        if self.live is None or self.live.root != Path(repo_path):
+            print("\nLoading the GitHub COUN7ER dataset.")
+            self.live = LiveDataset(repo_path, self.markdown_backend)
+            paths = None
+        else:
+            print("\nRefreshing the resident COUN7ER dataset.")
+            # None (unknown changes): every file's content is compared to the resident one
+            paths = None if changes is None else {
+                str(Path(repo_path) / p) for p in changes if is_dataset_file(p)}
+        # The parse cache only helps the first load (later, unchanged files are already resident);
+        # it's only saved then too, as it keeps just the entries looked up
+        parse_cache = None
+        if paths is None and not self.live.files:
+            parse_cache = ParseCache(self.cache_path)
+            if self.use_cache:
+                parse_cache.read()
+        with profiler.stage("load_dataset"):
+            changed = self.live.refresh(paths, self.jobs, parse_cache)
+        if parse_cache is not None:
+            save_cache(parse_cache)
+        counter_changed = bool(changed)
+        dataset = self.live.build(self.baseline_ids)
+        self.mitigated_techniques = set()
+        for cm in dataset.items:
+            add_item_techniques(self.mitigated_techniques, cm)
+        add_template_techniques(self.mitigated_techniques, dataset.templates)
+        self._print_write_reason(counter_changed, remake)
+        # Dataset (and its sidecars) -> coun7er/latest.json; unchanged files aren't rewritten
+        with profiler.stage("write_dataset"):
+            counter_updated = write_dataset_and_sidecars(
+                dataset, self.counter_data_path)
+        return counter_changed, counter_updated
+
+    def _checkout_sources(self, sources: List[DatasetSource], counter_repo_path: Path) -> List[Path]:
+        """
+        Get the checkout to read each dataset source from
+        - Git sources are cloned/updated under github/datasets/ (all at once, git is network/IO
+          bound); sources without one read the COUN7ER repo
+        - Pinned sources (with a ref) read the files of that commit, extracted under github/snapshots/
+        """
+        sparse_paths = [ITEM_PATTERN, TEMPLATE_PATTERN]
+        git_repos = get_git_sources(sources)
+        with ThreadPoolExecutor(max_workers=max(1, len(git_repos))) as fetch_pool:
+            fetches = [fetch_pool.submit(fetch_repo, f"{repo_id} dataset", url, self.repo_path / "datasets" / repo_id, self.fetch_mode, sparse_paths)
+                       for url, repo_id in git_repos.items()]
+            for fetch in fetches:
+                fetch.result()
+        repo_paths = []
+        for source in sources:
+            if source.source is None:
+                repo_path = Path(counter_repo_path)
+            elif source.is_git:
+                repo_path = self.repo_path / "datasets" / git_repos[source.source]
+            else:
+                repo_path = load_offline_source(
+                    f"{source.key} dataset", Path(source.source), self.offline_path / "datasets" / source.id / source.version)
+            if source.ref is not None:
+                if not (repo_path / ".git").exists():
+                    raise ValueError(
+                        f"dataset {source.key} has a ref, but {repo_path} is not a git repo")
+                print(f"\nExtracting {source.key} from {source.ref}.")
+                repo_path = extract_snapshot(
+                    repo_path, source.ref, self.repo_path / "snapshots" / source.id / source.version)
+            repo_paths.append(repo_path)
+        return repo_paths
+
+    def _update_datasets(self, counter_repo_path: Path, remake: bool) -> Tuple[bool, bool]:
+        """
+        Build the configured datasets -> (whether any source changed, whether any file changed)
+        - latest versions are rebuilt when their source changed since the last refresh (per the
+          state file, as COUN7ER is), or if remake; snapshots are built once, then left as published
+        - Every rebuilt dataset's countermeasures are parsed through one shared worker pool (see
+          iter_sources_items), each dataset streamed to its file (see _write_streamed)
+        """
+        profiler = self.profiler
+        print("\nBuilding the configured datasets.")
+        sources = []
+        for source in self.dataset_sources:
+            if source.immutable and source.is_published(self.datasets_path):
+                print(
+                    f"  [-] {source.dataset_path(self.datasets_path)} is a published snapshot, not rebuilt.")
+                continue
+            sources.append(source)
+        with profiler.stage("fetch_datasets"):
+            repo_paths = self._checkout_sources(sources, counter_repo_path)
+        self.mitigated_techniques = set()
+        any_changed = False
+        # (source, checkout, its state key and ID, whether to write the dataset file) of each dataset to parse
+        builds = []
+        # Checkouts of the unchanged datasets, whose parse cache entries are kept
+        skipped = []
+        for source, repo_path in zip(sources, repo_paths):
+            state_key = DATASET_STATE_PREFIX + source.key
+            sha = get_source_id(
+                repo_path, ["**/" + p for p in [ITEM_PATTERN, TEMPLATE_PATTERN]])
+            changes = get_changed_paths(
+                repo_path, self.state.get(state_key, {}).get("current"), sha)
+            changed = changes is None or any(is_dataset_file(p) for p in changes)
+            any_changed |= changed
+            baseline_ids = self.baseline_ids if source.baseline_ids is None else source.baseline_ids
+            write = changed or remake or bool(baseline_ids)
+            if not write and self._skip_unchanged(source.dataset_path(self.datasets_path), repo_path, self.mitigated_techniques):
+                update_state(self.state, state_key, sha)
+                skipped.append(repo_path)
+                continue
+            builds.append((source, repo_path, state_key, sha, write))
+        if not builds:
+            return any_changed, False
+        parse_cache = ParseCache(self.cache_path)
+        if self.use_cache:
+            parse_cache.read()
+        updated = False
+        sources_items = iter_sources_items(
+            [repo_path for _, repo_path, _, _, _ in builds], self.jobs, parse_cache,
+            profiler.item_timings, self.markdown_backend)
+        for items, (source, repo_path, state_key, sha, write) in zip(sources_items, builds):
+            print(f"\nBuilding dataset {source.key} from {repo_path}.")
+            dataset = new_dataset(source.id, source.version,
+                                  source.display_name, source.url)
+            dataset.templates = load_templates(repo_path, parse_cache)
+            baseline_ids = self.baseline_ids if source.baseline_ids is None else source.baseline_ids
+            updated |= self._write_streamed(
+                dataset, source.dataset_path(self.datasets_path), items, baseline_ids, self.mitigated_techniques, write)
+            update_state(self.state, state_key, sha)
+        for repo_path in skipped:
+            parse_cache.keep(repo_path)
+        save_cache(parse_cache)
+        return any_changed, updated
+
+    def refresh(self, remake: bool = False) -> bool:
+        """
+        Fetch both repos and update what changed since the last refresh, returns whether any
+        app data was updated. If remake, the COUN7ER dataset (or the configured datasets) is rewritten even if unchanged
+        """
+        print("Cloning/updating ATT&CK and COUN7ER GitHub repositories.")
+        # Both fetches run at once (git is network/IO bound); COUN7ER parsing starts as soon
+        # as its repo is ready, while the ATT&CK fetch may still be in flight
+        with ThreadPoolExecutor(max_workers=2) as fetch_pool:
+            counter_fetch = fetch_pool.submit(self._fetch_counter)
+            attack_fetch = fetch_pool.submit(self._fetch_attack)
+            counter_repo_path, counter_sha = counter_fetch.result()
+            # Determine what changed since the last refresh (None: unknown, treat everything as changed)
+            counter_changes = get_changed_paths(
+                counter_repo_path, self.state.get("coun7er", {}).get("current"), counter_sha)
+            if self.dataset_sources is not None:
+                counter_changed, counter_updated = self._update_datasets(
+                    counter_repo_path, remake)
+            elif self.resident:
+                counter_changed, counter_updated = self._update_counter_resident(
+                    counter_repo_path, counter_changes, remake)
+            else:
+                counter_changed = counter_changes is None or any(
+                    is_dataset_file(p) for p in counter_changes)
+                counter_updated = self._update_counter_streamed(
+                    counter_repo_path, counter_changed, remake)
+            attack_repo_path, attack_sha = attack_fetch.result()
+        attack_changes = get_changed_paths(
+            attack_repo_path, self.state.get("attack", {}).get("current"), attack_sha)
+        attack_domains = get_changed_domains(attack_changes)
+        # Changed mappings may reference techniques in another domain, so check them all
+        if counter_changed:
+            attack_domains = get_changed_domains(None)
+        # Load the current index.json
+        index_json = load_index(self.index_path)
+
+        # State variables for tracking updates
+        attack_updated = False
+
+        # Update ATT&CK
+        if attack_domains:
+            # Update the ATT&CK files, if necessary
+            with self.profiler.stage("attack_scan"):
+                attack_updated = update_attack(
+                    index_json, self.mitigated_techniques, attack_repo_path, self.attack_data_path,
+                    attack_domains, self.slim_attack, self.attack_indexes if self.resident else None,
+                    self.attack_store, self.attack_cache_path, self.attack_store_path)
+        # Update index.json
+        with self.profiler.stage("index"):
+            update_index(attack_updated, counter_updated,
+                         self.index_path, self.attack_data_path, self.attack_store_path)
+        # Record the processed commits
+        update_state(self.state, "coun7er", counter_sha)
+        update_state(self.state, "attack", attack_sha)
+        save_state(self.state, self.state_path)
+        return attack_updated or counter_updated
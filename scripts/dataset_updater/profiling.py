@@ -0,0 +1,126 @@
+# Run Profiling
+# Per-stage wall time, CPU time and peak memory of an updater run, reported as JSON
+import json
+import os
+import platform
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator
+from dataset_updater.files import write_text
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows; peak memory is then left out of the report
+    resource = None
+
+# Slowest countermeasure files listed in the report
+SLOWEST_ITEMS = 10
+
+
+def peak_rss_mb(who: str = "self") -> float | None:
+    """
+    High-water mark of resident memory (MB), for this process ("self") or its
+    finished child processes ("children", ex: parse workers)
+    """
+    if resource is None:
+        return None
+    usage = resource.getrusage(
+        resource.RUSAGE_SELF if who == "self" else resource.RUSAGE_CHILDREN)
+    # ru_maxrss is in bytes on macOS, KB elsewhere
+    scale = 1 << 20 if platform.system() == "Darwin" else 1 << 10
+    return round(usage.ru_maxrss / scale, 2)
+
+
+class Profiler:
+    """
+    Records the stages of a run
+    - Wall time is per stage; CPU time is the whole process's, so stages that run at the
+      same time (ex: the two fetches) each include the other's CPU use
+    - Peak memory is the process high-water mark when the stage ends; only its growth
+      (peak_rss_growth_mb) can be attributed to the stage
+    - Stages can nest: streamed items are parsed (load_dataset) while they're written (write_dataset)
+    """
+
+    def __init__(self) -> None:
+        self.stages: Dict[str, dict] = {}
+        self.item_timings: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+
+    def _record(self, name: str, start_wall: float, start_peak: float | None, wall: float, cpu: float) -> None:
+        record = {
+            "wall_s": round(wall, 4),
+            "cpu_s": round(cpu, 4),
+            "start_s": round(start_wall - self._start_wall, 4),
+        }
+        end_peak = peak_rss_mb()
+        if end_peak is not None:
+            record["peak_rss_mb"] = end_peak
+            record["peak_rss_growth_mb"] = round(end_peak - start_peak, 2)
+        with self._lock:
+            self.stages[name] = record
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time the enclosed block as a stage (safe to use from several threads)"""
+        start_peak = peak_rss_mb()
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        try:
+            yield
+        finally:
+            self._record(name, start_wall, start_peak, time.perf_counter() - start_wall,
+                         time.process_time() - start_cpu)
+
+    def iter_stage(self, name: str, iterable: Iterable) -> Iterator:
+        """
+        Time only the producing of an iterable's values as a stage, ex: items that are
+        parsed as they're written (the consumer's stage then includes this one)
+        """
+        start_peak = peak_rss_mb()
+        start_wall = time.perf_counter()
+        wall = 0.0
+        cpu = 0.0
+        values = iter(iterable)
+        while True:
+            value_wall = time.perf_counter()
+            value_cpu = time.process_time()
+            try:
+                value = next(values)
+            except StopIteration:
+                break
+            finally:
+                wall += time.perf_counter() - value_wall
+                cpu += time.process_time() - value_cpu
+            yield value
+        self._record(name, start_wall, start_peak, wall, cpu)
+
+    def report(self) -> dict:
+        """The report: total, per-stage records (in start order) and the slowest CM files"""
+        slowest = sorted(self.item_timings.items(),
+                         key=lambda entry: entry[1], reverse=True)[:SLOWEST_ITEMS]
+        total = {
+            "wall_s": round(time.perf_counter() - self._start_wall, 4),
+            "cpu_s": round(time.process_time() - self._start_cpu, 4),
+        }
+        if resource is not None:
+            total["peak_rss_mb"] = peak_rss_mb()
+            total["children_peak_rss_mb"] = peak_rss_mb("children")
+        return {
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "total": total,
+            "stages": dict(sorted(self.stages.items(), key=lambda entry: entry[1]["start_s"])),
+            "items_parsed": len(self.item_timings),
+            "items_parse_s": round(sum(self.item_timings.values()), 4),
+            "slowest_items": [{"path": path, "wall_s": round(seconds, 4)}
+                              for path, seconds in slowest],
+        }
+
+    def write_report(self, report_path: Path) -> None:
+        write_text(report_path, json.dumps(self.report(), indent=4))
+        print(f"  [+] Wrote profile report to {report_path}")
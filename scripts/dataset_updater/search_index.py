@@ -0,0 +1,206 @@
+# Search Index
+# Tokenized inverted index of the dataset items (ID, name, content), written as a sidecar to the
+# dataset's JSON file (ex: latest.json -> latest.search.json), and a small query engine for it
+import argparse
+import json
+import math
+import re
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import Dict, List, Tuple
+from dataset_updater.dataset_types import *
+from dataset_updater.files import write_text
+
+# Sidecar suffix (ex: latest.json -> latest.search.json)
+SEARCH_SUFFIX = ".search.json"
+# Bumped when the layout of the index changes
+SEARCH_FORMAT = "1.0"
+
+# Indexed fields and their score boosts (the same boosts as the app's item search)
+FIELDS = ["id", "name", "content"]
+FIELD_BOOSTS = {"id": 3.0, "name": 2.0, "content": 1.0}
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+# Weight of terms that only match a query term as a prefix
+PREFIX_WEIGHT = 0.5
+
+# Words (letters/digits), keeping dotted IDs whole (ex: T1003.001, CM0001.002)
+TOKEN_P = re.compile(r"[a-z0-9]+(?:\.[0-9]+)*")
+# Frequent words (and URL parts, from references) that don't help ranking
+STOP_WORDS = frozenset("""
+a an and are as at be by can for from has have if in into is it its may not of on or such
+that the their then there these this to was were which will with https http www com
+""".split())
+
+
+def get_search_path(dataset_path: Path) -> Path:
+    """The sidecar search index path of a dataset file"""
+    dataset_path = Path(dataset_path)
+    return dataset_path.with_name(dataset_path.name[:-len(".json")] + SEARCH_SUFFIX)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens of a text, without stop words"""
+    return [token for token in TOKEN_P.findall(text.lower()) if token not in STOP_WORDS]
+
+
+class SearchIndexBuilder:
+    """
+    Builds the index one item at a time (so it works on streamed items)
+
+    Layout (postings are flat [doc, term frequency, doc, term frequency, ..] lists per field):
+    {"format", "dataset", "version", "fields", "boosts",
+     "docs": [item ID per doc number],
+     "lengths": [[token count per doc] per field],
+     "terms": {term: [postings per field]}}
+    """
+
+    def __init__(self, dataset: Dataset) -> None:
+        self.dataset_id = dataset.id
+        self.version = dataset.version
+        self.docs: List[str] = []
+        self.lengths: List[List[int]] = [[] for _ in FIELDS]
+        self.terms: Dict[str, List[List[int]]] = {}
+
+    def add_item(self, item: Item) -> None:
+        doc = len(self.docs)
+        self.docs.append(item.id)
+        for field_ind, text in enumerate([item.id, item.name, item.content]):
+            tokens = tokenize(text)
+            self.lengths[field_ind].append(len(tokens))
+            counts: Dict[str, int] = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                postings = self.terms.get(token)
+                if postings is None:
+                    postings = self.terms[token] = [[] for _ in FIELDS]
+                postings[field_ind] += [doc, count]
+
+    def to_json(self) -> dict:
+        return {
+            "format": SEARCH_FORMAT,
+            "dataset": self.dataset_id,
+            "version": self.version,
+            "fields": FIELDS,
+            "boosts": [FIELD_BOOSTS[field] for field in FIELDS],
+            "docs": self.docs,
+            "lengths": self.lengths,
+            "terms": {term: self.terms[term] for term in sorted(self.terms)},
+        }
+
+
+def write_search_index(builder: SearchIndexBuilder, dataset_path: Path) -> bool:
+    """Write the sidecar search index of a dataset file (atomically, minified), returns whether its content changed"""
+    search_path = get_search_path(dataset_path)
+    text = json.dumps(builder.to_json(), separators=(",", ":"))
+    if write_text(search_path, text):
+        print(f"  [+] Wrote to {search_path}")
+        return True
+    print(f"  [-] {search_path} content is unchanged, not rewritten.")
+    return False
+
+
+class SearchIndex:
+    """
+    Queries a search index (BM25 per field, weighted by the field boosts)
+    - Each query term is looked up directly, and (with prefix=True) expanded to the
+      indexed terms it prefixes through a binary search of the sorted terms
+    - Results are (item ID, score), best first; every query term must match (AND)
+    """
+
+    def __init__(self, data: dict) -> None:
+        if data.get("format") != SEARCH_FORMAT:
+            raise ValueError(
+                f"unsupported search index format {data.get('format')}")
+        self.docs: List[str] = data["docs"]
+        self.boosts: List[float] = data["boosts"]
+        self.lengths: List[List[int]] = data["lengths"]
+        self.avg_lengths = [sum(lengths) / len(lengths) if lengths else 0.0
+                            for lengths in self.lengths]
+        self.terms: Dict[str, List[List[int]]] = data["terms"]
+        self.sorted_terms = sorted(self.terms)
+
+    @classmethod
+    def load(cls, search_path: Path) -> "SearchIndex":
+        with open(search_path, "r", encoding="utf-8") as file:
+            return cls(json.load(file))
+
+    def _expand(self, token: str, prefix: bool) -> List[Tuple[str, float]]:
+        """Indexed terms matching a query token, with their weights"""
+        matches = [(token, 1.0)] if token in self.terms else []
+        if prefix:
+            ind = bisect_left(self.sorted_terms, token)
+            while ind < len(self.sorted_terms) and self.sorted_terms[ind].startswith(token):
+                if self.sorted_terms[ind] != token:
+                    matches.append((self.sorted_terms[ind], PREFIX_WEIGHT))
+                ind += 1
+        return matches
+
+    def _term_scores(self, term: str) -> Dict[int, float]:
+        """BM25 score of a term for each doc containing it, summed over the boosted fields"""
+        postings = self.terms[term]
+        doc_count = len(self.docs)
+        doc_freq = len({doc for field_postings in postings for doc in field_postings[::2]})
+        idf = math.log(1 + (doc_count - doc_freq + 0.5) / (doc_freq + 0.5))
+        scores: Dict[int, float] = {}
+        for field_ind, field_postings in enumerate(postings):
+            boost = self.boosts[field_ind]
+            lengths = self.lengths[field_ind]
+            avg_length = self.avg_lengths[field_ind] or 1.0
+            for ind in range(0, len(field_postings), 2):
+                doc, freq = field_postings[ind], field_postings[ind + 1]
+                norm = 1 - B + B * lengths[doc] / avg_length
+                scores[doc] = scores.get(doc, 0.0) + boost * idf * \
+                    freq * (K1 + 1) / (freq + K1 * norm)
+        return scores
+
+    def search(self, query: str, limit: int = 10, prefix: bool = True) -> List[Tuple[str, float]]:
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        totals: Dict[int, float] | None = None
+        for token in tokens:
+            token_scores: Dict[int, float] = {}
+            for term, weight in self._expand(token, prefix):
+                for doc, score in self._term_scores(term).items():
+                    token_scores[doc] = max(
+                        token_scores.get(doc, 0.0), weight * score)
+            if totals is None:
+                totals = token_scores
+            else:
+                totals = {doc: score + token_scores[doc]
+                          for doc, score in totals.items() if doc in token_scores}
+            if not totals:
+                return []
+        ranked = sorted(totals.items(), key=lambda entry: (-entry[1], entry[0]))
+        return [(self.docs[doc], round(score, 4)) for doc, score in ranked[:limit]]
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python3 -m dataset_updater.search_index',
+                                     description='Query a dataset search index (ex: shared/data/datasets/coun7er/latest.search.json), printing the ranked results and the query time.')
+    parser.add_argument('search_path', type=Path, help=f"Search index file.")
+    parser.add_argument('query', nargs="+", help=f"Query terms.")
+    parser.add_argument('-n', '--limit', type=int, default=10,
+                        help=f"Number of results (default: 10).")
+    parser.add_argument('--exact', action="store_true",
+                        help=f"Only match whole terms (no prefix matching).")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = SearchIndex.load(args.search_path)
+    load_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    results = index.search(" ".join(args.query), args.limit, not args.exact)
+    query_ms = (time.perf_counter() - start) * 1000
+    for rank, (item_id, score) in enumerate(results, 1):
+        print(f"  {rank:>3}. {item_id:<12} {score}")
+    print(f"  [i] {len(results)} result(s), loaded in {load_ms:.1f} ms, queried in {query_ms:.2f} ms.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# Slim ATT&CK Bundles
+# Writes a copy of an ATT&CK bundle holding only what Playbook-NG reads from it
+import json
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Set
+from dataset_updater.files import AtomicFile
+from dataset_updater.stix import iter_bundle_objects
+
+# Objects always kept, along with the relationships that connect them
+CORE_TYPES = {"x-mitre-collection", "x-mitre-matrix",
+              "x-mitre-tactic", "attack-pattern"}
+
+# Relationships the app follows from a technique
+# - uses: procedure examples (groups/software/campaigns -> technique)
+# - targets: platform names (technique -> assets)
+# - detects: data source names (data components -> technique)
+# - revoked-by / subtechnique-of: technique statuses and hierarchy
+KEPT_RELATIONSHIPS = {"uses", "targets",
+                      "detects", "revoked-by", "subtechnique-of"}
+
+# Properties the app never reads, dropped from every object
+DROPPED_PROPS = {"created_by_ref", "object_marking_refs",
+                 "x_mitre_modified_by_ref", "x_mitre_contents"}
+
+
+def _find_kept_ids(iter_objects: Callable[..., Iterator[dict]], header: dict) -> tuple:
+    """First pass: the IDs of the objects to keep, and of those the kept relationships reach (also fills header)"""
+    full_ids: Set[str] = set()
+    linked_ids: Set[str] = set()
+    data_source_refs: Dict[str, str] = {}
+
+    for obj in iter_objects(header):
+        obj_type = obj["type"]
+        if obj_type in CORE_TYPES:
+            full_ids.add(obj["id"])
+        elif obj_type == "x-mitre-data-component":
+            data_source_refs[obj["id"]] = obj.get("x_mitre_data_source_ref")
+        elif (
+            obj_type == "relationship"
+            and obj.get("relationship_type") in KEPT_RELATIONSHIPS
+            and (obj["source_ref"].startswith("attack-pattern--")
+                 or obj["target_ref"].startswith("attack-pattern--"))
+        ):
+            full_ids.add(obj["id"])
+            linked_ids.add(obj["source_ref"])
+            linked_ids.add(obj["target_ref"])
+
+    # data components need their data sources (for the source names)
+    linked_ids |= {data_source_refs[comp_id]
+                   for comp_id in linked_ids if data_source_refs.get(comp_id)}
+
+    return full_ids, linked_ids
+
+
+def write_slim_bundle(bundle_path: Path, out_path: Path) -> None:
+    """
+    Write a slim copy of an ATT&CK bundle
+    - Keeps: the collection, matrices, tactics, techniques, and the relationships the app follows from techniques
+    - Keeps the objects those relationships reach (groups, software, campaigns, assets, data
+      components and sources) whole, so procedure examples keep their descriptions and aliases
+    - Drops only properties the app never reads (DROPPED_PROPS), from every object
+    - Two streaming passes; only sets of IDs are held in memory
+    """
+    write_slim_objects(
+        lambda header=None: iter_bundle_objects(bundle_path, header), out_path)
+
+
+def write_slim_objects(iter_objects: Callable[..., Iterator[dict]], out_path: Path) -> bool:
+    """
+    Write a slim bundle (see write_slim_bundle) of the objects of any bundle source, returns
+    whether its content changed
+    - iter_objects(header=None) yields the bundle's objects in order, storing its other
+      top-level properties in header if given (as iter_bundle_objects does); it's called twice
+    """
+    header: dict = {}
+    full_ids, linked_ids = _find_kept_ids(iter_objects, header)
+
+    writer = AtomicFile(out_path, "w")
+    with writer as out_file:
+        out_file.write("{")
+        for key, value in header.items():
+            out_file.write(f"{json.dumps(key)}:{json.dumps(value)},")
+        out_file.write('"objects":[')
+        first = True
+        for obj in iter_objects():
+            obj_id = obj["id"]
+            if obj_id not in full_ids and obj_id not in linked_ids:
+                continue
+            obj = {prop: value for prop, value in obj.items()
+                   if prop not in DROPPED_PROPS}
+            if not first:
+                out_file.write(",")
+            first = False
+            out_file.write(json.dumps(obj, separators=(",", ":")))
+        out_file.write("]}")
+    return writer.changed
@@ -0,0 +1,116 @@
+# STIX Bundle Streaming
+# Reads an ATT&CK bundle's objects one at a time, without loading the whole file
+import json
+from json.decoder import WHITESPACE
+from pathlib import Path
+from typing import Any, Iterator, Tuple
+
+# Bytes read from the file at a time
+CHUNK_SIZE = 1 << 18
+
+_decoder = json.JSONDecoder()
+
+
+class _StreamReader:
+    """Incremental JSON reader over a text file; only a window of the file is held in memory"""
+
+    def __init__(self, file) -> None:
+        self.file = file
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, size: int = CHUNK_SIZE) -> bool:
+        """Read more of the file into the buffer, dropping the consumed part"""
+        if self.eof:
+            return False
+        chunk = self.file.read(size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace char ("" at EOF)"""
+        while True:
+            self.pos = WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise ValueError(
+                f"expected {char!r} in STIX bundle, found {self.peek()!r}")
+        self.pos += 1
+
+    def value(self) -> Any:
+        """Decode the next JSON value"""
+        self.peek()
+        size = CHUNK_SIZE
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+                # a value running up to the buffer's end may be cut short (ex: a number)
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # value is incomplete, read more (growing, to bound re-decoding)
+            self._fill(size)
+            size *= 2
+
+
+def iter_bundle_objects(file_path: Path, header: dict | None = None) -> Iterator[dict]:
+    """
+    Yield each object of a STIX bundle's "objects" list, in file order
+    - If header is given, the bundle's other top-level properties are stored in it
+    """
+    with open(file_path, "r", encoding="utf-8") as file:
+        reader = _StreamReader(file)
+        reader.expect("{")
+        if reader.peek() == "}":
+            return
+        while True:
+            key = reader.value()
+            reader.expect(":")
+            if key == "objects":
+                reader.expect("[")
+                if reader.peek() != "]":
+                    while True:
+                        yield reader.value()
+                        if reader.peek() != ",":
+                            break
+                        reader.expect(",")
+                reader.expect("]")
+            else:
+                value = reader.value()
+                if header is not None:
+                    header[key] = value
+            if reader.peek() != ",":
+                break
+            reader.expect(",")
+        reader.expect("}")
+
+
+def scan_attack_bundle(file_path: Path) -> Tuple[str, list]:
+    """
+    Single streaming pass over an ATT&CK bundle
+    - Returns (ATT&CK version, technique IDs)
+    - The version is that of the first object (the x-mitre-collection)
+    """
+    version = None
+    technique_ids = []
+    for ind, obj in enumerate(iter_bundle_objects(file_path)):
+        if ind == 0:
+            version = obj["x_mitre_version"]
+        if obj["type"] == "attack-pattern":
+            technique_ids.append(obj["external_references"][0]["external_id"])
+    if version is None:
+        raise ValueError(f"{file_path} has no objects")
+    return version, technique_ids
@@ -1,63 +1,61 @@
 # ATT&CK Updater
 # Updates the ATT&CK JSON (STIX format) files used by Playbook-NG
-import json
-from functools import partial
-from shutil import copyfile
 from pathlib import Path
+from typing import Dict
+from dataset_updater.attack_delta import write_domain_delta
+from dataset_updater.attack_index import INDEX_CACHE_PATH, TechniqueInfo, load_domain_index, merge_indexes
+from dataset_updater.attack_store import STORE_PATH, AttackStore, get_store_path, list_published, store_published
+from dataset_updater.files import copy_file
+from dataset_updater.slim_bundle import write_slim_bundle
+from dataset_updater.stix import scan_attack_bundle
 
-# Partial open func for utf-8
-open_utf8 = partial(open, encoding="utf-8")
+# ATT&CK domain -> bundle path within the attack-stix-data repo
+DOMAIN_FILES = {
+    "enterprise": "enterprise-attack/enterprise-attack.json",
+    "mobile": "mobile-attack/mobile-attack.json",
+    "ics": "ics-attack/ics-attack.json",
+}
+
+
+def get_changed_domains(changed_paths: list | None) -> set:
+    """Determine which ATT&CK domain bundles changed (all of them if the changes are unknown)"""
+    if changed_paths is None:
+        return set(DOMAIN_FILES)
+    changed = set(changed_paths)
+    return {domain for domain, file in DOMAIN_FILES.items() if file in changed}
 
 
 def get_technique_ids(file_path: Path) -> list:
     """Get the technique IDs for a particular domain."""
-    # Read the file as a text blob
-    attack_json = ""
-    with open_utf8(file_path, "r") as attack_file:
-        attack_json = json.load(attack_file)
-    # Find all of the unique Technique IDs in the file
-    attack_objects = attack_json["objects"]
-    technique_ids = [item["external_references"][0]["external_id"]
-                     for item in attack_objects
-                     if item["type"] == "attack-pattern"]
-    return technique_ids
+    return scan_attack_bundle(file_path)[1]
 
 
 def get_attack_version(file_path: Path) -> str:
     """Get the version of a particular ATT&CK JSON file"""
-    attack_json = ""
-    with open_utf8(file_path, "r") as attack_file:
-        attack_json = json.load(attack_file)
-    return attack_json["objects"][0]["x_mitre_version"]
+    return scan_attack_bundle(file_path)[0]
 
 
-def get_domains_to_load(mitigated_techniques: set, enterprise_file_path: Path, mobile_file_path: Path, ics_file_path: Path) -> dict:
+def get_domains_to_load(mitigated_techniques: set, technique_index: Dict[str, TechniqueInfo]) -> dict:
     """Determine which ATT&CK domains should be loaded based on the mitigated techniques and templates techniques."""
     domains_to_load = {"enterprise": False, "mobile": False, "ics": False}
-    # Get the technique IDs for each domain
-    enterprise_ids = get_technique_ids(enterprise_file_path)
-    mobile_ids = get_technique_ids(mobile_file_path)
-    ics_ids = get_technique_ids(ics_file_path)
-    # Iterate over the ATT&CK IDs extracted from the countermeasures to determine
+    # Look up the ATT&CK IDs extracted from the countermeasures to determine
     # which domain they belong to
     for tech_id in mitigated_techniques:
-        if tech_id in enterprise_ids:
-            if not domains_to_load["enterprise"]:
-                domains_to_load["enterprise"] = True
-        elif tech_id in mobile_ids:
-            if not domains_to_load["mobile"]:
-                domains_to_load["mobile"] = True
-        elif tech_id in ics_ids:
-            if not domains_to_load["ics"]:
-                domains_to_load["ics"] = True
+        info = technique_index.get(tech_id)
+        if info is not None:
+            domains_to_load[info.domain] = True
         else:
             print(
                 f"  *** WARNING: Unable to determine ATT&CK domain for {tech_id}.")
     return domains_to_load
 
 
-def update_attack_domain(attack_updated: bool, domain: str, git_version: str, git_file_path: Path, index_json: dict, attack_data_path: Path) -> None:
-    """Attempt to update a specific ATT&CK domain JSON file with a new version from GitHub"""
+def update_attack_domain(domain: str, git_version: str, git_file_path: Path, index_json: dict, attack_data_path: Path, slim: bool = False, store: bool = False, index_cache_path: Path = INDEX_CACHE_PATH, store_path: Path = STORE_PATH) -> bool:
+    """Attempt to update a specific ATT&CK domain JSON file with a new version from GitHub.
+    If slim, only the parts of the bundle the app uses are written.
+    If store, versions are kept in the domain's object store under store_path (see attack_store),
+    and the new one is published from it; published versions are never removed here.
+    Returns whether a new version was added."""
     index_key = "attack_" + domain
     # Compare the version already in the app to the git version we downloaded
     # If we don't have it, add it (it should always be a newer version)
@@ -66,43 +64,73 @@ def update_attack_domain(attack_updated: bool, domain: str, git_version: str, gi
         git_version_filename = git_version + ".json"
         # Copy the new version over to the app
         new_file_path = attack_data_path / domain / git_version_filename
-        copyfile(git_file_path, new_file_path)
-        # Set the Boolean to state that we updated ATT&CK
-        attack_updated = True
+        if store:
+            # Only the object revisions that changed since the stored versions are added
+            attack_store = AttackStore(get_store_path(store_path, domain))
+            store_published(attack_store, domain, attack_data_path / domain)
+            _, added = attack_store.add_bundle(git_file_path)
+            print(
+                f"     [+] Stored ATT&CK {domain} v{git_version}: {added} new object revisions.")
+            attack_store.materialize(git_version, new_file_path, slim)
+            published = len(list_published(attack_data_path / domain))
+            if published > 1:
+                print(
+                    f"     [i] {published} ATT&CK {domain} versions are published on top of the store; unpublish older ones with python3 -m dataset_updater.attack_store prune KEEP.")
+        elif slim:
+            write_slim_bundle(git_file_path, new_file_path)
+        else:
+            copy_file(git_file_path, new_file_path)
+        # What changed since the previous version the app has
+        write_domain_delta(domain, git_version, git_file_path,
+                           index_json[index_key], attack_data_path, index_cache_path)
+        return True
     else:
         print(
             f"     [-] ATT&CK {domain} v{git_version} already exists locally, nothing to update.")
+        return False
 
 
-def update_attack(index_json: dict, mitigated_techniques: set, attack_repo_path: Path, attack_data_path: Path) -> bool:
-    """Update the ATT&CK data. Copy over any new versions that align with the COUN7ER mappings."""
+def update_attack(index_json: dict, mitigated_techniques: set, attack_repo_path: Path, attack_data_path: Path, domains: set | None = None, slim: bool = False, resident: dict | None = None, store: bool = False, index_cache_path: Path = INDEX_CACHE_PATH, store_path: Path = STORE_PATH) -> bool:
+    """Update the ATT&CK data. Copy over any new versions that align with the COUN7ER mappings.
+    Only the given domains (default: all) are considered for an update.
+    If slim, new versions are written as slim bundles.
+    If store, new versions go through the object store (see update_attack_domain).
+    If given, resident keeps the technique indexes loaded between calls (see load_domain_index).
+    Technique indexes are cached under index_cache_path (outside the served app data)."""
     print("\nUpdating ATT&CK data using latest GitHub data.")
+    if domains is None:
+        domains = set(DOMAIN_FILES)
     # ATT&CK File Paths
-    ENTERPRISE_FILE_PATH = attack_repo_path / \
-        "enterprise-attack/enterprise-attack.json"
-    MOBILE_FILE_PATH = attack_repo_path / "mobile-attack/mobile-attack.json"
-    ICS_FILE_PATH = attack_repo_path / "ics-attack/ics-attack.json"
+    ENTERPRISE_FILE_PATH = attack_repo_path / DOMAIN_FILES["enterprise"]
+    MOBILE_FILE_PATH = attack_repo_path / DOMAIN_FILES["mobile"]
+    ICS_FILE_PATH = attack_repo_path / DOMAIN_FILES["ics"]
     # Boolean indicating whether ATT&CK was updated
     attack_updated = False
-    # Get the versions of the domains that were downloaded
-    enterprise_version = get_attack_version(ENTERPRISE_FILE_PATH)
-    mobile_version = get_attack_version(MOBILE_FILE_PATH)
-    ics_version = get_attack_version(ICS_FILE_PATH)
+    # Get the versions and technique indexes of the domains that were downloaded
+    # (bundles are only scanned the first time their version is seen)
+    enterprise_version, enterprise_index = load_domain_index(
+        "enterprise", ENTERPRISE_FILE_PATH, index_cache_path, resident)
+    mobile_version, mobile_index = load_domain_index(
+        "mobile", MOBILE_FILE_PATH, index_cache_path, resident)
+    ics_version, ics_index = load_domain_index(
+        "ics", ICS_FILE_PATH, index_cache_path, resident)
+    technique_index = merge_indexes(
+        [enterprise_index, mobile_index, ics_index])
     # Determine which ATT&CK domains we need to load based on the mitigated techniques
     domains_to_load = get_domains_to_load(
-        mitigated_techniques, ENTERPRISE_FILE_PATH, MOBILE_FILE_PATH, ICS_FILE_PATH)
+        mitigated_techniques, technique_index)
     print("Discovered ATT&CK domains: ")
     # Update the ATT&CK domains based on those discovered
-    if domains_to_load["enterprise"]:
+    if domains_to_load["enterprise"] and "enterprise" in domains:
         print("  [+] Enterprise")
-        update_attack_domain(attack_updated, "enterprise", enterprise_version,
-                             ENTERPRISE_FILE_PATH, index_json, attack_data_path)
-    if domains_to_load["mobile"]:
+        attack_updated |= update_attack_domain("enterprise", enterprise_version,
+                                               ENTERPRISE_FILE_PATH, index_json, attack_data_path, slim, store, index_cache_path, store_path)
+    if domains_to_load["mobile"] and "mobile" in domains:
         print("  [+] Mobile")
-        update_attack_domain(attack_updated, "mobile", mobile_version,
-                             MOBILE_FILE_PATH, index_json, attack_data_path)
-    if domains_to_load["ics"]:
+        attack_updated |= update_attack_domain("mobile", mobile_version,
+                                               MOBILE_FILE_PATH, index_json, attack_data_path, slim, store, index_cache_path, store_path)
+    if domains_to_load["ics"] and "ics" in domains:
         print("  [+] ICS")
-        update_attack_domain(attack_updated, "ics", ics_version,
-                             ICS_FILE_PATH, index_json, attack_data_path)
+        attack_updated |= update_attack_domain("ics", ics_version,
+                                               ICS_FILE_PATH, index_json, attack_data_path, slim, store, index_cache_path, store_path)
     return attack_updated
@@ -1,68 +1,292 @@
+import hashlib
 import json
+import shlex
 import subprocess
+import tarfile
 from pathlib import Path, PurePath
+from typing import List
+from dataset_updater.artifacts import build_artifacts, is_variant
+from dataset_updater.attack_delta import list_domain_deltas
+from dataset_updater.attack_store import STORE_PATH, list_stored_only
+from dataset_updater.dataset_index import INDEX_SUFFIX
 from dataset_updater.dataset_types import *
+from dataset_updater.files import file_sha256, write_text
 from datetime import datetime
 from dataset_updater.item_parsing import MDFile
+from dataset_updater.markdown_backends import DEFAULT_BACKEND
+from dataset_updater.search_index import SEARCH_SUFFIX
 from glob import glob
 from os import path
+from shutil import rmtree
+
+# Repo fetch modes
+FETCH_MODES = ["full", "shallow"]
+
+# index.json key -> suffix of the dataset sidecar files it lists
+DATASET_SIDECARS = {
+    "dataset_indexes": INDEX_SUFFIX,
+    "dataset_search": SEARCH_SUFFIX,
+}
 
 # Git commands
 CLONE_COMMAND = "git clone {0} {1}"
 PULL_COMMAND = "git -C {0} pull"
+SHALLOW_CLONE_COMMAND = "git clone --depth 1 --filter=blob:none --sparse {0} {1}"
+SHALLOW_FETCH_COMMAND = "git -C {0} fetch --depth 1 origin HEAD"
+RESET_COMMAND = "git -C {0} reset --hard FETCH_HEAD"
+SPARSE_COMMAND = "git -C {0} sparse-checkout set --no-cone {1}"
+HEAD_COMMAND = "git -C {0} rev-parse HEAD"
+VERIFY_COMMAND = "git -C {0} cat-file -e {1}^{{commit}}"
+FETCH_COMMIT_COMMAND = "git -C {0} fetch --depth 1 origin {1}"
+DIFF_COMMAND = "git -C {0} diff --name-only {1} {2}"
+
+
+def dataset_version_key(version: str) -> tuple:
+    """Sort key of a dataset version: latest, then numeric parts by value (ex: 2024.9 < 2024.10), others by name"""
+    return (version != "latest", [(0, int(part), "") if part.isdigit() else (1, 0, part)
+                                  for part in version.split(".")])
 
 
-def update_index(attack_updated: bool, counter_updated: bool, index_path: Path, attack_data_path: Path):
+def list_dataset_versions(datasets_path: Path) -> dict:
+    """
+    The published datasets: {dataset ID: versions}, read from the datasets/<id>/<version>.json files
+    - Sidecars and generated variants aren't versions
+    - latest comes first, then the snapshots in version order
+    """
+    sidecar_suffixes = tuple(DATASET_SIDECARS.values())
+    datasets = {}
+    for dataset_dir in sorted(Path(datasets_path).glob("*/")):
+        versions = [PurePath(x).stem for x in glob(str(dataset_dir / "*.json"))
+                    if not is_variant(x) and not x.endswith(sidecar_suffixes)]
+        if versions:
+            datasets[dataset_dir.name] = sorted(
+                versions, key=dataset_version_key)
+    return datasets
+
+
+def update_index(attack_updated: bool, counter_updated: bool, index_path: Path, attack_data_path: Path, attack_store_path: Path = STORE_PATH):
     """Update the index.json file based on changes made"""
     print("Updating index.json.")
     if (attack_updated or counter_updated):
+        old_index = load_index(index_path) if path.isfile(index_path) else None
         index_dict = {"datasets": {}}
         index_dict["last_updated"] = datetime.now().isoformat()
         # Get the lists of files
-        # Datasets/Counter
-        index_dict["datasets"]["coun7er"] = ["latest"]
-        # ATT&CK
+        # Datasets (every published version of each)
+        index_dict["datasets"] = list_dataset_versions(index_path.parent / "datasets")
+        # ATT&CK (skipping generated variants)
         index_dict["attack_enterprise"] = [PurePath(x).stem for x in glob(
-            str(attack_data_path / "enterprise" / "*.json"))]
+            str(attack_data_path / "enterprise" / "*.json")) if not is_variant(x)]
         index_dict["attack_mobile"] = [PurePath(x).stem for x in glob(
-            str(attack_data_path / "mobile" / "*.json"))]
+            str(attack_data_path / "mobile" / "*.json")) if not is_variant(x)]
         index_dict["attack_ics"] = [PurePath(x).stem for x in glob(
-            str(attack_data_path / "ics" / "*.json"))]
+            str(attack_data_path / "ics" / "*.json")) if not is_variant(x)]
+        # ATT&CK version deltas (<from>_<to>)
+        index_dict["attack_deltas"] = {
+            domain: list_domain_deltas(attack_data_path, domain)
+            for domain in ["enterprise", "mobile", "ics"]
+        }
+        # ATT&CK versions only held by the object store (published again on request, see attack_store)
+        index_dict["attack_stored"] = {
+            domain: list_stored_only(attack_store_path, domain, index_dict["attack_" + domain])
+            for domain in ["enterprise", "mobile", "ics"]
+        }
+        # Dataset versions with sidecars: lookups (<version>.index.json), search (<version>.search.json)
+        data_dir = index_path.parent
+        for key, suffix in DATASET_SIDECARS.items():
+            index_dict[key] = {
+                dataset_id: [version for version in versions if (
+                    data_dir / f"datasets/{dataset_id}/{version}{suffix}").is_file()]
+                for dataset_id, versions in index_dict["datasets"].items()
+            }
+        # Minified/precompressed variants + hashes of every listed file
+        artifact_paths = [
+            f"datasets/{dataset_id}/{version}.json"
+            for dataset_id, versions in index_dict["datasets"].items()
+            for version in versions
+        ] + [
+            f"datasets/{dataset_id}/{version}{suffix}"
+            for key, suffix in DATASET_SIDECARS.items()
+            for dataset_id, versions in index_dict[key].items()
+            for version in versions
+        ] + [
+            f"attack/{domain}/{version}.json"
+            for domain in ["enterprise", "mobile", "ics"]
+            for version in index_dict["attack_" + domain]
+        ]
+        # (variants are reused when their source's sha256 is the one the last index.json recorded)
+        index_dict["artifacts"] = build_artifacts(
+            data_dir, artifact_paths, old_index.get("artifacts") if old_index else None)
+        # Keep the file (and its last_updated) as-is if nothing else changed
+        if old_index is not None:
+            old_index.pop("last_updated", None)
+            if old_index == {k: v for k, v in index_dict.items() if k != "last_updated"}:
+                print("  [-] Index.json content is unchanged, not rewritten.")
+                return
         # Write the updated file
-        with open(index_path, "w", encoding="utf-8") as index_file:
-            json.dump(index_dict, index_file, indent=4)
+        write_text(index_path, json.dumps(index_dict, indent=4))
         print(f"  [+] Wrote to {index_path}")
     else:
         print("  [-] No ATT&CK or COUN7ER updates found. Index.json was not changed.")
 
 
-def load_attack_github(attack_url: str, attack_repo_path: Path) -> str:
-    """Fetch the ATT&CK files from GitHub"""
-    stdout = ""
-    if not path.isdir(attack_repo_path):
-        print("\nCloning ATT&CK repo.")
-        stdout = subprocess.check_output(CLONE_COMMAND.format(
-            attack_url, attack_repo_path), shell=True, encoding="utf-8")
+def fetch_repo(name: str, repo_url: str, repo_path: Path, fetch_mode: str = "full", sparse_paths: List[str] | None = None) -> str:
+    """
+    Clone/update a GitHub repo, returns the new HEAD SHA
+    - full: full clone, then git pull
+    - shallow: depth 1 clone without blobs, with a sparse checkout of only sparse_paths
+      (non-cone patterns), then depth 1 fetches of the latest commit
+    """
+    if fetch_mode not in FETCH_MODES:
+        raise ValueError(f"unknown fetch mode {fetch_mode}")
+    shallow = fetch_mode == "shallow"
+    if not path.isdir(repo_path):
+        print(f"\nCloning {name} repo.")
+        command = SHALLOW_CLONE_COMMAND if shallow else CLONE_COMMAND
+        subprocess.check_output(command.format(
+            repo_url, repo_path), shell=True, encoding="utf-8")
     else:
-        print("\nUpdating ATT&CK repo.")
-        stdout = subprocess.check_output(PULL_COMMAND.format(
-            attack_repo_path), shell=True, encoding="utf-8")
-    return stdout
-
-
-def load_counter_github(counter_url: str, counter_repo_path: Path) -> str:
-    """Fetch the COUN7ER files from GitHub"""
-    stdout = ""
-    # Check to see if the local copies of the COUN7ER repo exist
-    if not path.isdir(counter_repo_path):
-        print("\nCloning COUN7ER repo.")
-        stdout = subprocess.check_output(CLONE_COMMAND.format(
-            counter_url, counter_repo_path), shell=True, encoding="utf-8")
-    else:
-        print("\nUpdating COUN7ER repo.")
-        stdout = subprocess.check_output(PULL_COMMAND.format(
-            counter_repo_path), shell=True, encoding="utf-8")
-    return stdout
+        print(f"\nUpdating {name} repo.")
+        if shallow:
+            subprocess.check_output(SHALLOW_FETCH_COMMAND.format(
+                repo_path), shell=True, encoding="utf-8")
+            subprocess.check_output(RESET_COMMAND.format(
+                repo_path), shell=True, encoding="utf-8")
+        else:
+            subprocess.check_output(PULL_COMMAND.format(
+                repo_path), shell=True, encoding="utf-8")
+    if shallow and sparse_paths:
+        subprocess.check_output(SPARSE_COMMAND.format(
+            repo_path, " ".join(shlex.quote(p) for p in sparse_paths)), shell=True, encoding="utf-8")
+    return get_head_sha(repo_path)
+
+
+def load_attack_github(attack_url: str, attack_repo_path: Path, fetch_mode: str = "full", sparse_paths: List[str] | None = None) -> str:
+    """Fetch the ATT&CK files from GitHub, returns the new HEAD SHA"""
+    return fetch_repo("ATT&CK", attack_url, attack_repo_path, fetch_mode, sparse_paths)
+
+
+def load_counter_github(counter_url: str, counter_repo_path: Path, fetch_mode: str = "full", sparse_paths: List[str] | None = None) -> str:
+    """Fetch the COUN7ER files from GitHub, returns the new HEAD SHA"""
+    return fetch_repo("COUN7ER", counter_url, counter_repo_path, fetch_mode, sparse_paths)
+
+
+def load_offline_source(name: str, source_path: Path, extract_path: Path) -> Path:
+    """
+    Use a local copy of a repo instead of fetching it, returns the directory to read from
+    - A directory (ex: a mirror clone) is read in place
+    - A tarball (.tar, .tar.gz, ..) is extracted to extract_path; if it holds a single
+      top-level directory, that directory is used
+    """
+    source_path = Path(source_path)
+    if source_path.is_dir():
+        print(f"\nUsing local {name} directory {source_path}.")
+        return source_path
+    if not tarfile.is_tarfile(source_path):
+        raise ValueError(
+            f"{name} source {source_path} is not a directory or tarball")
+    print(f"\nExtracting local {name} tarball {source_path}.")
+    if path.isdir(extract_path):
+        rmtree(extract_path)
+    extract_path.mkdir(parents=True)
+    with tarfile.open(source_path) as tar:
+        # extraction filters are only in newer Pythons (3.11.4+)
+        if hasattr(tarfile, "data_filter"):
+            tar.extractall(extract_path, filter="data")
+        else:
+            tar.extractall(extract_path)
+    entries = list(extract_path.iterdir())
+    if len(entries) == 1 and entries[0].is_dir():
+        return entries[0]
+    return extract_path
+
+
+def get_source_id(repo_path: Path, file_globs: List[str]) -> str:
+    """
+    Identify the state of a repo copy, for change detection
+    - Git repo: its HEAD SHA
+    - Plain directory (offline source): a digest of the files matching file_globs
+    """
+    if (Path(repo_path) / ".git").exists():
+        return get_head_sha(repo_path)
+    digest = hashlib.sha256()
+    file_paths = sorted({
+        file_path
+        for file_glob in file_globs
+        for file_path in glob(str(Path(repo_path) / file_glob), recursive=True)
+    })
+    for file_path in file_paths:
+        digest.update(Path(file_path).relative_to(repo_path).as_posix().encode())
+        digest.update(file_sha256(file_path).encode())
+    return "snapshot:" + digest.hexdigest()
+
+
+def get_head_sha(repo_path: Path) -> str:
+    """Get the commit SHA checked out in a local repo"""
+    return subprocess.check_output(HEAD_COMMAND.format(
+        repo_path), shell=True, encoding="utf-8").strip()
+
+
+def _has_commit(repo_path: Path, sha: str) -> bool:
+    try:
+        subprocess.check_output(VERIFY_COMMAND.format(
+            repo_path, shlex.quote(sha)), shell=True, stderr=subprocess.DEVNULL)
+        return True
+    except subprocess.CalledProcessError:
+        return False
+
+
+def get_changed_paths(repo_path: Path, old_sha: str | None, new_sha: str) -> List[str] | None:
+    """
+    Get the repo-relative paths changed between two commits
+    - In a shallow clone the old commit isn't kept, so it's fetched (depth 1) to diff against
+    - Returns None when the change set is unknown (no previous SHA, it's no longer in the repo,
+      or the repo is an offline snapshot)
+    """
+    if old_sha is None:
+        return None
+    if old_sha == new_sha:
+        return []
+    if not (Path(repo_path) / ".git").exists():
+        return None
+    if not _has_commit(repo_path, old_sha):
+        if (Path(repo_path) / ".git/shallow").exists():
+            try:
+                subprocess.check_output(FETCH_COMMIT_COMMAND.format(
+                    repo_path, shlex.quote(old_sha)), shell=True, stderr=subprocess.DEVNULL)
+            except subprocess.CalledProcessError:
+                pass
+        if not _has_commit(repo_path, old_sha):
+            print(f"  [i] Previous commit {old_sha[:12]} is not available in {repo_path}, incremental change detection is off for this run (everything is treated as changed).")
+            return None
+    stdout = subprocess.check_output(DIFF_COMMAND.format(
+        repo_path, old_sha, new_sha), shell=True, encoding="utf-8")
+    return [line for line in stdout.splitlines() if line]
+
+
+def load_state(state_path: Path) -> dict:
+    """
+    Get the updater state: the HEAD SHAs of each repo's last processed run
+    - {repo: {"previous": sha | None, "current": sha}}
+    - Missing state (first run) is an empty dict
+    """
+    if not path.isfile(state_path):
+        return {}
+    with open(state_path, "r", encoding="utf-8") as state_file:
+        return json.load(state_file)
+
+
+def update_state(state: dict, repo: str, new_sha: str) -> None:
+    """Record a repo's new HEAD SHA as processed, keeping the one it replaced (unchanged if it's the same)"""
+    current = state.get(repo, {}).get("current")
+    if current == new_sha:
+        return
+    state[repo] = {"previous": current, "current": new_sha}
+
+
+def save_state(state: dict, state_path: Path) -> None:
+    """Write the updater state file"""
+    write_text(state_path, json.dumps(state, indent=4))
 
 
 def load_index(index_path: Path) -> dict:
@@ -77,9 +301,9 @@ def format_timestamp(text: str) -> str:
     return datetime.strptime(text, "%d %B %Y").isoformat(timespec="milliseconds") + "Z"
 
 
-def load_item(path: Path) -> Item | None:
+def load_item(path: Path, backend: str = DEFAULT_BACKEND) -> Item | None:
     try:
-        md = MDFile(path)
+        md = MDFile(path, backend)
         created_ts = format_timestamp(md.created)
         modified_ts = format_timestamp(md.modified)
         sc = md.section_content
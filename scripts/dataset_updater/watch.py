@@ -0,0 +1,227 @@
+# Watch Mode
+# Rebuilds the COUN7ER dataset whenever a countermeasure/template file in a local checkout changes
+# - Only the changed files are re-parsed; the rest of the dataset stays in memory
+# - Changes are seen through inotify (Linux), or by polling file timestamps elsewhere
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from pathlib import Path
+from typing import Collection, Dict, List, Set, Tuple
+from dataset_updater.cache import ParseCache
+from dataset_updater.load import LiveDataset, is_dataset_file, list_dataset_files, save_cache
+from dataset_updater.markdown_backends import DEFAULT_BACKEND
+from dataset_updater.util import update_index
+from dataset_updater.writer import write_dataset_and_sidecars
+
+# Seconds between scans of the polling watcher
+POLL_INTERVAL = 0.5
+# Seconds to wait for more events after one arrives, so a burst of writes (ex: a git
+# checkout, an editor's save) is handled as one change
+DEBOUNCE = 0.05
+# Seconds without changes before index.json (and the precompressed variants) are refreshed;
+# compressing is slow, so it isn't done on every save
+INDEX_DELAY = 2.0
+
+# inotify constants (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class PollingWatcher:
+    """Finds changed dataset files by comparing their timestamps/sizes every POLL_INTERVAL"""
+
+    def __init__(self, root: Path, interval: float = POLL_INTERVAL) -> None:
+        self.root = Path(root)
+        self.interval = interval
+        self.snapshot = self._scan()
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        for path in list_dataset_files(self.root):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def wait(self, timeout: float | None = None) -> Set[str] | None:
+        """Block until dataset files change (or timeout), returns their paths"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            time.sleep(self.interval if deadline is None else max(
+                0.0, min(self.interval, deadline - time.monotonic())))
+            snapshot = self._scan()
+            changed = {path for path in snapshot.keys() | self.snapshot.keys()
+                       if snapshot.get(path) != self.snapshot.get(path)}
+            self.snapshot = snapshot
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher:
+    """
+    Finds changed dataset files through inotify (Linux only, raises OSError elsewhere)
+    - Every directory of the checkout is watched (except hidden ones, ex: .git); new ones are added
+    - A directory moved away or deleted reports no events for its files: the tracked paths under it
+      (ex: LiveDataset.files) are reported instead, and it's no longer watched
+    - wait() returns None when the kernel's event queue overflowed (everything must be rescanned)
+    """
+
+    def __init__(self, root: Path, tracked: Collection[str] = ()) -> None:
+        if not hasattr(ctypes, "CDLL") or os.name != "posix":
+            raise OSError("inotify is not available")
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self.libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.dirs: Dict[int, str] = {}
+        self.tracked = tracked
+        self._watch_tree(str(root))
+
+    def _watch_tree(self, dir_path: str) -> None:
+        for current, sub_dirs, _ in os.walk(dir_path):
+            sub_dirs[:] = [name for name in sub_dirs if not name.startswith(".")]
+            wd = self.libc.inotify_add_watch(
+                self.fd, os.fsencode(current), WATCH_MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(),
+                              f"cannot watch {current}")
+            self.dirs[wd] = current
+
+    def _unwatch_tree(self, dir_path: str) -> None:
+        prefix = dir_path + os.sep
+        for wd, path in list(self.dirs.items()):
+            if path == dir_path or path.startswith(prefix):
+                # Fails for a deleted directory, whose watch the kernel already removed
+                self.libc.inotify_rm_watch(self.fd, wd)
+                del self.dirs[wd]
+
+    def _read_events(self, changed: Set[str]) -> bool:
+        """Add the dataset files named by pending events to changed, returns False on overflow"""
+        try:
+            data = os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return True
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, name_len = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + name_len].rstrip(b"\0"))
+            offset += name_len
+            if mask & IN_Q_OVERFLOW:
+                return False
+            dir_path = self.dirs.get(wd)
+            if dir_path is None or not name:
+                continue
+            path = os.path.join(dir_path, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and not name.startswith("."):
+                    self._watch_tree(path)
+                    # files may have been written before the watch was added
+                    changed.update(list_dataset_files(Path(path)))
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._unwatch_tree(path)
+                    prefix = path + os.sep
+                    changed.update(
+                        tracked for tracked in self.tracked if tracked.startswith(prefix))
+            elif is_dataset_file(name):
+                changed.add(path)
+        return True
+
+    def wait(self, timeout: float | None = None) -> Set[str] | None:
+        """Block until dataset files change (or timeout), returns their paths"""
+        changed: Set[str] = set()
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        while ready:
+            if not self._read_events(changed):
+                return None
+            ready, _, _ = select.select([self.fd], [], [], DEBOUNCE)
+        return changed
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def make_watcher(root: Path, polling: bool = False, tracked: Collection[str] = ()):
+    """
+    inotify watcher when available (and polling isn't forced), else a polling one
+    - tracked: the paths being kept up to date (see InotifyWatcher)
+    """
+    if not polling:
+        try:
+            return InotifyWatcher(root, tracked)
+        except OSError as ex:
+            print(f"  [i] inotify unavailable ({ex}), polling for changes.")
+    return PollingWatcher(root)
+
+
+def watch_counter(counter_path: Path, dataset_path: Path, index_path: Path, attack_data_path: Path, baseline_ids: List[str], polling: bool = False, jobs: int = 1, parse_cache: ParseCache | None = None, backend: str = DEFAULT_BACKEND) -> None:
+    """
+    Build the dataset from a local COUN7ER checkout, then rebuild it on every change until interrupted
+    - With jobs > 1, many changed countermeasures (ex: the first build, a branch switch) are parsed
+      in a process pool
+    - With a parse cache, files it holds aren't re-parsed; it's saved after the first build and
+      when watching stops
+    - Watching starts before the first build, so files saved while it runs are rebuilt right after
+    - backend: the markdown backend reading the countermeasures (see markdown_backends)
+    """
+    counter_path = Path(counter_path)
+    if not counter_path.is_dir():
+        raise ValueError(f"cannot watch {counter_path}, it is not a directory")
+    print(f"\nLoading the COUN7ER dataset from {counter_path}.")
+    live = LiveDataset(counter_path, backend)
+    watcher = make_watcher(counter_path, polling, live.files)
+    index_stale = False
+    try:
+        live.refresh(None, jobs, parse_cache)
+        if parse_cache is not None:
+            save_cache(parse_cache)
+        index_stale = write_dataset_and_sidecars(live.build(baseline_ids), dataset_path)
+        print(
+            f"\nWatching {counter_path} for countermeasure/template changes (Ctrl+C to stop).")
+        while True:
+            paths = watcher.wait(INDEX_DELAY if index_stale else None)
+            if paths == set():
+                # Idle: catch index.json up with the rewritten files
+                if index_stale:
+                    update_index(False, True, index_path, attack_data_path)
+                    index_stale = False
+                continue
+            start = time.perf_counter()
+            changed = live.refresh(paths, jobs, parse_cache)
+            if not changed:
+                continue
+            names = ", ".join(Path(path).name for path in changed[:5])
+            more = f" (+{len(changed) - 5} more)" if len(changed) > 5 else ""
+            print(f"\n  [i] Changed: {names}{more}")
+            index_stale |= write_dataset_and_sidecars(
+                live.build(baseline_ids), dataset_path)
+            print(
+                f"  [i] Rebuilt in {(time.perf_counter() - start) * 1000:.0f} ms.")
+    except KeyboardInterrupt:
+        print("\nStopping watch mode.")
+    finally:
+        watcher.close()
+        if parse_cache is not None:
+            save_cache(parse_cache)
+        if index_stale:
+            update_index(False, True, index_path, attack_data_path)
@@ -0,0 +1,72 @@
+# Dataset Writer
+# Streams a dataset to its JSON file one item at a time, instead of building the whole document first
+import json
+from dataclasses import fields
+from pathlib import Path
+from typing import IO, Iterable
+from dataset_updater.dataset_index import DatasetIndex, write_dataset_index
+from dataset_updater.dataset_types import *
+from dataset_updater.files import AtomicFile
+from dataset_updater.search_index import SearchIndexBuilder, write_search_index
+
+# Nesting of the item/template objects in the dataset document
+ITEM_INDENT = " " * 8
+
+
+def _dump_nested(value, indent: str) -> str:
+    """json.dumps(indent=4) of a value nested at the given indent (JSON strings never hold raw newlines)"""
+    return json.dumps(value, indent=4).replace("\n", "\n" + indent)
+
+
+def dump_dataset(dataset: Dataset, file: IO[str], items: Iterable[Item] | None = None) -> None:
+    """
+    Write a dataset exactly as json.dumps(dataset.to_json(), indent=4) would
+    - items (default: dataset.items) is consumed lazily, each item written as soon as it's yielded
+    """
+    if items is None:
+        items = dataset.items
+    file.write("{")
+    for ind, field in enumerate(fields(Dataset)):
+        file.write(("," if ind else "") + "\n    " + json.dumps(field.name) + ": ")
+        if field.name in ("items", "templates"):
+            records = items if field.name == "items" else dataset.templates
+            empty = True
+            for record in records:
+                file.write(("[" if empty else ",") + "\n" + ITEM_INDENT +
+                           _dump_nested(record.to_json(), ITEM_INDENT))
+                empty = False
+            file.write("[]" if empty else "\n    ]")
+        else:
+            file.write(_dump_nested(getattr(dataset, field.name), "    "))
+    file.write("\n}")
+
+
+def write_dataset_file(dataset: Dataset, dataset_path: Path, items: Iterable[Item] | None = None) -> bool:
+    """Atomically write a dataset file (see dump_dataset), returns whether its content changed"""
+    writer = AtomicFile(dataset_path, "w")
+    with writer as file:
+        dump_dataset(dataset, file, items)
+    return writer.changed
+
+
+def write_dataset(dataset: Dataset, dataset_path: Path, items: Iterable[Item] | None = None) -> bool:
+    """Write a dataset file (atomically), returns whether its content changed
+    If given, items are streamed to the file in place of dataset.items"""
+    if write_dataset_file(dataset, dataset_path, items):
+        print(f"  [+] Wrote to {dataset_path}")
+        return True
+    print(f"  [-] {dataset_path} content is unchanged, not rewritten.")
+    return False
+
+
+def write_dataset_and_sidecars(dataset: Dataset, dataset_path: Path) -> bool:
+    """Write an in-memory dataset and its index/search sidecars (atomically), returns whether any changed"""
+    dataset_index = DatasetIndex(dataset)
+    search_builder = SearchIndexBuilder(dataset)
+    for item in dataset.items:
+        dataset_index.add_item(item)
+        search_builder.add_item(item)
+    changed = write_dataset(dataset, dataset_path)
+    changed |= write_dataset_index(dataset_index, dataset_path)
+    changed |= write_search_index(search_builder, dataset_path)
+    return changed
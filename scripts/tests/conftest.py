@@ -0,0 +1,109 @@
+# Test Fixtures
+# Countermeasure files rebuilt from the checked-in COUN7ER dataset (for the parity tests), and records to build test datasets from
+import json
+import sys
+from pathlib import Path
+from typing import List
+import pytest
+
+# The scripts/ directory (where dataset_updater/ and benchmark/ are imported from)
+SCRIPTS_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(SCRIPTS_DIR))
+from dataset_updater.dataset_types import Item, ItemDeprecated, ItemRevoked, MappedTech
+
+# The checked-in COUN7ER dataset
+COUNTER_DATASET_PATH = SCRIPTS_DIR.parent / "shared/data/datasets/coun7er/latest.json"
+
+
+def technique_url(tech_id: str) -> str:
+    return "https://attack.mitre.org/techniques/" + tech_id.replace(".", "/") + "/"
+
+
+def item_markdown(item: dict) -> str:
+    """
+    The CM*.md file an item of latest.json was read from
+    - Its content holds every section but the associated techniques and related countermeasures,
+      which are rebuilt from its techniques and related_ids (in the COUN7ER layout)
+    """
+    content = item["content"].removeprefix("## Details\n\n")
+    pre, rest = content.split("\n\n## Intended Outcome\n\n", 1)
+    body, references = rest.split("\n\n## References\n\n", 1)
+    techniques = "\n".join(
+        f"- [{tech['tech_id']}]({technique_url(tech['tech_id'])})" for tech in item["techniques"])
+    related = "\n".join(f"- {item_id} | related" for item_id in item["related_ids"])
+    return (f"# {item['name']}\n\n{pre}\n\n## Intended Outcome\n\n{body}\n\n"
+            f"## Associated Techniques\n\n{techniques}\n\n"
+            f"## Related Countermeasures\n\n{related}\n\n"
+            f"## References\n\n{references}\n")
+
+
+@pytest.fixture(scope="session")
+def counter_corpus(tmp_path_factory) -> List[Path]:
+    """The countermeasures of the checked-in dataset, written as CM*.md files"""
+    with open(COUNTER_DATASET_PATH, "r", encoding="utf-8") as dataset_file:
+        items = json.load(dataset_file)["items"]
+    corpus_path = tmp_path_factory.mktemp("coun7er")
+    paths = []
+    for item in items:
+        path = corpus_path / f"{item['id']}.md"
+        path.write_text(item_markdown(item), encoding="utf-8")
+        paths.append(path)
+    return paths
+
+
+@pytest.fixture
+def counter_checkout(tmp_path, counter_corpus) -> Path:
+    """
+    A COUN7ER checkout of the corpus and the checked-in templates (TMPL*.json)
+    - Its path order isn't its ID order: the last countermeasure is in a subdirectory sorting first
+    """
+    root = tmp_path / "coun7er"
+    (root / "0-moved").mkdir(parents=True)
+    for path in counter_corpus[:-1]:
+        (root / path.name).write_bytes(path.read_bytes())
+    (root / "0-moved" / counter_corpus[-1].name).write_bytes(counter_corpus[-1].read_bytes())
+    with open(COUNTER_DATASET_PATH, "r", encoding="utf-8") as dataset_file:
+        templates = json.load(dataset_file)["templates"]
+    for template in templates:
+        (root / f"{template['id']}.json").write_text(json.dumps(template), encoding="utf-8")
+    return root
+
+
+def write_countermeasure(dir_path: Path, name: str, sections: dict) -> Path:
+    """
+    Write a minimal well-formed countermeasure
+    - sections overrides its default sections: heading -> body, or (heading written instead, body)
+    """
+    text = {
+        "# Title": "* **ID:** CM9999\n* **Version:** 1.0\n* **Created:** 1 January 2025\n"
+                   "* **Modified:** 1 January 2025\n* **Type:** Disable\n* **Status:** Active",
+        "## Intended Outcome": "Outcome.",
+        "## Introduction": "Introduction.",
+        "## Preparation": "Preparation.",
+        "## Risks": "Risks.",
+        "## Guidance": "Guidance.",
+        "## Associated Techniques": "- [T1003](https://attack.mitre.org/techniques/T1003/)",
+        "## Related Countermeasures": "- CM0001 | related",
+        "## References": "- Example | <https://example.com/>",
+    }
+    text.update(sections)
+    blocks = [value if isinstance(value, tuple) else (heading, value)
+              for heading, value in text.items()]
+    path = dir_path / f"{name}.md"
+    path.write_text("\n\n".join(f"{heading}\n\n{body}" for heading, body in blocks) + "\n",
+                    encoding="utf-8")
+    return path
+
+
+def make_item(item_id: str, name: str = "", content: str = "", techniques: List[str] = (), related_ids: List[str] = (), revoked_by: str | None = None, deprecated: bool = False) -> Item:
+    """A countermeasure record with only the given fields set (as load_item would build it)"""
+    return Item(
+        id=item_id, name=name, subtype=None, url=None, content=content, version="1.0",
+        created="2025-01-01T00:00:00.000Z", modified="2025-01-01T00:00:00.000Z",
+        contributors=[], technologies=[], platforms=[],
+        revoked=None if revoked_by is None else ItemRevoked(reason="Replaced", by_id=revoked_by),
+        deprecated=ItemDeprecated(reason="Obsolete") if deprecated else None,
+        ids_before_this=[], ids_after_this=[], is_baseline=False, related_ids=list(related_ids),
+        automatable="unspecified", references=[],
+        techniques=[MappedTech(tech_id=tech_id, content=None, details=None) for tech_id in techniques],
+    )
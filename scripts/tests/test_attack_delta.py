@@ -0,0 +1,113 @@
+# ATT&CK Version Deltas
+# build_delta over the technique indexes of two small bundles, and the delta files written from them
+import json
+from pathlib import Path
+from dataset_updater.attack_delta import build_delta, get_delta_path, get_previous_version, list_domain_deltas, version_key, write_domain_delta
+from dataset_updater.attack_index import build_domain_index
+
+
+def technique(tech_id: str, name: str, tactics: list, revoked: bool = False, deprecated: bool = False) -> dict:
+    obj = {
+        "type": "attack-pattern",
+        "id": "attack-pattern--" + tech_id.lower().replace(".", "-"),
+        "name": name,
+        "external_references": [{"source_name": "mitre-attack", "external_id": tech_id}],
+        "kill_chain_phases": [{"kill_chain_name": "mitre-attack", "phase_name": tactic} for tactic in tactics],
+    }
+    if revoked:
+        obj["revoked"] = True
+    if deprecated:
+        obj["x_mitre_deprecated"] = True
+    return obj
+
+
+def revoked_by(source_id: str, target_id: str) -> dict:
+    return {
+        "type": "relationship",
+        "id": f"relationship--{source_id}-{target_id}",
+        "relationship_type": "revoked-by",
+        "source_ref": "attack-pattern--" + source_id.lower().replace(".", "-"),
+        "target_ref": "attack-pattern--" + target_id.lower().replace(".", "-"),
+    }
+
+
+def write_bundle(path: Path, version: str, objects: list) -> Path:
+    collection = {"type": "x-mitre-collection", "id": "x-mitre-collection--test", "x_mitre_version": version}
+    path.write_text(json.dumps({"type": "bundle", "id": "bundle--test", "objects": [collection] + objects}),
+                    encoding="utf-8")
+    return path
+
+
+OLD_OBJECTS = [
+    technique("T1001", "Data Obfuscation", ["command-and-control"]),
+    technique("T1002", "Data Compressed", ["exfiltration"]),
+    technique("T1003", "Credential Dumping", ["credential-access"]),
+    technique("T1004", "Winlogon Helper DLL", ["persistence"]),
+    technique("T1005", "Data from Local System", ["collection"]),
+]
+NEW_OBJECTS = [
+    # Unchanged
+    technique("T1001", "Data Obfuscation", ["command-and-control"]),
+    # Revoked (by T1560), and T1560 added
+    technique("T1002", "Data Compressed", ["exfiltration"], revoked=True),
+    technique("T1560", "Archive Collected Data", ["collection"]),
+    revoked_by("T1002", "T1560"),
+    # Renamed, with a tactic added
+    technique("T1003", "OS Credential Dumping", ["credential-access", "discovery"]),
+    # Deprecated, with a tactic moved
+    technique("T1004", "Winlogon Helper DLL", ["privilege-escalation"], deprecated=True),
+    # T1005 removed; T1006 added
+    technique("T1006", "Direct Volume Access", ["defense-evasion"]),
+]
+
+
+def test_build_delta(tmp_path):
+    _, old = build_domain_index("enterprise", write_bundle(tmp_path / "old.json", "15.1", OLD_OBJECTS))
+    _, new = build_domain_index("enterprise", write_bundle(tmp_path / "new.json", "16.0", NEW_OBJECTS))
+    assert build_delta("enterprise", "15.1", old, "16.0", new) == {
+        "domain": "enterprise",
+        "from_version": "15.1",
+        "to_version": "16.0",
+        "added": [
+            {"id": "T1006", "name": "Direct Volume Access", "tactics": ["defense-evasion"]},
+            {"id": "T1560", "name": "Archive Collected Data", "tactics": ["collection"]},
+        ],
+        "removed": ["T1005"],
+        "renamed": {"T1003": {"from": "Credential Dumping", "to": "OS Credential Dumping"}},
+        "revoked": {"T1002": "T1560"},
+        "deprecated": ["T1004"],
+        "tactics": {
+            "T1003": {"added": ["discovery"], "removed": []},
+            "T1004": {"added": ["privilege-escalation"], "removed": ["persistence"]},
+        },
+    }
+
+
+def test_unchanged_versions_have_an_empty_delta(tmp_path):
+    _, old = build_domain_index("enterprise", write_bundle(tmp_path / "old.json", "15.1", OLD_OBJECTS))
+    delta = build_delta("enterprise", "15.1", old, "15.1", old)
+    assert all(not delta[key] for key in ["added", "removed", "renamed", "revoked", "deprecated", "tactics"])
+
+
+def test_get_previous_version():
+    assert get_previous_version(["9.0", "15.1", "16.0"], "16.1") == "16.0"
+    assert get_previous_version(["9.0", "15.1", "16.0"], "15.0") == "9.0"
+    assert get_previous_version(["16.0"], "16.0") is None
+    # Non-numeric versions compare with the others instead of failing
+    assert get_previous_version(["16.1", "16.1-beta", "v17"], "17.0") == "16.1-beta"
+    assert get_previous_version(["9.0", "16.1", "v17"], "v18") == "v17"
+    assert sorted(["v17", "16.1-beta", "16.1", "9.0"], key=version_key) == ["9.0", "16.1", "16.1-beta", "v17"]
+
+
+def test_write_domain_delta(tmp_path):
+    attack_data_path = tmp_path / "attack"
+    (attack_data_path / "enterprise").mkdir(parents=True)
+    write_bundle(attack_data_path / "enterprise/15.1.json", "15.1", OLD_OBJECTS)
+    new_path = write_bundle(tmp_path / "enterprise-attack.json", "16.0", NEW_OBJECTS)
+    cache_path = tmp_path / "cache"
+    # Nothing older listed: no delta
+    assert not write_domain_delta("enterprise", "16.0", new_path, [], attack_data_path, cache_path)
+    assert write_domain_delta("enterprise", "16.0", new_path, ["15.1"], attack_data_path, cache_path)
+    with open(get_delta_path(attack_data_path, "enterprise", "15.1", "16.0"), "r", encoding="utf-8") as delta_file:
+        assert json.load(delta_file)["revoked"] == {"T1002": "T1560"}
+    assert list_domain_deltas(attack_data_path, "enterprise") == ["15.1_16.0"]
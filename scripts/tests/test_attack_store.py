@@ -0,0 +1,124 @@
+# ATT&CK Object Store
+# Bundles stored and materialized again byte for byte, deduplication across versions, and pruning
+import json
+from pathlib import Path
+from dataset_updater.artifacts import VARIANT_SUFFIXES
+from dataset_updater.attack_store import AttackStore, get_store_path, list_published, list_stored_only, prune_published, store_published
+from dataset_updater.slim_bundle import write_slim_bundle
+from dataset_updater.util import load_index, update_index
+
+
+def technique(tech_id: str, name: str, modified: str = "2024-01-01T00:00:00.000Z") -> dict:
+    return {
+        "type": "attack-pattern",
+        "id": "attack-pattern--" + tech_id.lower().replace(".", "-"),
+        "created": "2020-01-01T00:00:00.000Z",
+        "modified": modified,
+        "name": name,
+        "description": f"{name}: a détailed description the slim bundle drops",
+        "external_references": [{"source_name": "mitre-attack", "external_id": tech_id}],
+        "kill_chain_phases": [{"kill_chain_name": "mitre-attack", "phase_name": "execution"}],
+    }
+
+
+def write_bundle(path: Path, version: str, objects: list) -> Path:
+    """A bundle as ATT&CK publishes it: minified, top-level properties first, objects last"""
+    collection = {"type": "x-mitre-collection", "id": "x-mitre-collection--test",
+                  "created": "2020-01-01T00:00:00.000Z", "x_mitre_version": version}
+    bundle = {"type": "bundle", "id": "bundle--test", "spec_version": "2.0",
+              "objects": [collection] + objects}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(json.dumps(bundle, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+    return path
+
+
+def publish_versions(domain_path: Path, versions: list) -> None:
+    """Publish each version with one technique renamed, plus the generated variants"""
+    for version in versions:
+        objects = [technique("T1001", "Stable"),
+                   technique("T1002", f"Renamed in {version}", modified=f"2024-01-{version.split('.')[0]:0>2}T00:00:00.000Z")]
+        write_bundle(domain_path / (version + ".json"), version, objects)
+        for suffix in VARIANT_SUFFIXES:
+            (domain_path / (version + suffix)).write_bytes(b"variant")
+
+
+def test_full_round_trip(tmp_path):
+    src = write_bundle(tmp_path / "src/15.1.json", "15.1",
+                       [technique("T1001", "First"), technique("T1002", "Second")])
+    store = AttackStore(tmp_path / "store")
+    assert store.add_bundle(src) == ("15.1", 3)
+    assert store.materialize("15.1", tmp_path / "out.json")
+    assert (tmp_path / "out.json").read_bytes() == src.read_bytes()
+    # Materializing again leaves the file as it is
+    assert not store.materialize("15.1", tmp_path / "out.json")
+
+
+def test_slim_round_trip(tmp_path):
+    src = write_bundle(tmp_path / "src/15.1.json", "15.1",
+                       [technique("T1001", "First"), technique("T1002", "Second")])
+    store = AttackStore(tmp_path / "store")
+    store.add_bundle(src)
+    write_slim_bundle(src, tmp_path / "slim.json")
+    store.materialize("15.1", tmp_path / "out.json", slim=True)
+    assert (tmp_path / "out.json").read_bytes() == (tmp_path / "slim.json").read_bytes()
+
+
+def test_unchanged_revisions_are_stored_once(tmp_path):
+    publish_versions(tmp_path / "src", ["14.1", "15.1"])
+    store = AttackStore(tmp_path / "store")
+    assert store.add_bundle(tmp_path / "src/14.1.json") == ("14.1", 3)
+    # T1001 is unchanged; the renamed technique and the collection (new x_mitre_version, same
+    # modified date) are new revisions
+    assert store.add_bundle(tmp_path / "src/15.1.json") == ("15.1", 2)
+    assert store.add_bundle(tmp_path / "src/15.1.json") == ("15.1", 0)
+    assert store.versions() == ["14.1", "15.1"]
+    assert store.stats()["revisions"] == 5
+    for version in ["14.1", "15.1"]:
+        out_path = tmp_path / f"out/{version}.json"
+        store.materialize(version, out_path)
+        assert out_path.read_bytes() == (tmp_path / f"src/{version}.json").read_bytes()
+
+
+def test_changed_content_without_new_modified_is_kept(tmp_path):
+    write_bundle(tmp_path / "src/14.1.json", "14.1", [technique("T1001", "Before")])
+    write_bundle(tmp_path / "src/15.1.json", "15.1", [technique("T1001", "After")])
+    store = AttackStore(tmp_path / "store")
+    store.add_bundle(tmp_path / "src/14.1.json")
+    # T1001 and the collection changed without a new modified date: both stored again
+    assert store.add_bundle(tmp_path / "src/15.1.json")[1] == 2
+    assert [obj["name"] for obj in store.iter_objects("14.1") if obj["type"] == "attack-pattern"] == ["Before"]
+    assert [obj["name"] for obj in store.iter_objects("15.1") if obj["type"] == "attack-pattern"] == ["After"]
+
+
+def test_prune_keeps_newest_versions(tmp_path):
+    attack_data_path = tmp_path / "attack"
+    store_path = tmp_path / "attack-store"
+    domain_path = attack_data_path / "enterprise"
+    publish_versions(domain_path, ["13.1", "14.1", "15.1"])
+    store = AttackStore(get_store_path(store_path, "enterprise"))
+    store_published(store, "enterprise", domain_path)
+
+    assert prune_published(store, "enterprise", domain_path, 2) == ["13.1"]
+    assert list_published(domain_path) == ["14.1", "15.1"]
+    assert not any((domain_path / ("13.1" + suffix)).exists() for suffix in [".json"] + VARIANT_SUFFIXES)
+    assert (domain_path / ("14.1" + VARIANT_SUFFIXES[0])).exists()
+    assert list_stored_only(store_path, "enterprise", list_published(domain_path)) == ["13.1"]
+
+    index_path = tmp_path / "index.json"
+    update_index(True, False, index_path, attack_data_path, store_path)
+    index = load_index(index_path)
+    assert sorted(index["attack_enterprise"]) == ["14.1", "15.1"]
+    assert index["attack_stored"] == {"enterprise": ["13.1"], "mobile": [], "ics": []}
+
+    # A pruned version can be published again from the store
+    store.materialize("13.1", domain_path / "13.1.json")
+    assert list_stored_only(store_path, "enterprise", list_published(domain_path)) == []
+
+
+def test_prune_skips_versions_not_stored(tmp_path):
+    domain_path = tmp_path / "attack/enterprise"
+    publish_versions(domain_path, ["13.1", "14.1"])
+    store = AttackStore(tmp_path / "attack-store/enterprise")
+    store.add_bundle(domain_path / "14.1.json")
+    assert prune_published(store, "enterprise", domain_path, 1) == []
+    assert list_published(domain_path) == ["13.1", "14.1"]
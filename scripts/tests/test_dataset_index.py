@@ -0,0 +1,92 @@
+# Dataset Index
+# The lookups of the <version>.index.json sidecar over a small known dataset
+import json
+from conftest import make_item
+from dataset_updater.dataset_index import INDEX_FORMAT, DatasetIndex, get_index_path, read_index_techniques, write_dataset_index
+from dataset_updater.load import new_dataset
+
+ITEMS = [
+    make_item("CM0001", techniques=["T1003", "T1003.001"]),
+    make_item("CM0002", techniques=["T1003.002", "T1059"], related_ids=["CM0001", "CM0003"]),
+    # Revoked by a revoked item: replaced by the end of the chain
+    make_item("CM0003", revoked_by="CM0004"),
+    make_item("CM0004", revoked_by="CM0001"),
+    # Revoked by a deprecated item: no replacement
+    make_item("CM0005", deprecated=True),
+    make_item("CM0006", revoked_by="CM0005"),
+    # Revocations looping back: no replacement
+    make_item("CM0007", revoked_by="CM0008"),
+    make_item("CM0008", revoked_by="CM0007"),
+    # Revoked by an unknown item: no replacement
+    make_item("CM0009", revoked_by="CM9999"),
+]
+
+
+def build_index() -> DatasetIndex:
+    dataset_index = DatasetIndex(new_dataset())
+    for item in ITEMS:
+        dataset_index.add_item(item)
+    return dataset_index
+
+
+def test_technique_lookups():
+    index_json = build_index().to_json()
+    assert index_json["technique_to_items"] == {
+        "T1003": ["CM0001"],
+        "T1003.001": ["CM0001"],
+        "T1003.002": ["CM0002"],
+        "T1059": ["CM0002"],
+    }
+    # Parents gather the items of their sub-techniques
+    assert index_json["technique_rollup"] == {
+        "T1003": ["CM0001", "CM0002"],
+        "T1059": ["CM0002"],
+    }
+    assert index_json["subtechnique_to_parent"] == {
+        "T1003.001": "T1003",
+        "T1003.002": "T1003",
+    }
+
+
+def test_related_items():
+    item_to_related = build_index().to_json()["item_to_related"]
+    assert item_to_related["CM0002"] == ["CM0001", "CM0003"]
+    assert item_to_related["CM0001"] == []
+
+
+def test_revoked_and_deprecated():
+    index_json = build_index().to_json()
+    assert index_json["revoked_by"] == {
+        "CM0003": "CM0004",
+        "CM0004": "CM0001",
+        "CM0006": "CM0005",
+        "CM0007": "CM0008",
+        "CM0008": "CM0007",
+        "CM0009": "CM9999",
+    }
+    assert index_json["deprecated"] == ["CM0005"]
+    assert index_json["replacement"] == {
+        "CM0003": "CM0001",
+        "CM0004": "CM0001",
+    }
+
+
+def test_sidecar_round_trip(tmp_path):
+    dataset_path = tmp_path / "latest.json"
+    assert write_dataset_index(build_index(), dataset_path)
+    assert not write_dataset_index(build_index(), dataset_path)
+    index_path = get_index_path(dataset_path)
+    assert index_path == tmp_path / "latest.index.json"
+    with open(index_path, "r", encoding="utf-8") as index_file:
+        stored = json.load(index_file)
+    assert stored["format"] == INDEX_FORMAT
+    assert (stored["dataset"], stored["version"]) == ("coun7er", "latest")
+    assert read_index_techniques(dataset_path) == {"T1003", "T1003.001", "T1003.002", "T1059"}
+
+
+def test_read_index_techniques_missing_or_stale(tmp_path):
+    dataset_path = tmp_path / "latest.json"
+    assert read_index_techniques(dataset_path) is None
+    get_index_path(dataset_path).write_text(
+        json.dumps({"format": "0.1", "technique_to_items": {}}), encoding="utf-8")
+    assert read_index_techniques(dataset_path) is None
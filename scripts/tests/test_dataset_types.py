@@ -0,0 +1,36 @@
+# Dataset Records
+# Each record's hand-written to_json holds every field, in field order, as dataclasses.asdict would give it
+from dataclasses import asdict, fields
+import pytest
+from conftest import make_item
+from dataset_updater import dataset_types
+from dataset_updater.dataset_types import *
+from dataset_updater.load import new_dataset
+
+ITEM = make_item("CM0001", "Name", "Content", techniques=["T1001"], related_ids=["CM0002"], revoked_by="CM0003",
+                 deprecated=True)
+ITEM.references = [Reference(source_name="Example", description="An example", url="https://example.com/")]
+ITEM.techniques[0].details = {"note": "details"}
+TEMPLATE = Template(id="TMPL0001", name="Template", featured=True, iconSrc=None,
+                    link=TemplateLink(url="https://example.com/", text="Example"), description="Description",
+                    tech_to_items={"T1001": {"confidence": "confirmed", "items": ["CM0001"]}}, ignored_items=["CM0002"])
+DATASET = new_dataset()
+DATASET.items = [ITEM]
+DATASET.templates = [TEMPLATE]
+
+# A record of every type, with its optional nested records set
+RECORDS = [ITEM.references[0], ITEM.techniques[0], ITEM.deprecated, ITEM.revoked, ITEM, TEMPLATE.link,
+           TEMPLATE, DATASET]
+
+
+@pytest.mark.parametrize("record", RECORDS, ids=lambda record: type(record).__name__)
+def test_to_json_holds_every_field(record):
+    as_json = record.to_json()
+    assert list(as_json) == [field.name for field in fields(record)]
+    assert as_json == asdict(record)
+
+
+def test_every_record_type_is_covered():
+    record_types = {value for value in vars(dataset_types).values()
+                    if isinstance(value, type) and hasattr(value, "__dataclass_fields__")}
+    assert record_types == {type(record) for record in RECORDS}
@@ -0,0 +1,73 @@
+# Atomic Output Files
+# AtomicFile replaces the target only when its content changes, and never leaves partial writes
+import os
+import pytest
+from dataset_updater.files import AtomicFile, copy_file, write_bytes, write_text
+
+
+def test_new_file_is_written(tmp_path):
+    path = tmp_path / "sub" / "out.json"
+    writer = AtomicFile(path, "w")
+    with writer as file:
+        file.write("{}")
+    assert writer.changed
+    assert path.read_text(encoding="utf-8") == "{}"
+    assert os.stat(path).st_mode & 0o777 == 0o644
+
+
+def test_unchanged_write_leaves_file_untouched(tmp_path):
+    path = tmp_path / "out.json"
+    path.write_text("same", encoding="utf-8")
+    # An old mtime, so a rewrite would be seen even on coarse-grained filesystems
+    os.utime(path, ns=(1_000_000_000, 1_000_000_000))
+    before = os.stat(path)
+    assert not write_text(path, "same")
+    after = os.stat(path)
+    assert (after.st_ino, after.st_mtime_ns) == (before.st_ino, before.st_mtime_ns)
+    assert os.listdir(tmp_path) == ["out.json"]
+
+
+def test_changed_write_replaces_file(tmp_path):
+    path = tmp_path / "out.bin"
+    path.write_bytes(b"old")
+    os.chmod(path, 0o640)
+    assert write_bytes(path, b"new")
+    assert path.read_bytes() == b"new"
+    # The target's mode is kept
+    assert os.stat(path).st_mode & 0o777 == 0o640
+    assert os.listdir(tmp_path) == ["out.bin"]
+
+
+def test_failed_write_keeps_original(tmp_path):
+    path = tmp_path / "out.json"
+    path.write_text("original", encoding="utf-8")
+    writer = AtomicFile(path, "w")
+    with pytest.raises(RuntimeError):
+        with writer as file:
+            file.write("partial")
+            raise RuntimeError("interrupted")
+    assert not writer.changed
+    assert path.read_text(encoding="utf-8") == "original"
+    # No temp file is left behind
+    assert os.listdir(tmp_path) == ["out.json"]
+
+
+def test_failed_write_of_new_file_leaves_nothing(tmp_path):
+    with pytest.raises(RuntimeError):
+        with AtomicFile(tmp_path / "out.json", "w") as file:
+            file.write("partial")
+            raise RuntimeError("interrupted")
+    assert os.listdir(tmp_path) == []
+
+
+def test_copy_file(tmp_path):
+    src_path = tmp_path / "src.json"
+    src_path.write_bytes(b"data")
+    assert copy_file(src_path, tmp_path / "dest.json")
+    assert not copy_file(src_path, tmp_path / "dest.json")
+    assert (tmp_path / "dest.json").read_bytes() == b"data"
+
+
+def test_unsupported_mode():
+    with pytest.raises(ValueError):
+        AtomicFile("out.json", "a")
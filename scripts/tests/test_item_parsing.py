@@ -0,0 +1,125 @@
+# Section Splitting Parity
+# find_headings and MDFile.section_content against the original line-by-line heading matcher
+import json
+import re
+from collections import OrderedDict
+from dataclasses import asdict
+from typing import Dict, List
+import pytest
+from conftest import COUNTER_DATASET_PATH, write_countermeasure
+from dataset_updater import item_parsing
+from dataset_updater.item_parsing import HEADING_REGEXES, MDFile, SectionContent, find_headings, is_which_heading, read_header_id
+from dataset_updater.load import sort_items_by_id
+from dataset_updater.util import load_item
+
+
+def oracle_is_which_heading(line: str) -> str | None:
+    """The original matcher: each HEADING_REGEXES pattern in turn, uncompiled"""
+    for h_name, h_pattern in HEADING_REGEXES.__dict__.items():
+        if re.fullmatch(h_pattern, line, flags=re.I):
+            return h_name
+    return None
+
+
+def oracle_find_headings(lines: List[str]) -> Dict[int, str]:
+    ind_to_head = OrderedDict()
+    for ind, line in enumerate(lines):
+        heading = oracle_is_which_heading(line)
+        if heading:
+            ind_to_head[ind] = heading
+    return ind_to_head
+
+
+def oracle_section_content(lines: List[str]) -> SectionContent:
+    """The original section splitter (missing headings aside, which MDFile reports)"""
+    sc = SectionContent()
+    entries = list(oracle_find_headings(lines).items())
+    for entry_ind, (start_ind, header_name) in enumerate(entries):
+        if entry_ind == len(entries) - 1:
+            section_lines = lines[start_ind + 1:]
+        else:
+            section_lines = lines[start_ind + 1:entries[entry_ind + 1][0]]
+        sc.__dict__[header_name] = "\n".join(section_lines).strip()
+    return sc
+
+
+# Heading-like lines: case variants, trailing whitespace/punctuation, and headings that aren't sections
+EDGE_LINES = [
+    "# Title", "#Title", "# ", "#", "## Details", "### Guidance", "#### Monitor",
+    "## INTRODUCTION", "## introduction", "## InTrOdUcTiOn", "## Introduction   ", "## Introduction:",
+    "## Introduction\t", "## Introduction (optional)", "## Introductions", " ## Introduction",
+    "## intended outcome", "## Intended  Outcomes", "## Intended\tOutcome", "## Intended Outcome 2",
+    "## associated techniques", "## Associated Techniques -", "## Related  Countermeasures",
+    "## references", "## References ", "## References and Links", "##References",
+    "## Risks", "## Risks!", "## Risk", "## Guidance.", "## Guidance ##", "## Preparation ",
+    "```", "    ## Guidance", "> ## Risks", "- ## Risks", "",
+]
+
+# Whole countermeasures: sections overriding write_countermeasure's defaults
+EDGE_FILES = {
+    "case_variants": {"## Intended Outcome": ("## INTENDED OUTCOMES", "Outcome."),
+                      "## Guidance": ("## guidance", "Guidance.")},
+    "trailing_whitespace": {"## Risks": ("## Risks   ", "Risks."),
+                            "## References": ("## References\t", "- Example | <https://example.com/>")},
+    "code_block": {"## Guidance": "Run:\n\n```\n# comment in a script\n## Risks\n```\n\nDone."},
+    "indented_code": {"## Guidance": "Run:\n\n    # comment\n    ## Preparation\n\nDone."},
+    "subheadings": {"## Guidance": "### Monitor\n\nWatch.\n\n#### Guidance\n\n## Details\n\nMore."},
+    "repeated_section": {"## Risks": "First.\n\n## Risks\n\nSecond."},
+}
+
+
+def test_corpus_reads_back_as_the_checked_in_dataset(counter_corpus):
+    # The rebuilt files are only a valid corpus if they parse to the items they came from
+    with open(COUNTER_DATASET_PATH, "r", encoding="utf-8") as dataset_file:
+        items = json.load(dataset_file)["items"]
+    assert [load_item(path).to_json() for path in counter_corpus] == items
+
+
+def test_is_which_heading_matches_oracle():
+    for line in EDGE_LINES:
+        assert is_which_heading(line) == oracle_is_which_heading(line), line
+
+
+def test_find_headings_matches_oracle_on_edge_lines():
+    assert find_headings(EDGE_LINES) == oracle_find_headings(EDGE_LINES)
+
+
+def test_find_headings_matches_oracle_on_corpus(counter_corpus):
+    for path in counter_corpus:
+        lines = path.read_text(encoding="utf-8").split("\n")
+        assert find_headings(lines) == oracle_find_headings(lines), path.name
+
+
+def test_section_content_matches_oracle_on_corpus(counter_corpus):
+    for path in counter_corpus:
+        md = MDFile(path)
+        assert asdict(md.section_content) == asdict(oracle_section_content(md.lines)), path.name
+
+
+@pytest.mark.parametrize("name", sorted(EDGE_FILES))
+def test_section_content_matches_oracle_on_edge_cases(tmp_path, monkeypatch, name):
+    # Some edge cases drop a section (ex: inside a code block); compare the split regardless
+    monkeypatch.setattr(item_parsing, "FAIL_ON_MISSING_HEADINGS", False)
+    path = write_countermeasure(tmp_path, name, EDGE_FILES[name])
+    md = MDFile(path)
+    assert asdict(md.section_content) == asdict(oracle_section_content(md.lines))
+
+
+def test_read_header_id_matches_mdfile_on_corpus(counter_corpus):
+    for path in counter_corpus:
+        assert read_header_id(path) == MDFile(path).id, path.name
+
+
+def test_read_header_id_edge_cases(tmp_path):
+    header = "* **Version:** 1.0\n* **Created:** 1 January 2025\n* **Modified:** 1 January 2025"
+    old_id = write_countermeasure(tmp_path, "old_id", {"# Title": "* **ID:** RM0012.001\n" + header})
+    assert read_header_id(old_id) == MDFile(old_id).id == "CM0012.001"
+    # IDs after the header (ex: related countermeasures) aren't the countermeasure's
+    no_id = write_countermeasure(tmp_path, "no_id", {"# Title": header})
+    assert read_header_id(no_id) is None
+
+
+def test_sort_items_by_id(tmp_path):
+    paths = [str(write_countermeasure(tmp_path, name, {"# Title": f"* **ID:** {item_id}"}))
+             for name, item_id in [("a", "CM0003"), ("b", "none"), ("c", "CM0001.002"), ("d", "CM0001")]]
+    assert sort_items_by_id(paths) == [paths[3], paths[2], paths[0], paths[1]]
@@ -0,0 +1,26 @@
+# Parallel Loading
+# Parsing in a worker pool gives the same items, in the same order, with the same messages as one process
+import pytest
+from conftest import write_countermeasure
+from dataset_updater.load import load_dataset
+
+
+def load(counter_path, jobs: int, capsys) -> tuple:
+    dataset = load_dataset(counter_path, jobs=jobs)
+    return dataset, capsys.readouterr().out
+
+
+@pytest.mark.parametrize("jobs", [2, 4])
+def test_jobs_give_the_same_dataset(counter_checkout, capsys, jobs):
+    # Files that fail to parse (no sections, missing a heading) among the others, and one with a message
+    (counter_checkout / "CM0050.5.md").write_text("# Broken\n", encoding="utf-8")
+    write_countermeasure(counter_checkout, "CM9998", {"## Risks": ("## Hazards", "Risks.")})
+    write_countermeasure(counter_checkout, "CM9999", {"## Associated Techniques": ""})
+
+    serial, serial_output = load(counter_checkout, 1, capsys)
+    parallel, parallel_output = load(counter_checkout, jobs, capsys)
+    assert [item.id for item in parallel.items] == [item.id for item in serial.items]
+    assert parallel.to_json() == serial.to_json()
+    assert parallel_output == serial_output
+    assert serial_output.count("Item Skipped") == 2
+    assert "CM9999 No Technique Mappings" in serial_output
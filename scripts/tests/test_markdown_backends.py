@@ -0,0 +1,86 @@
+# Markdown Backend Parity
+# The token backend (with its fallback) against the reference DOM backend, over the checked-in
+# corpus and markdown edge cases
+from collections import defaultdict
+import pytest
+from benchmark.markdown_parity import compare_file
+from conftest import write_countermeasure
+from dataset_updater.cache import ParseCache
+from dataset_updater.load import load_dataset
+from dataset_updater.markdown_backends import DEFAULT_BACKEND, DomBackend, MarkdownBackend, TokenBackend
+
+# Whole countermeasures: sections overriding write_countermeasure's defaults
+EDGE_FILES = {
+    "link_definitions": {"## References": "- Example | [site][ex]\n\n[ex]: https://example.com/docs"},
+    "images": {"## Guidance": "See ![diagram](https://example.com/d.png) and [the docs](https://example.com/docs)."},
+    "blockquote": {"## Guidance": "> Quoted [link](https://example.com/q) about CM0002.\n\nAfter."},
+    "inline_html": {"## Guidance": "Set <code>SMBv1</code> to <b>off</b> (see <span>CM0003</span>)."},
+    "block_html": {"## Guidance": "<div>\nCM0004 in a block\n</div>\n\nAfter."},
+    "entities": {"## Guidance": "Use &lt;value&gt; &amp; &#169; &copy; [AT&amp;T](https://example.com/a&amp;b)."},
+    "escapes": {"## Guidance": "Not a \\[link\\](https://example.com/x), \\*not emphasis\\*, C:\\\\Windows."},
+    "emphasis_in_link_text": {"## References": "- Example | [**bold** _docs_](https://example.com/docs)\n"
+                                               "- Other | [a_b_c](https://example.com/a_b_c)"},
+    "emphasis_in_url": {"## Guidance": "See https://example.com/some_path_here and *https://example.com/x*."},
+    "nested_lists": {"## Guidance": "1. First\n    - Nested [link](https://example.com/n)\n        - Deeper CM0005\n2. Second"},
+    "loose_list": {"## Guidance": "- One\n\n- Two [link](https://example.com/two)\n\n    Continued."},
+    "autolinks": {"## References": "- Auto | <https://example.com/auto>\n- Mail | <someone@example.com>\n"
+                                   "- Bare | https://example.com/bare"},
+    "hash_title_reference": {"## References": "- #Title | https://example.com/title\n"
+                                              "- # Spaced | <https://example.com/spaced>"},
+    "code_spans": {"## Guidance": "Run `[link](https://example.com/code)` and ``CM0006 `x` ``."},
+    "code_block": {"## Guidance": "Run:\n\n    [link](https://example.com/indented)\n\n```\n[link](https://example.com/fenced)\n```"},
+    "link_titles": {"## References": "- Example | [docs](<https://example.com/docs> \"Title\")\n"
+                                     "- Other | [more](https://example.com/more 'Single')"},
+    "visible_urls": {"## Guidance": "[https://example.com/shown](https://example.com/shown) and "
+                                    "[hidden](https://example.com/hidden) and [hidden](https://example.com/hidden)."},
+    "technique_links": {"## Guidance": "[Credential Dumping](https://attack.mitre.org/techniques/T1003/001/)"},
+    "line_breaks": {"## Guidance": "Line one  \nline two [link](https://example.com/br)  \n"},
+    "rules_and_setext": {"## Guidance": "Text\n***\nHeading\n-------\n[link](https://example.com/s)"},
+    "no_references": {"## References": ""},
+    "multi_link_reference": {"## References": "- Two | [a](https://example.com/a) [b](https://example.com/b)\n"
+                                              "- None | plain text"},
+}
+
+
+def test_reference_backend_is_the_default():
+    # The token backend stays opt-in until it's switched on separately
+    assert DEFAULT_BACKEND == DomBackend.name
+
+
+def test_backends_agree_on_corpus(counter_corpus):
+    timings = defaultdict(float)
+    read_by_tokens = 0
+    for path in counter_corpus:
+        unsupported, mismatches = compare_file(str(path), TokenBackend.name, timings)
+        assert mismatches == [], path.name
+        read_by_tokens += unsupported is None
+    # The fallback must not be what makes them agree
+    assert read_by_tokens > len(counter_corpus) // 2
+
+
+def test_datasets_agree_across_backends(counter_corpus, tmp_path):
+    # The backend is passed through to the loading workers, and cached results aren't shared between backends
+    counter_path = counter_corpus[0].parent
+    parse_cache = ParseCache(tmp_path / "cache.pickle")
+    dom_dataset = load_dataset(counter_path, 2, parse_cache, None, DomBackend.name)
+    token_dataset = load_dataset(counter_path, 2, parse_cache, None, TokenBackend.name)
+    assert parse_cache.hits == 0
+    assert token_dataset.to_json() == dom_dataset.to_json()
+
+
+@pytest.mark.parametrize("name", sorted(EDGE_FILES))
+def test_backends_agree_on_edge_cases(tmp_path, name):
+    path = write_countermeasure(tmp_path, name, EDGE_FILES[name])
+    _, mismatches = compare_file(str(path), TokenBackend.name, defaultdict(float))
+    assert mismatches == []
+
+
+def test_incomplete_backend_cannot_be_created():
+    class PartialBackend(MarkdownBackend):
+        name = "partial"
+
+        def references(self):
+            return []
+
+    with pytest.raises(TypeError):
+        PartialBackend(None)
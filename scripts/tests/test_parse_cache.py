@@ -0,0 +1,119 @@
+# Parse Cache
+# ParseCache hits and misses, invalidation by content and parser source, and eviction on save
+import json
+import shutil
+from pathlib import Path
+from dataset_updater import cache
+from dataset_updater.cache import PARSER_MODULES, ParseCache
+
+
+def load_name(path: str) -> str:
+    """A stand-in loader: the "name" of a small JSON file"""
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)["name"]
+
+
+def write_json(path: Path, name: str) -> str:
+    path.write_text(json.dumps({"name": name}), encoding="utf-8")
+    return str(path)
+
+
+def cache_run(cache_path: Path, paths: list) -> tuple:
+    """One run over paths: cached results are reused, the others parsed -> (results, cache)"""
+    parse_cache = ParseCache(cache_path)
+    parse_cache.read()
+    results = []
+    for path in paths:
+        entry = parse_cache.get(load_name, path)
+        if entry is None:
+            result = load_name(path)
+            parse_cache.put(load_name, path, result, f"parsed {path}\n")
+        else:
+            result, _ = entry
+        results.append(result)
+    parse_cache.save()
+    return results, parse_cache
+
+
+def test_unchanged_files_are_reused(tmp_path):
+    cache_path = tmp_path / "cache.pickle"
+    paths = [write_json(tmp_path / "a.json", "a"), write_json(tmp_path / "b.json", "b")]
+    assert cache_run(cache_path, paths)[1].misses == 2
+    results, parse_cache = cache_run(cache_path, paths)
+    assert results == ["a", "b"]
+    assert (parse_cache.hits, parse_cache.misses) == (2, 0)
+    # The captured output is replayed with the result
+    assert parse_cache.get(load_name, paths[0]) == ("a", f"parsed {paths[0]}\n")
+
+
+def test_changed_content_is_reparsed(tmp_path):
+    cache_path = tmp_path / "cache.pickle"
+    paths = [write_json(tmp_path / "a.json", "a"), write_json(tmp_path / "b.json", "b")]
+    cache_run(cache_path, paths)
+    write_json(tmp_path / "b.json", "b2")
+    results, parse_cache = cache_run(cache_path, paths)
+    assert results == ["a", "b2"]
+    assert (parse_cache.hits, parse_cache.misses) == (1, 1)
+    # The fresh parse replaces the stale entry
+    assert cache_run(cache_path, paths)[1].misses == 0
+
+
+def test_parser_source_change_invalidates_entries(tmp_path, monkeypatch):
+    # A copy of the parser modules, standing in for the installed ones
+    module_dir = tmp_path / "dataset_updater"
+    module_dir.mkdir()
+    for name in PARSER_MODULES:
+        shutil.copy(Path(cache.__file__).parent / name, module_dir / name)
+    monkeypatch.setattr(cache, "__file__", str(module_dir / "cache.py"))
+    cache_path = tmp_path / "cache.pickle"
+    paths = [write_json(tmp_path / "a.json", "a")]
+    cache_run(cache_path, paths)
+    assert cache_run(cache_path, paths)[1].hits == 1
+
+    with open(module_dir / "item_parsing.py", "a", encoding="utf-8") as module_file:
+        module_file.write("\n# edited\n")
+    results, parse_cache = cache_run(cache_path, paths)
+    assert results == ["a"]
+    assert (parse_cache.hits, parse_cache.misses) == (0, 1)
+
+
+def test_cache_format_change_invalidates_entries(tmp_path, monkeypatch):
+    cache_path = tmp_path / "cache.pickle"
+    paths = [write_json(tmp_path / "a.json", "a")]
+    cache_run(cache_path, paths)
+    monkeypatch.setattr(cache, "CACHE_FORMAT", cache.CACHE_FORMAT + ".test")
+    assert cache_run(cache_path, paths)[1].misses == 1
+
+
+def test_save_drops_unused_entries(tmp_path):
+    cache_path = tmp_path / "cache.pickle"
+    paths = [write_json(tmp_path / "a.json", "a"), write_json(tmp_path / "b.json", "b")]
+    cache_run(cache_path, paths)
+    # b.json deleted: only a.json is looked up, so only it is kept
+    cache_run(cache_path, paths[:1])
+    parse_cache = ParseCache(cache_path)
+    parse_cache.read()
+    assert list(parse_cache.entries) == [ParseCache._key(load_name, paths[0])]
+
+
+def test_unreadable_cache_is_ignored(tmp_path):
+    cache_path = tmp_path / "cache.pickle"
+    cache_path.write_bytes(b"not a pickle")
+    results, parse_cache = cache_run(cache_path, [write_json(tmp_path / "a.json", "a")])
+    assert results == ["a"]
+    assert parse_cache.misses == 1
+
+
+def test_keep_retains_entries_not_looked_up(tmp_path):
+    cache_path = tmp_path / "cache.pickle"
+    (tmp_path / "one").mkdir()
+    (tmp_path / "two").mkdir()
+    paths = [write_json(tmp_path / "one/a.json", "a"), write_json(tmp_path / "two/b.json", "b")]
+    cache_run(cache_path, paths)
+    # Only one/ is loaded; two/ (ex: an unchanged dataset) is kept as it is
+    parse_cache = ParseCache(cache_path)
+    parse_cache.read()
+    parse_cache.get(load_name, paths[0])
+    parse_cache.keep(tmp_path / "two")
+    parse_cache.save()
+    assert cache_run(cache_path, paths)[1].hits == 2
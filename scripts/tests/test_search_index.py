@@ -0,0 +1,86 @@
+# Search Index
+# Tokenizing, the <version>.search.json layout, and BM25 ranking over a small known dataset
+import pytest
+from conftest import make_item
+from dataset_updater.load import new_dataset
+from dataset_updater.search_index import SEARCH_FORMAT, SearchIndex, SearchIndexBuilder, get_search_path, tokenize, write_search_index
+
+ITEMS = [
+    make_item("CM0001", "Disable SMB", "Block smb traffic. Disable smb signing."),
+    make_item("CM0002", "Audit logs", "Collect smb logging events."),
+    make_item("CM0003", "Patch systems", "Patch systems regularly."),
+]
+
+
+def build_index() -> SearchIndexBuilder:
+    builder = SearchIndexBuilder(new_dataset())
+    for item in ITEMS:
+        builder.add_item(item)
+    return builder
+
+
+def test_tokenize():
+    assert tokenize("Disable the SMBv1 protocol (T1003.001, CM0001) at https://www.example.com") == \
+        ["disable", "smbv1", "protocol", "t1003.001", "cm0001", "example"]
+
+
+def test_layout():
+    index_json = build_index().to_json()
+    assert index_json["format"] == SEARCH_FORMAT
+    assert index_json["fields"] == ["id", "name", "content"]
+    assert index_json["boosts"] == [3.0, 2.0, 1.0]
+    assert index_json["docs"] == ["CM0001", "CM0002", "CM0003"]
+    assert index_json["lengths"] == [[1, 1, 1], [2, 2, 2], [6, 4, 3]]
+    # [doc, term frequency, ..] per field
+    assert index_json["terms"]["smb"] == [[], [0, 1], [0, 2, 1, 1]]
+    assert index_json["terms"]["cm0002"] == [[1, 1], [], []]
+
+
+def test_bm25_score():
+    # "patch": only CM0003 (df 1 of 3 docs, idf = ln(1 + 2.5 / 1.5)), in its name (boost 2,
+    # average length) and content (3 tokens, average 13 / 3)
+    # -> 2 * 0.98083 * 1 + 0.98083 * 2.2 / (1 + 1.2 * 0.76923)
+    assert SearchIndex(build_index().to_json()).search("patch") == [("CM0003", 3.0837)]
+
+
+def test_ranking():
+    index = SearchIndex(build_index().to_json())
+    # More (and name) occurrences rank first
+    assert index.search("smb") == [("CM0001", 1.5232), ("CM0002", 0.4853)]
+    # IDs are boosted the most
+    assert index.search("cm0002") == [("CM0002", 2.9425)]
+    assert [item_id for item_id, _ in index.search("smb", limit=1)] == ["CM0001"]
+
+
+def test_every_term_must_match():
+    index = SearchIndex(build_index().to_json())
+    assert index.search("smb patch") == []
+    assert [item_id for item_id, _ in index.search("smb collect")] == ["CM0002"]
+
+
+def test_prefix_matching():
+    index = SearchIndex(build_index().to_json())
+    # "log" only prefixes "logs" (name) and "logging" (content); the best match counts, at half weight
+    assert index.search("log") == [("CM0002", 0.9808)]
+    assert index.search("log", prefix=False) == []
+    assert index.search("smb log") == [("CM0002", 1.4661)]
+
+
+def test_stop_words_only():
+    assert SearchIndex(build_index().to_json()).search("the and") == []
+
+
+def test_sidecar_round_trip(tmp_path):
+    dataset_path = tmp_path / "latest.json"
+    assert write_search_index(build_index(), dataset_path)
+    assert not write_search_index(build_index(), dataset_path)
+    search_path = get_search_path(dataset_path)
+    assert search_path == tmp_path / "latest.search.json"
+    assert SearchIndex.load(search_path).search("patch") == [("CM0003", 3.0837)]
+
+
+def test_unsupported_format():
+    index_json = build_index().to_json()
+    index_json["format"] = "0.1"
+    with pytest.raises(ValueError):
+        SearchIndex(index_json)
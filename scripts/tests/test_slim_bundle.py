@@ -0,0 +1,95 @@
+# Slim ATT&CK Bundles
+# What a slim bundle keeps of a small STIX bundle, and that the updater reads the same from it as from the full one
+import json
+from pathlib import Path
+from dataset_updater.attack_index import build_domain_index
+from dataset_updater.slim_bundle import DROPPED_PROPS, write_slim_bundle
+from dataset_updater.stix import scan_attack_bundle
+from dataset_updater.update_attack import get_domains_to_load
+
+# Properties the slim bundle drops, on every object
+SHARED_PROPS = {"created_by_ref": "identity--mitre", "object_marking_refs": ["marking-definition--tlp"],
+                "x_mitre_modified_by_ref": "identity--mitre"}
+
+
+def stix(obj_type: str, id_suffix: str, **props) -> dict:
+    return {"type": obj_type, "id": f"{obj_type}--{id_suffix}", **SHARED_PROPS, **props}
+
+
+def technique(tech_id: str, **props) -> dict:
+    return stix("attack-pattern", tech_id.lower().replace(".", "-"), name=f"Technique {tech_id}",
+                external_references=[{"source_name": "mitre-attack", "external_id": tech_id}],
+                kill_chain_phases=[{"kill_chain_name": "mitre-attack", "phase_name": "execution"}], **props)
+
+
+def relationship(relationship_type: str, source_ref: str, target_ref: str) -> dict:
+    return stix("relationship", f"{source_ref.split('--')[1]}-{relationship_type}-{target_ref.split('--')[1]}",
+                relationship_type=relationship_type, source_ref=source_ref, target_ref=target_ref)
+
+
+# Objects the slim bundle keeps (with DROPPED_PROPS removed)
+KEPT = [
+    stix("x-mitre-collection", "test", x_mitre_version="16.1", x_mitre_contents=[{"object_ref": "x"}]),
+    stix("x-mitre-matrix", "enterprise", name="Enterprise ATT&CK"),
+    stix("x-mitre-tactic", "execution", name="Execution"),
+    technique("T1001"),
+    technique("T1001.001"),
+    technique("T1002", revoked=True),
+    technique("T1003"),
+    stix("intrusion-set", "group", name="Group", aliases=["Group", "Alias"], description="Uses T1001."),
+    stix("malware", "software", name="Software"),
+    stix("x-mitre-asset", "asset", name="Asset"),
+    stix("x-mitre-data-component", "component", name="Component",
+         x_mitre_data_source_ref="x-mitre-data-source--source"),
+    stix("x-mitre-data-source", "source", name="Source"),
+    relationship("uses", "intrusion-set--group", "attack-pattern--t1001"),
+    relationship("uses", "malware--software", "attack-pattern--t1001-001"),
+    relationship("targets", "attack-pattern--t1001", "x-mitre-asset--asset"),
+    relationship("detects", "x-mitre-data-component--component", "attack-pattern--t1001"),
+    relationship("subtechnique-of", "attack-pattern--t1001-001", "attack-pattern--t1001"),
+    relationship("revoked-by", "attack-pattern--t1002", "attack-pattern--t1003"),
+]
+# Objects the slim bundle drops: the app never reads them
+DROPPED = [
+    stix("identity", "mitre", name="The MITRE Corporation"),
+    stix("marking-definition", "tlp", definition={"statement": "Copyright"}),
+    stix("course-of-action", "mitigation", name="Mitigation"),
+    stix("intrusion-set", "unrelated", name="Unrelated group"),
+    stix("x-mitre-data-source", "unrelated", name="Unrelated source"),
+    # Not a kept relationship type
+    relationship("mitigates", "course-of-action--mitigation", "attack-pattern--t1001"),
+    # Kept type, but no technique on either end
+    relationship("uses", "intrusion-set--group", "malware--software"),
+]
+
+
+def write_bundles(tmp_path: Path) -> tuple:
+    """A full bundle, with the dropped objects among the kept ones, and its slim copy -> their paths"""
+    objects = KEPT[:3] + DROPPED[:2] + KEPT[3:10] + DROPPED[2:] + KEPT[10:]
+    full_path = tmp_path / "16.1.json"
+    full_path.write_text(json.dumps({"type": "bundle", "id": "bundle--test", "objects": objects}),
+                         encoding="utf-8")
+    slim_path = tmp_path / "16.1.slim.json"
+    write_slim_bundle(full_path, slim_path)
+    return full_path, slim_path
+
+
+def test_slim_bundle_contents(tmp_path):
+    _, slim_path = write_bundles(tmp_path)
+    with open(slim_path, "r", encoding="utf-8") as slim_file:
+        slim = json.load(slim_file)
+    assert {key: value for key, value in slim.items() if key != "objects"} == {"type": "bundle", "id": "bundle--test"}
+    # Kept objects, in bundle order, whole but for DROPPED_PROPS
+    assert slim["objects"] == [{prop: value for prop, value in obj.items() if prop not in DROPPED_PROPS}
+                               for obj in KEPT]
+    assert not any(prop in obj for obj in slim["objects"] for prop in DROPPED_PROPS)
+
+
+def test_slim_bundle_reads_the_same(tmp_path):
+    full_path, slim_path = write_bundles(tmp_path)
+    assert scan_attack_bundle(slim_path) == scan_attack_bundle(full_path)
+    _, full_index = build_domain_index("enterprise", full_path)
+    _, slim_index = build_domain_index("enterprise", slim_path)
+    assert slim_index == full_index
+    mitigated = {"T1001", "T1002", "T1999"}
+    assert get_domains_to_load(mitigated, slim_index) == get_domains_to_load(mitigated, full_index)
@@ -0,0 +1,101 @@
+# Watch Mode
+# The inotify watcher's reports for directories moved or deleted, and edits saved while watching starts
+import os
+import shutil
+from pathlib import Path
+import pytest
+from conftest import write_countermeasure
+from dataset_updater import watch
+from dataset_updater.load import LiveDataset
+from dataset_updater.watch import InotifyWatcher
+
+
+def write_checkout(root: Path) -> Path:
+    """A checkout with one countermeasure in a subdirectory -> its path"""
+    (root / "sub").mkdir(parents=True)
+    return write_countermeasure(root / "sub", "CM1001", {})
+
+
+def inotify_watcher(root: Path, tracked) -> InotifyWatcher:
+    try:
+        return InotifyWatcher(root, tracked)
+    except OSError:
+        pytest.skip("inotify is not available")
+
+
+def test_directory_moved_away(tmp_path):
+    root = tmp_path / "checkout"
+    cm_path = write_checkout(root)
+    live = LiveDataset(root)
+    live.refresh()
+    watcher = inotify_watcher(root, live.files)
+    try:
+        os.rename(root / "sub", tmp_path / "moved")
+        paths = watcher.wait(1.0)
+        assert paths == {str(cm_path)}
+        assert live.refresh(paths) == [str(cm_path)]
+        assert live.files == {}
+        # The moved directory isn't watched anymore
+        assert list(watcher.dirs.values()) == [str(root)]
+        write_countermeasure(tmp_path / "moved", "CM1002", {})
+        assert watcher.wait(0.2) == set()
+    finally:
+        watcher.close()
+
+
+def test_directory_moved_within_checkout(tmp_path):
+    root = tmp_path / "checkout"
+    cm_path = write_checkout(root)
+    live = LiveDataset(root)
+    live.refresh()
+    watcher = inotify_watcher(root, live.files)
+    try:
+        os.rename(root / "sub", root / "renamed")
+        live.refresh(watcher.wait(1.0))
+        assert list(live.files) == [str(root / "renamed" / cm_path.name)]
+        # Reported under its new path
+        write_countermeasure(root / "renamed", "CM1002", {})
+        assert watcher.wait(1.0) == {str(root / "renamed" / "CM1002.md")}
+    finally:
+        watcher.close()
+
+
+def test_directory_deleted(tmp_path):
+    root = tmp_path / "checkout"
+    cm_path = write_checkout(root)
+    live = LiveDataset(root)
+    live.refresh()
+    watcher = inotify_watcher(root, live.files)
+    try:
+        shutil.rmtree(root / "sub")
+        assert watcher.wait(1.0) == {str(cm_path)}
+        assert list(watcher.dirs.values()) == [str(root)]
+    finally:
+        watcher.close()
+
+
+@pytest.mark.parametrize("polling", [False, True])
+def test_edit_during_first_build(tmp_path, monkeypatch, polling):
+    root = tmp_path / "checkout"
+    cm_path = write_checkout(root)
+    names = []
+
+    def write_dataset(dataset, dataset_path):
+        names.append(dataset.items[0].name)
+        if len(names) == 1:
+            # Saved while the first build is still being written
+            header = cm_path.read_text(encoding="utf-8").split("\n\n")[1]
+            write_countermeasure(root / "sub", "CM1001", {"# Title": ("# Edited", header)})
+            return True
+        raise KeyboardInterrupt
+
+    def update_index(*args):
+        # Only reached once idle: the edit was missed
+        if len(names) == 1:
+            raise AssertionError("the edit wasn't rebuilt")
+
+    monkeypatch.setattr(watch, "write_dataset_and_sidecars", write_dataset)
+    monkeypatch.setattr(watch, "update_index", update_index)
+    monkeypatch.setattr(watch, "INDEX_DELAY", 1.5)
+    watch.watch_counter(root, tmp_path / "latest.json", tmp_path / "index.json", tmp_path / "attack", [], polling)
+    assert names == ["Title", "Edited"]
@@ -0,0 +1,44 @@
+# Dataset Writer
+# The streamed dataset file is byte for byte what json.dumps(indent=4) of the whole document gives
+import io
+import json
+from dataset_updater.load import find_items, load_dataset, new_dataset
+from dataset_updater.writer import dump_dataset, write_dataset
+
+
+def dumped(dataset, items=None) -> str:
+    file = io.StringIO()
+    dump_dataset(dataset, file, items)
+    return file.getvalue()
+
+
+def test_dump_matches_json_dumps(counter_checkout):
+    dataset = load_dataset(counter_checkout, jobs=1)
+    assert dataset.templates
+    assert dumped(dataset) == json.dumps(dataset.to_json(), indent=4)
+
+
+def test_items_are_in_id_order(counter_checkout):
+    paths = find_items(counter_checkout)
+    # The file sorting first by path holds the last ID
+    assert paths != sorted(paths)
+    dataset = load_dataset(counter_checkout, jobs=1)
+    ids = [item["id"] for item in json.loads(dumped(dataset))["items"]]
+    assert ids == sorted(ids)
+    assert len(ids) == len(paths)
+
+
+def test_streamed_items(counter_checkout, tmp_path):
+    dataset = load_dataset(counter_checkout, jobs=1)
+    items, dataset.items = dataset.items, []
+    dataset_path = tmp_path / "latest.json"
+    assert write_dataset(dataset, dataset_path, iter(items))
+    dataset.items = items
+    assert dataset_path.read_text(encoding="utf-8") == json.dumps(dataset.to_json(), indent=4)
+    # Rewriting the same content leaves the file as it is
+    assert not write_dataset(dataset, dataset_path)
+
+
+def test_empty_dataset():
+    dataset = new_dataset()
+    assert dumped(dataset) == json.dumps(dataset.to_json(), indent=4)
@@ -1,34 +1,48 @@
-import json
 import argparse
+import cProfile
 import subprocess
 import sys
 from pathlib import Path
-from dataset_updater.load import load_dataset
-from dataset_updater.util import load_attack_github, load_counter_github, load_index, update_index
-from dataset_updater.update_attack import update_attack
+from dataset_updater.cache import ParseCache
+from dataset_updater.dataset_sources import load_dataset_sources
+from dataset_updater.load import default_jobs
+from dataset_updater.markdown_backends import BACKENDS, DEFAULT_BACKEND
+from dataset_updater.pipeline import UpdaterPipeline
+from dataset_updater.profiling import Profiler
+from dataset_updater.util import FETCH_MODES
+from dataset_updater.watch import watch_counter
 
-# GitHub URLs
-ATTACK_URL = "https://github.com/mitre-attack/attack-stix-data.git"
-COUNTER_URL = "https://github.com/cisagov/coun7er.git"
 
-# Set for tracking mitigated ATT&CK techniques
-# Applies to countermeasures and templates
-# This tells us which ATT&CK domains to load
-mitigated_techniques = set()
+def run(args: argparse.Namespace, profiler: Profiler) -> None:
+    """One update (or watch session) with the parsed arguments"""
+    # Try a test Git command to make sure it is installed (not needed when fully offline or watching)
+    if not (args.counter_source and args.attack_source) and not args.watch:
+        try:
+            subprocess.check_output('git --version', shell=True)
+        except subprocess.CalledProcessError as e:
+            print("Git test command failed. Please make sure that git is installed. Exiting.")
+            sys.exit(0)
 
+    # The updater itself (reads/writes the Playbook-NG tree this script is in)
+    baseline_ids = [s.strip() for s in args.baseline.split(",")] if args.baseline else []
+    dataset_sources = load_dataset_sources(args.datasets) if args.datasets else None
+    # Streamed (not resident): this process exits after one update, so keep memory bounded
+    pipeline = UpdaterPipeline(baseline_ids=baseline_ids, jobs=args.jobs, fetch_mode=args.fetch,
+                               slim_attack=args.slim_attack, counter_source=args.counter_source,
+                               attack_source=args.attack_source, use_cache=not args.no_cache,
+                               resident=False, profiler=profiler, dataset_sources=dataset_sources,
+                               attack_store=args.attack_store, markdown_backend=args.markdown_backend)
 
-def parse_counter_dataset(dataset):
-    """Parse the GitHub COUN7ER dataset"""
-    # Parse countermeasures
-    for cm in dataset.items:
-        for tech in cm.techniques:
-            mitigated_techniques.add(tech.tech_id)
-    # Parse templates
-    for tmpl in dataset.templates:
-        for tech_id in tmpl.tech_to_items.keys():
-            # Exclude the unmapped items
-            if "unmapped" not in tech_id:
-                mitigated_techniques.add(tech_id)
+    if args.watch:
+        parse_cache = ParseCache(pipeline.cache_path)
+        if not args.no_cache:
+            parse_cache.read()
+        watch_counter(args.counter_source or pipeline.counter_repo_path, pipeline.counter_data_path,
+                      pipeline.index_path, pipeline.attack_data_path, baseline_ids, args.poll,
+                      pipeline.jobs, parse_cache, pipeline.markdown_backend)
+        return
+
+    pipeline.refresh(args.remake)
 
 
 def main():
@@ -40,86 +54,52 @@ def main():
                         help=f"A comma-separated list of CMs to add as baseline items in the generated COUN7ER latest.json.")
     parser.add_argument(
         '-r', '--remake', help=f"Grab and remake the COUN7ER dataset using the latest data from GitHub. NOTE: this will overwrite any existing datasets.", action="store_true")
+    parser.add_argument('-j', '--jobs', type=int, default=default_jobs(),
+                        help=f"Number of worker processes used to parse the COUN7ER dataset (default: CPU count). Use 1 to parse in this process.")
+    parser.add_argument(
+        '--no-cache', help=f"Ignore the parse cache and re-parse every countermeasure and template (the cache is then rebuilt).", action="store_true")
+    parser.add_argument(
+        '--slim-attack', help=f"Write new ATT&CK versions as slim bundles, holding the techniques and the objects their relationships reach, without objects and properties Playbook-NG never reads (not a full copy of the bundle).", action="store_true")
+    parser.add_argument('--markdown-backend', choices=list(BACKENDS), default=DEFAULT_BACKEND,
+                        help=f"How countermeasure markdown is read (default: {DEFAULT_BACKEND}). dom: rendered to HTML and read with BeautifulSoup (the reference). tokens: read from the markdown's tokens without rendering, falling back to dom per file for markdown it doesn't cover.")
+    parser.add_argument('--fetch', choices=FETCH_MODES, default="full",
+                        help=f"How to fetch the GitHub repos. full: complete clone/pull. shallow: depth 1, only the files the updater reads (sparse checkout).")
+    parser.add_argument('--counter-source', type=Path,
+                        help=f"Offline: read COUN7ER from this local directory or tarball instead of GitHub.")
+    parser.add_argument('--attack-source', type=Path,
+                        help=f"Offline: read ATT&CK from this local directory or tarball instead of GitHub.")
+    parser.add_argument('--profile', type=Path, metavar="REPORT",
+                        help=f"Write a JSON report of each stage's wall time, CPU time and peak memory, and the slowest countermeasure files, to this file.")
+    parser.add_argument('--cprofile', type=Path, metavar="OUT",
+                        help=f"Write a cProfile capture of the run (main thread of the main process) to this file, ex: out.prof.")
+    parser.add_argument(
+        '--watch', help=f"Watch a local COUN7ER checkout (--counter-source directory, else the cloned repo) and rebuild latest.json whenever a countermeasure or template changes, until interrupted. Nothing is fetched and ATT&CK isn't updated.", action="store_true")
+    parser.add_argument(
+        '--poll', help=f"With --watch, poll for changes instead of using inotify (ex: for network or container mounts, where inotify events are missed).", action="store_true")
+    parser.add_argument('--datasets', type=Path, metavar="CONFIG",
+                        help=f"Build the datasets and versions listed in this JSON file (ex: private datasets, pinned snapshots) in one run, sharing the worker pool, instead of only COUN7ER latest.")
+    parser.add_argument(
+        '--attack-store', help=f"Also keep ATT&CK versions in a deduplicated object store (github/attack-store/<domain>/, outside the served data; each STIX object revision stored once), publishing new versions from it. Every version stays published, so this alone uses more disk (the store on top of every bundle) until older versions are unpublished with python3 -m dataset_updater.attack_store prune KEEP.", action="store_true")
     args = parser.parse_args()
 
-    # Try a test Git command to make sure it is installed
-    try:
-        subprocess.check_output('git --version', shell=True)
-    except subprocess.CalledProcessError as e:
-        print("Git test command failed. Please make sure that git is installed. Exiting.")
-        sys.exit(0)
-
-    # File paths; this assumes that the script is run from the Playbook-NG scripts/ directory
-    PROCESS_DIR = Path(__file__).parent
-    ROOT_DIR = PROCESS_DIR.parent
-    DATA_DIR = ROOT_DIR / "shared/data/"
-
-    # GitHub repo file paths
-    # Base directory for storing the data from GitHub
-    REPO_DIR = "github"
-    # ATT&CK/COUN7ER GitHub repo paths (for cloning)
-    REPO_PATH = ROOT_DIR / REPO_DIR
-    ATTACK_REPO_PATH = REPO_PATH / "attack"
-    COUNTER_REPO_PATH = REPO_PATH / "coun7er"
-    # Index.json path
-    INDEX_PATH = DATA_DIR / "index.json"
-    # App data paths
-    ATTACK_DATA_PATH = DATA_DIR / "attack"
-    COUNTER_DATA_PATH = DATA_DIR / "datasets/coun7er/latest.json"
+    # Stage timings are always recorded (cheap); they're only written with --profile
+    profiler = Profiler()
+    if args.cprofile:
+        cprofiler = cProfile.Profile()
+        cprofiler.enable()
 
-    print("Cloning/updating ATT&CK and COUN7ER GitHub repositories.")
-    # Fetch/update the latest COUN7ER data from the GitHub repo
-    counter_stdout = load_counter_github(COUNTER_URL, COUNTER_REPO_PATH)
-    # Fetch/update the latest ATT&CK data from the GitHub repo
-    attack_stdout = load_attack_github(ATTACK_URL, ATTACK_REPO_PATH)
-    # Load the current index.json
-    index_json = load_index(INDEX_PATH)
-    # Load the fetched dataset
-    print("\nLoading the GitHub COUN7ER dataset.")
-    dataset = load_dataset(COUNTER_REPO_PATH)
-    # Parse the fetched dataset
-    parse_counter_dataset(dataset)
-
-    # State variables for tracking updates
-    attack_updated = False
-    counter_updated = False
-
-    # Update ATT&CK first
-    if "Already up to date." not in attack_stdout:
-        # Update the ATT&CK files, if necessary
-        attack_updated = update_attack(
-            index_json, mitigated_techniques, ATTACK_REPO_PATH, ATTACK_DATA_PATH)
-    # Update the dataset with any specified baseline items
-    if args.baseline:
-        baseline_ids = [s.strip() for s in args.baseline.split(",")]
-        # Update the is_baseline on any specified CMs
-        for cm in dataset.items:
-            if cm.id in baseline_ids:
-                cm.is_baseline = True
-    # Update COUN7ER
-    if "Already up to date." not in counter_stdout or args.remake:
-        print("\nUpdating COUN7ER latest.json using latest GitHub data.")
-        if args.remake:
-            print("  [i] Remake specified, remaking dataset from scratch.")
-        if args.baseline:
-            print("  [i] Including specified baseline CMs.")
-        # Dataset -> coun7er/latest.json
-        with open(COUNTER_DATA_PATH, "wt") as file:
-            json.dump(dataset, file, indent=4, default=lambda o: o.__dict__)
-        print(f"  [+] Wrote to {COUNTER_DATA_PATH}")
-        counter_updated = True
-    else:
-        # Update the baseline items even if there's no new data
-        if args.baseline:
-            print("Updating COUN7ER latest.json with specified baseline CMs.")
-            # Dataset -> coun7er/latest.json
-            with open(COUNTER_DATA_PATH, "wt") as file:
-                json.dump(dataset, file, indent=4,
-                          default=lambda o: o.__dict__)
-            print(f"  [+] Wrote to {COUNTER_DATA_PATH}")
-            counter_updated = True
-    # Update index.json
-    update_index(attack_updated, counter_updated, INDEX_PATH, ATTACK_DATA_PATH)
+    try:
+        run(args, profiler)
+    finally:
+        # Also written when the run fails or --watch is interrupted
+        if args.cprofile:
+            cprofiler.disable()
+            cprofiler.dump_stats(args.cprofile)
+            print(f"  [+] Wrote cProfile capture to {args.cprofile}")
+    if args.watch:
+        return
+    if args.profile:
+        profiler.write_report(args.profile)
     print("**** Updates Complete ****")
 
 